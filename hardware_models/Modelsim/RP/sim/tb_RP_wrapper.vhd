@@ -2,6 +2,7 @@ library ieee;
   use ieee.std_logic_1164.all;
   use ieee.numeric_std.all;
   use work.constants_pkg.all;
+  use std.textio.all;
 
 entity tb_RP_wrapper is
 end entity;
@@ -41,6 +42,7 @@ architecture rtl of tb_RP_wrapper is
 
   -- Clock period
   constant CLK_PERIOD : time := 10 ns;
+  constant DUMP_FILE_NAME : string := "tb_RP_wrapper_dump.txt";
 
 begin
 
@@ -118,4 +120,32 @@ begin
     wait;
   end process;
 
+  -- Output dump for rp_coverify.py: one "cycle flow_id rate" line per rate update,
+  -- cycle counts rising edges from the first one out of reset
+  dump_process: process (clk_s)
+    file dump_file     : text open write_mode is DUMP_FILE_NAME;
+    variable dump_line : line;
+    variable cycle     : natural := 0;
+    variable header    : boolean := true;
+  begin
+    if rising_edge(clk_s) then
+      if header then
+        write(dump_line, string'("# cycle flow_id rate"));
+        writeline(dump_file, dump_line);
+        header := false;
+      end if;
+      if rst_s = '0' then
+        if wrapper_rate_valid_o_s = '1' then
+          write(dump_line, cycle);
+          write(dump_line, ' ');
+          write(dump_line, to_integer(unsigned(wrapper_flow_id_o_s)));
+          write(dump_line, ' ');
+          write(dump_line, to_integer(wrapper_rate_o_s));
+          writeline(dump_file, dump_line);
+        end if;
+        cycle := cycle + 1;
+      end if;
+    end if;
+  end process;
+
 end architecture;
@@ -2,6 +2,7 @@ library IEEE;
   use IEEE.STD_LOGIC_1164.all;
   use IEEE.NUMERIC_STD.all;
   use work.constants_pkg.all;
+  use std.textio.all;
 
 entity tb_Scheduler_pipeline_top is
 end entity;
@@ -25,6 +26,8 @@ architecture sim of tb_Scheduler_pipeline_top is
   signal seq_nr_out     : unsigned(SEQ_NR_WIDTH - 1 downto 0);
   signal flow_ready_out : std_logic;
 
+  constant DUMP_FILE_NAME : string := "tb_scheduler_pipeline_dump.txt";
+
 begin
 
   -- Clock process
@@ -54,4 +57,32 @@ begin
     wait;
   end process;
 
+  -- Output dump for hw_coverify.py: one "cycle qp seq_nr" line per flow_ready_out,
+  -- cycle counts rising edges from the first one out of reset
+  dump_proc: process (clk)
+    file dump_file     : text open write_mode is DUMP_FILE_NAME;
+    variable dump_line : line;
+    variable cycle     : natural := 0;
+    variable header    : boolean := true;
+  begin
+    if rising_edge(clk) then
+      if header then
+        write(dump_line, string'("# cycle qp seq_nr"));
+        writeline(dump_file, dump_line);
+        header := false;
+      end if;
+      if rst = '0' then
+        if flow_ready_out = '1' then
+          write(dump_line, cycle);
+          write(dump_line, ' ');
+          write(dump_line, to_integer(unsigned(qp_out)));
+          write(dump_line, ' ');
+          write(dump_line, to_integer(seq_nr_out));
+          writeline(dump_file, dump_line);
+        end if;
+        cycle := cycle + 1;
+      end if;
+    end if;
+  end process;
+
 end architecture;
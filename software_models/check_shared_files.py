@@ -0,0 +1,53 @@
+"""
+Check that the copies of the shared modules are identical
+Every model directory is its own import root, so modules used by several of them
+are copied into each. SHARED_FILES lists every shared file with the directory
+holding the copy to edit; the others must match it byte for byte. Exits with
+status 1 on a mismatch or a missing copy. --sync overwrites the copies with the
+source copy instead.
+"""
+
+import filecmp
+import os
+import shutil
+import sys
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# file name: (directory of the source copy, directories of the other copies)
+SHARED_FILES = {
+    "RoCE_packet.py": ("dcqcn_rp", ("scheduler_single_flow",)),
+    "batch_means.py": ("scheduling_algorithm", ("dcqcn_rp",)),
+    "result_cache.py": ("scheduling_algorithm", ("dcqcn_rp",)),
+    "hw_dump.py": ("scheduling_algorithm", ("dcqcn_rp",)),
+    "model_io.py": ("scheduling_algorithm", ("dcqcn_rp", "scheduler_single_flow")),
+    "plot_decimation.py": (
+        "scheduling_algorithm",
+        ("dcqcn_rp", "scheduler_single_flow"),
+    ),
+}
+
+
+def out_of_sync():
+    """(source path, copy path) of every copy that differs from its source."""
+    mismatches = []
+    for name, (source_dir, copy_dirs) in SHARED_FILES.items():
+        source = os.path.join(MODELS_DIR, source_dir, name)
+        for copy_dir in copy_dirs:
+            copy = os.path.join(MODELS_DIR, copy_dir, name)
+            if not os.path.exists(copy) or not filecmp.cmp(source, copy, False):
+                mismatches.append((source, copy))
+    return mismatches
+
+
+if __name__ == "__main__":
+    mismatches = out_of_sync()
+    if "--sync" in sys.argv[1:]:
+        for source, copy in mismatches:
+            shutil.copyfile(source, copy)
+            print(f"Copied {source} -> {copy}")
+        sys.exit(0)
+    for source, copy in mismatches:
+        print(f"{os.path.relpath(copy, MODELS_DIR)} differs from {source}")
+    print(f"Shared files in sync: {not mismatches}")
+    sys.exit(1 if mismatches else 0)
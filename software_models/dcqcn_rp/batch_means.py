@@ -0,0 +1,143 @@
+"""
+Batch-means convergence monitor
+A run is cut into base batches of equal length, each contributing one value
+per metric (a scalar or an array, e.g. one entry per flow group). Every metric
+entry gets its own warm-up truncation (MSER: the cut within the first half that
+minimizes the variance of the remaining mean) and a Student-t confidence
+interval of the mean of the remaining batch means. The run has converged when
+every entry's half width is within max(rel_tol * |mean|, abs_tol), with at
+least min_batches batches after the cut. At max_batches adjacent batches are
+merged pairwise (batches then span twice as many base batches), so memory and
+the check stay bounded and the batch means decorrelate as the run grows.
+The scheduling_algorithm and dcqcn_rp copies of this file are identical; edit
+the scheduling_algorithm one and run software_models/check_shared_files.py --sync.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+BATCH_CONFIDENCE = 0.95
+BATCH_REL_TOL = 0.01  # Target half width relative to the mean
+BATCH_ABS_TOL = 0.0  # Half width that is always small enough (metric units)
+BATCH_MIN = 20  # Batches after the warm-up cut
+BATCH_MAX = 128  # Batches kept before a pairwise merge
+
+
+def t_quantile(p, dof):
+    """Student t quantile, Cornish-Fisher in 1/dof (within 1e-3 for dof >= 10)."""
+    z = NormalDist().inv_cdf(p)
+    return z + (z**3 + z) / (4 * dof) + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * dof**2)
+
+
+class BatchMeans:
+    def __init__(
+        self,
+        confidence=BATCH_CONFIDENCE,
+        rel_tol=BATCH_REL_TOL,
+        abs_tol=BATCH_ABS_TOL,
+        min_batches=BATCH_MIN,
+        max_batches=BATCH_MAX,
+        tolerances=None,
+    ):
+        """tolerances: {metric: (rel_tol, abs_tol)} overriding the defaults."""
+        self.confidence = confidence
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.min_batches = min_batches
+        self.max_batches = max_batches - max_batches % 2
+        self.tolerances = tolerances or {}
+        self.layout = None  # {metric: (start, shape)} in a batch row
+        self.batches = None  # (max_batches, entries)
+        self.count = 0  # Batches in self.batches
+        self.group = 1  # Base batches per batch
+        self.pending = None
+        self.pending_count = 0
+        self.base_batches = 0
+
+    def add(self, values):
+        """One base batch: {metric: scalar or array}, the same metrics every time."""
+        if self.layout is None:
+            self.layout, start = {}, 0
+            for name, value in values.items():
+                shape = np.shape(value)
+                self.layout[name] = start, shape
+                start += int(np.prod(shape))
+            self.batches = np.zeros((self.max_batches, start))
+            self.pending = np.zeros(start)
+        row = np.concatenate([np.ravel(values[name]) for name in self.layout])
+        self.pending += row
+        self.pending_count += 1
+        self.base_batches += 1
+        if self.pending_count < self.group:
+            return
+        self.batches[self.count] = self.pending / self.group
+        self.count += 1
+        self.pending[:] = 0
+        self.pending_count = 0
+        if self.count == self.max_batches:
+            half = self.max_batches // 2
+            self.batches[:half] = (self.batches[0::2] + self.batches[1::2]) / 2
+            self.count = half
+            self.group *= 2
+
+    def estimates(self):
+        """(mean, half width, batches after the cut) of every entry, flattened."""
+        x = self.batches[: self.count]
+        n = self.count
+        # Sums over batches d.. for every cut d <= n // 2 (MSER)
+        tail = np.cumsum(x[::-1], axis=0)[::-1][: n // 2 + 1]
+        tail_sq = np.cumsum(x[::-1] ** 2, axis=0)[::-1][: n // 2 + 1]
+        kept = (n - np.arange(len(tail)))[:, None]
+        ss = np.maximum(tail_sq - tail**2 / kept, 0)
+        cut = np.argmin(ss / kept**2, axis=0)
+        columns = np.arange(x.shape[1])
+        kept = n - cut
+        mean = tail[cut, columns] / kept
+        var = ss[cut, columns] / np.maximum(kept - 1, 1)
+        t = t_quantile(0.5 + self.confidence / 2, np.maximum(kept - 1, 1))
+        return mean, t * np.sqrt(var / kept), kept
+
+    def intervals(self):
+        """{metric: (mean, half width, target half width)}, shaped like the values."""
+        if self.count < 2:
+            return {}
+        mean, half_width, _ = self.estimates()
+        result = {}
+        for name, (start, shape) in self.layout.items():
+            rel_tol, abs_tol = self.tolerances.get(name, (self.rel_tol, self.abs_tol))
+            entries = slice(start, start + int(np.prod(shape)))
+            m = mean[entries].reshape(shape)
+            result[name] = (
+                m,
+                half_width[entries].reshape(shape),
+                np.maximum(rel_tol * np.abs(m), abs_tol),
+            )
+        return result
+
+    @property
+    def converged(self):
+        if (
+            self.count < self.min_batches
+            or self.estimates()[2].min() < self.min_batches
+        ):
+            return False
+        return all(np.all(hw <= target) for _, hw, target in self.intervals().values())
+
+    def print_report(self):
+        print(
+            f"Batch means: {self.base_batches} base batches, {self.count} batches "
+            f"of {self.group}, {'converged' if self.converged else 'NOT converged'}"
+        )
+        for name, (mean, half_width, target) in self.intervals().items():
+            if np.ndim(mean) == 0:
+                print(f"  {name}: {mean:.6g} +- {half_width:.3g} (target {target:.3g})")
+                continue
+            worst = np.unravel_index(
+                np.argmax(half_width / np.maximum(target, 1e-300)), np.shape(mean)
+            )
+            print(
+                f"  {name}: {np.size(mean)} entries, worst {mean[worst]:.6g} "
+                f"+- {half_width[worst]:.3g} (target {target[worst]:.3g}, "
+                f"entry {worst[0] if len(worst) == 1 else worst})"
+            )
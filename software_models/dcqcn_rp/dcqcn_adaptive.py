@@ -0,0 +1,203 @@
+"""
+Adaptive time-step model of the RP and DCQCN rate adjustment mechanism
+Steps of h us run on the RP and CN/NP of dcqcn_vectorized: one scalar RP update
+per timer boundary or CNP arrival, and both buffers from the Lindley recursion
+rounded as the per-tick loop, so CNPs and histories match run_simulation tick
+for tick. The step size follows the CNPs: steps double up to ADAPTIVE_MAX_STEP
+while no CNP is generated, a step in which the CN/NP generates one is cut at
+that us (the RP redoes the step up to it and re-plans with the CNP arrival),
+and the step after it spans the last CNP interval, at least up to the end of
+the N us holdoff, so a regular CNP interval takes one or two steps. Histories
+are recorded at the last us of every step.
+"""
+
+import time
+
+import numpy as np
+from dcqcn_constants import *
+from dcqcn_series_model import load_app_rate_timestamps, run_simulation
+from dcqcn_vectorized import (
+    VectorCongestionNotification,
+    VectorReactionPoint,
+    app_rate_per_step,
+)
+
+
+class AdaptiveDcqcn:
+    def __init__(
+        self,
+        app_rate_changes,
+        sim_time,
+        RC_INIT,
+        K,
+        F,
+        R_AI,
+        G,
+        ALPHA_INIT,
+        OUTPUT_RATE,
+        CNP_THRESHOLD,
+        CNP_DELAY,
+        N,
+    ):
+        self.rp = VectorReactionPoint(RC_INIT, K, F, R_AI, G, ALPHA_INIT)
+        self.cn_np = VectorCongestionNotification(
+            OUTPUT_RATE, CNP_THRESHOLD, CNP_DELAY, N
+        )
+        self.CNP_DELAY = CNP_DELAY
+        self.app_rate = app_rate_per_step(app_rate_changes, sim_time)
+
+        # Per-us states; the CN/NP reads the RP sending CNP_DELAY us back
+        self.rate = np.empty(sim_time)
+        self.alpha = np.empty(sim_time)
+        self.input_buffer = np.empty(sim_time)
+        self.output_buffer = np.empty(sim_time)
+        self.sent = np.empty(sim_time)
+
+    @property
+    def cnp_events(self):
+        return self.cn_np.cnp_events
+
+    def step(self, t, h):
+        """
+        Advance steps t..t+h-1, or t..c if the CN/NP generates a CNP at step c
+        before. Returns the number of steps advanced.
+        """
+        rp_state = self.rp.state()
+        histories = (self.rate, self.alpha, self.input_buffer, self.sent)
+        self.rp.advance(t, t + h, self.app_rate, *histories)
+        t_cnp = self.cn_np.advance(t, t + h, self.sent, self.output_buffer)
+        if t_cnp is None:
+            return h
+        if t_cnp < t + h - 1:
+            # The RP sent past the CNP without it, redo up to it
+            self.rp.restore(rp_state)
+            self.rp.advance(t, t_cnp + 1, self.app_rate, *histories)
+        self.rp.cnp_arrivals.append(t_cnp + self.CNP_DELAY + 1)
+        return t_cnp + 1 - t
+
+
+# --- Simulation Function ---
+def run_adaptive_simulation(
+    app_rate_changes,
+    sim_time,
+    RC_INIT,
+    K,
+    F,
+    R_AI,
+    G,
+    ALPHA_INIT,
+    OUTPUT_RATE,
+    CNP_THRESHOLD,
+    CNP_DELAY,
+    N,
+    max_step=ADAPTIVE_MAX_STEP,
+    monitor=None,
+    batch_ticks=CONVERGENCE_BATCH_TICKS,
+):
+    """
+    Same model arguments as run_simulation. Histories are recorded at the last
+    step of every adaptive step (time_history holds these steps).
+    monitor: as in run_simulation; adaptive steps end at batch boundaries, so the
+    batch means and the step the run stops at are those of run_simulation.
+    """
+    model = AdaptiveDcqcn(
+        app_rate_changes,
+        sim_time,
+        RC_INIT,
+        K,
+        F,
+        R_AI,
+        G,
+        ALPHA_INIT,
+        OUTPUT_RATE,
+        CNP_THRESHOLD,
+        CNP_DELAY,
+        N,
+    )
+    steps = []
+
+    t = 0
+    h = 1
+    while t < sim_time:
+        h = min(h, max_step, sim_time - t)
+        if monitor is not None:
+            h = min(h, (t // batch_ticks + 1) * batch_ticks - t)
+        t += model.step(t, h)
+        steps.append(t - 1)
+        events = model.cnp_events
+        if events and events[-1][0] == t - 1:
+            # Next step: the last CNP interval, at least up to the end of the holdoff
+            gap = t - 1 - events[-2][0] if len(events) > 1 else 1
+            h = max(gap, model.cn_np.next_detection - t, 1)
+        else:
+            h = 2 * h
+
+        if monitor is not None and t % batch_ticks == 0:
+            batch = slice(t - batch_ticks, t)
+            monitor.add(
+                {
+                    "rate": model.rate[batch].mean(),
+                    "output_buffer": model.output_buffer[batch].mean(),
+                }
+            )
+            if monitor.converged:
+                break
+
+    model.time_history = np.array(steps, dtype=np.int64)
+    model.rate_history = model.rate[model.time_history]
+    model.alpha_history = model.alpha[model.time_history]
+    model.input_buffer_history = model.input_buffer[model.time_history]
+    model.output_buffer_history = model.output_buffer[model.time_history]
+    return model
+
+
+def compare_with_fixed_step(
+    app_rate_changes,
+    sim_time,
+    max_step=ADAPTIVE_MAX_STEP,
+    threshold=CNP_THRESHOLD,
+):
+    """Run the fixed 1 us model and the adaptive one, report steps and deviations."""
+    args = (RC_INIT, K, F, R_AI, G, ALPHA_INIT, OUTPUT_RATE, threshold)
+    args += (CNP_DELAY, N)
+
+    start = time.perf_counter()
+    rp, cn_np = run_simulation(app_rate_changes, sim_time, *args)
+    fixed_time = time.perf_counter() - start
+    start = time.perf_counter()
+    model = run_adaptive_simulation(
+        app_rate_changes, sim_time, *args, max_step=max_step
+    )
+    adaptive_time = time.perf_counter() - start
+
+    # Deviations at the steps recorded by the adaptive model
+    steps = model.time_history
+    rate_error = np.abs(model.rate_history - np.array(rp.rate_history)[steps])
+    buffer_error = np.abs(
+        model.output_buffer_history - np.array(cn_np.output_buffer_history)[steps]
+    )
+    fixed_events = np.array([t for t, _ in cn_np.cnp_events])
+    adaptive_events = np.array([t for t, _ in model.cnp_events])
+    print(f"Max step {max_step} us: {len(steps)} steps for {sim_time} us")
+    print(f"CNP events fixed/adaptive: {len(fixed_events)}/{len(adaptive_events)}")
+    if len(fixed_events) == len(adaptive_events) and len(fixed_events):
+        shift = np.max(np.abs(fixed_events - adaptive_events))
+        print(f"Max CNP time shift: {shift} us")
+    print(f"Max rate deviation: {rate_error.max():.3e} B/us")
+    print(f"Max output buffer deviation: {buffer_error.max():.3e} B")
+    print(f"Fixed step: {fixed_time:.3f} s, adaptive: {adaptive_time:.3f} s")
+    return rate_error.max(), buffer_error.max()
+
+
+if __name__ == "__main__":
+    app_rate_changes = load_app_rate_timestamps(APP_RATE_INPUT_PATH)
+    compare_with_fixed_step(app_rate_changes, END_OF_TIME)
+
+    # One second of simulated time with the app rate pattern repeated
+    period = app_rate_changes[-1][0] + 200
+    repeats = 1_000_000 // period
+    long_changes = [
+        (t + i * period, rate) for i in range(repeats) for t, rate in app_rate_changes
+    ]
+    for max_step in (100, ADAPTIVE_MAX_STEP, 10_000):
+        compare_with_fixed_step(long_changes, repeats * period, max_step)
@@ -17,3 +17,51 @@ RC_INIT = 135  # Initial rate (B/us)
 OUTPUT_RATE = 129  # (B/us)
 END_OF_TIME = 3000  # Simulation time in microseconds
 LINK_SPEED_BPS = 10  # 10 bpns link speed
+VECTOR_CHUNK = 512  # Steps advanced per vectorized CN/NP chunk (us)
+KMIN = 1000  # ECN marking starts above this port queue (Bytes)
+KMAX = 4000  # Every packet is marked above this port queue (Bytes)
+P_MAX = 0.2  # Marking probability at KMAX
+PORT_RATE = 1250  # Switch egress port rate (B/us), 10 Gbps
+ADAPTIVE_MAX_STEP = 1000  # Longest adaptive step (us)
+RESULTS_PATH = None  # .npz export of a run (export_results), None = no export
+RESULT_CACHE_DIR = None  # Result cache (result_cache.py) of run_simulation, None = off
+RESULT_CACHE_MAX_BYTES = 512 * 1024**2  # Least recently used results are evicted above
+PLOT_DIR = None  # Save figures here as .png (headless) instead of showing them
+PLOT_BUCKETS = 2000  # Pixel columns histories are decimated to (plot_decimation.py)
+T = 55  # Rate increase timer (us), dcqcn_lazy; T = K as in ReactionPoint
+B = 150_000  # Byte counter threshold (Bytes), dcqcn_lazy; None = no byte counter
+R_HAI = 10  # Hyper additive increase (B/us), dcqcn_lazy
+R_MAX = PORT_RATE  # Rt ceiling (B/us), dcqcn_lazy
+# RP input queue (rp_input_queue.py), generics of RP_input_queue_simplified.vhd
+CLOCK_PERIOD_NS = 5.12  # Constants_pkg CLK_PERIOD
+PIPELINE_ADDR_WIDTH = 4  # log2(PIPELINE_DEPTH), cycles a flow stays in RP_flow_update
+FIFO_ADDR_WIDTH = 4  # log2(FIFO_DEPTH) of the CNP and the data FIFO
+QUEUE_COALESCE = False  # Merge data notifications of a flow already in the data FIFO
+# Fixed-width RP (dcqcn_fixed.py), RP constants of the Wrapper Constants_pkg.vhd
+RP_RATE_WIDTH = 18  # Rc, Rt and R_max fields
+ALPHA_WIDTH = 16  # Q16 alpha
+GLOBAL_TIMER_WIDTH = 16  # Global timer and the last alpha/T update stamps (cycles)
+F_WIDTH = 3  # TC and BC
+B_WIDTH = 3  # Byte counter (data_sent units)
+RP_DATA_SENT_WIDTH = 1
+RP_RATE_DEFAULT = 511  # Initial Rc and Rt
+HW_ONE = 65_535  # Q16 1.0 as in the RTL (all ones)
+HW_G = 16_383  # Q16 weight factor
+HW_R_AI = 500  # Additive increase (rate units)
+HW_R_HAI = 1000  # Hyper additive increase (rate units)
+HW_K = 50  # Alpha timer (cycles)
+HW_T = 70  # Rate increase timer (cycles)
+HW_B = 3  # Byte counter threshold (data_sent units)
+# RP wrapper co-verification (rp_coverify.py) against the tb_RP_wrapper testbench
+RP_RTL_PATH = "hardware_models/Modelsim/RP"  # rtl/Constants_pkg, mem/Bram_init_pkg
+# Dump to compare; the default is recorded from RPWrapperModel, not from the RTL
+RP_COVERIFY_DUMP_PATH = "software_models/dcqcn_rp/rp_wrapper_model_fixture.txt.gz"
+RP_COVERIFY_CYCLE_TOLERANCE = 0  # Clock cycles an event may be off
+RP_COVERIFY_RATE_TOLERANCE = 0  # Calendar slots a rate may be off
+RP_COVERIFY_END_CYCLE = 2_000  # Cycles recorded into the fixture
+# Convergence monitor (batch_means.py) of run_switch_simulation and run_simulation
+CONVERGENCE_BATCH_TICKS = 200  # Ticks (us) per base batch
+CONVERGENCE_CONFIDENCE = 0.95
+CONVERGENCE_REL_TOL = 0.02  # Target half width relative to the mean
+CONVERGENCE_QUEUE_TOL = 50  # Queue/buffer half width always small enough (Bytes)
+CONVERGENCE_MIN_BATCHES = 20  # Batches after the warm-up cut
@@ -0,0 +1,337 @@
+"""
+Fixed-width many-flow RP model, as RP_flow_update.vhd
+Per-flow state is kept in the field widths of Constants_pkg.vhd, each field in
+the smallest unsigned NumPy dtype (21 bytes per flow at the hardware widths):
+Rc, Rt, R_max (RP_RATE_WIDTH), Q16 alpha (ALPHA_WIDTH), the last alpha and
+rate timer updates (GLOBAL_TIMER_WIDTH), TC, BC (F_WIDTH) and the byte counter
+(B_WIDTH). Arithmetic follows the RTL stages:
+  - products are Q16 and truncated, Rc + Rt is averaged in one extra bit
+  - elapsed times are global timer differences modulo 2^GLOBAL_TIMER_WIDTH, so
+    a flow left alone for a timer period looks freshly updated
+  - one notification applies at most one alpha, timer and byte counter event,
+    the timestamps restart at stage 3 (one cycle after the stage 2 elapsed times)
+  - Rc = (Rc + Rt) / 2 uses Rt before its increase, Rt saturates at R_max
+Notification ticks are global timer cycles at stage 2. The same rules run with
+WIDE_WIDTHS as the reference; compare_widths() widens one field at a time to
+show which hardware width changes the rates.
+"""
+
+import time
+
+import numpy as np
+from dcqcn_constants import *
+from dcqcn_lazy import notification_rounds, random_notifications
+
+Q_BITS = 16  # FLOATING_POINT_WIDTH: fraction bits of alpha, ONE and G
+ELAPSED_STAGE = 2  # Pipeline stage that takes the elapsed times from RP_global_timer
+TIMESTAMP_STAGE = 3  # Pipeline stage that stores RP_global_timer as last update
+UPDATE_DELAY = (
+    TIMESTAMP_STAGE - ELAPSED_STAGE
+)  # Cycles from elapsed times to timestamps
+
+HW_WIDTHS = {
+    "rate": RP_RATE_WIDTH,
+    "alpha": ALPHA_WIDTH,
+    "timer": GLOBAL_TIMER_WIDTH,
+    "counter": F_WIDTH,
+    "byte_count": B_WIDTH,
+    "data_sent": RP_DATA_SENT_WIDTH,
+}
+# Fields that can be widened without changing the Q16 format
+WIDE_WIDTHS = {**HW_WIDTHS, "rate": 32, "timer": 48, "byte_count": 32, "data_sent": 32}
+
+
+def field_dtype(width):
+    """Smallest unsigned dtype holding width bits."""
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if width <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"No unsigned dtype holds {width} bits")
+
+
+class FixedWidthReactionPoints:
+    def __init__(
+        self,
+        num_flows,
+        widths=HW_WIDTHS,
+        Rc_init=RP_RATE_DEFAULT,
+        R_max=None,
+        K=HW_K,
+        T=HW_T,
+        B=HW_B,
+        F=F,
+        Rai=HW_R_AI,
+        Rhai=HW_R_HAI,
+        g=HW_G,
+        one=HW_ONE,
+    ):
+        self.widths = widths
+        self.mask = {field: (1 << width) - 1 for field, width in widths.items()}
+        self.K = K
+        self.T = T
+        self.B = B
+        self.F = F
+        self.Rai = Rai
+        self.Rhai = Rhai
+        self.g = g
+        self.one = one
+
+        rate = field_dtype(widths["rate"])
+        timer = field_dtype(widths["timer"])
+        counter = field_dtype(widths["counter"])
+        self.Rc = np.full(num_flows, Rc_init, dtype=rate)
+        self.Rt = self.Rc.copy()
+        # RP_RATE_MAX_DEFAULT: all ones
+        self.R_max = np.full(
+            num_flows, self.mask["rate"] if R_max is None else R_max, dtype=rate
+        )
+        self.alpha = np.zeros(num_flows, dtype=field_dtype(widths["alpha"]))
+        self.last_alpha_update = np.zeros(num_flows, dtype=timer)
+        self.last_T_update = np.zeros(num_flows, dtype=timer)
+        self.TC = np.zeros(num_flows, dtype=counter)
+        self.BC = np.zeros(num_flows, dtype=counter)
+        self.byte_count = np.zeros(num_flows, dtype=field_dtype(widths["byte_count"]))
+        self.rt_clamps = 0  # Rate increases cut at R_max
+        self.notifications = 0
+
+    def bytes_per_flow(self):
+        fields = (
+            self.Rc,
+            self.Rt,
+            self.R_max,
+            self.alpha,
+            self.last_alpha_update,
+            self.last_T_update,
+            self.TC,
+            self.BC,
+            self.byte_count,
+        )
+        return sum(a.itemsize for a in fields)
+
+    def apply(self, f, t, is_cnp, sent):
+        """One notification per flow of f (distinct), at global timer ticks t."""
+        now = t & self.mask["timer"]
+
+        # CNP: Rt = Rc, alpha = alpha (1 - G) + G (stage 2), Rc *= 1 - alpha / 2
+        c = f[is_cnp]
+        alpha = self.alpha[c].astype(np.int64) * (self.one - self.g) >> Q_BITS
+        alpha = (alpha + self.g) & self.mask["alpha"]
+        self.Rt[c] = self.Rc[c]
+        Rc = self.Rc[c].astype(np.int64) * (self.one - (alpha >> 1)) >> Q_BITS
+        self.Rc[c] = Rc
+        self.alpha[c] = alpha
+        self.last_alpha_update[c] = now[is_cnp]
+        self.last_T_update[c] = now[is_cnp]
+        self.TC[c] = 0
+        self.BC[c] = 0
+        self.byte_count[c] = 0
+
+        # Data sent (or scan): elapsed times and byte counter (stage 2) ...
+        d, now = f[~is_cnp], now[~is_cnp]
+        later = (now + UPDATE_DELAY) & self.mask["timer"]
+        last_alpha_update = self.last_alpha_update[d].astype(np.int64)
+        elapsed_alpha = (now - last_alpha_update) & self.mask["timer"]
+        elapsed_T = (now - self.last_T_update[d].astype(np.int64)) & self.mask["timer"]
+        sent = sent[~is_cnp] & self.mask["data_sent"]
+        byte_count = self.byte_count[d].astype(np.int64) + sent
+        byte_count &= self.mask["byte_count"]
+
+        # ... one event of each kind (stage 3) ...
+        a = elapsed_alpha >= self.K
+        self.alpha[d[a]] = (
+            self.alpha[d[a]].astype(np.int64) * (self.one - self.g) >> Q_BITS
+        )
+        self.last_alpha_update[d[a]] = later[a]
+        TC, BC = self.TC[d].astype(np.int64), self.BC[d].astype(np.int64)
+        T_update = elapsed_T >= self.T
+        self.last_T_update[d[T_update]] = later[T_update]
+        TC += T_update & (TC < self.F)
+        B_update = byte_count >= self.B
+        byte_count[B_update] = 0
+        BC += B_update & (BC < self.F)
+        self.TC[d] = TC
+        self.BC[d] = BC
+        self.byte_count[d] = byte_count
+
+        # ... and the rate increase (stage 4), Rc from the Rt before the step
+        up = T_update | B_update
+        d, TC, BC = d[up], TC[up], BC[up]
+        Rc = self.Rc[d].astype(np.int64)
+        Rt = self.Rt[d].astype(np.int64)
+        self.Rc[d] = (Rc + Rt) >> 1
+        step = np.where(
+            (TC >= self.F) & (BC >= self.F),
+            self.Rhai,
+            np.where((TC >= self.F) | (BC >= self.F), self.Rai, 0),
+        )
+        R_max = self.R_max[d].astype(np.int64)
+        clamped = (step > 0) & (Rt + step > R_max)
+        self.Rt[d] = np.where(clamped, R_max, Rt + step)
+        self.rt_clamps += int(np.count_nonzero(clamped))
+
+    def notify(self, t, flow_ids, is_cnp, sent=None):
+        """
+        Apply a batch of notifications (any order; within a tick CNPs first).
+        sent: data_sent of data notifications (0 = scan). Returns rate_out.
+        """
+        t = np.asarray(t, dtype=np.int64)
+        flow_ids = np.asarray(flow_ids, dtype=np.int64)
+        is_cnp = np.asarray(is_cnp, dtype=bool)
+        sent = np.ones(len(t), dtype=np.int64) if sent is None else np.asarray(sent)
+
+        rates = np.empty(len(t), dtype=np.int64)
+        order, bounds = notification_rounds(t, flow_ids, is_cnp)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            i = order[start:end]
+            self.apply(flow_ids[i], t[i], is_cnp[i], sent[i])
+            rates[i] = self.Rc[flow_ids[i]]
+        self.notifications += len(t)
+        return rates
+
+
+def reference_update(state, t, is_cnp, sent, rp):
+    """
+    One notification of one flow in Python ints, stage by stage as in
+    RP_flow_update.vhd. state: dict of the flow's fields, updated in place.
+    """
+    m = rp.mask
+    now = t & m["timer"]
+    s2 = dict(state)
+    if is_cnp:
+        s2["Rt"] = state["Rc"]
+        s2["alpha"] = ((state["alpha"] * (rp.one - rp.g) >> Q_BITS) + rp.g) & m["alpha"]
+        s2["last_alpha_update"] = s2["last_T_update"] = now
+        s2["TC"] = s2["BC"] = s2["byte_count"] = 0
+        s3 = dict(s2)
+        s3["Rc"] = s2["Rc"] * (rp.one - (s2["alpha"] >> 1)) >> Q_BITS
+        state.update(s3)
+        return state["Rc"]
+
+    elapsed_alpha = (now - state["last_alpha_update"]) & m["timer"]
+    elapsed_T = (now - state["last_T_update"]) & m["timer"]
+    s2["byte_count"] = (state["byte_count"] + (sent & m["data_sent"])) & m["byte_count"]
+    s3 = dict(s2)
+    later = (now + UPDATE_DELAY) & m["timer"]
+    if elapsed_alpha >= rp.K:
+        s3["alpha"] = s2["alpha"] * (rp.one - rp.g) >> Q_BITS
+        s3["last_alpha_update"] = later
+    TC_update = elapsed_T >= rp.T
+    if TC_update:
+        s3["last_T_update"] = later
+        if s2["TC"] < rp.F:
+            s3["TC"] = s2["TC"] + 1
+    BC_update = s2["byte_count"] >= rp.B
+    if BC_update:
+        s3["byte_count"] = 0
+        if s2["BC"] < rp.F:
+            s3["BC"] = s2["BC"] + 1
+    s4 = dict(s3)
+    if TC_update or BC_update:
+        s4["Rc"] = (s3["Rc"] + s3["Rt"]) >> 1
+        if s3["TC"] >= rp.F and s3["BC"] >= rp.F:
+            step = rp.Rhai
+        elif s3["TC"] >= rp.F or s3["BC"] >= rp.F:
+            step = rp.Rai
+        else:
+            step = 0
+        if step:
+            s4["Rt"] = min(s3["Rt"] + step, s3["R_max"])
+    state.update(s4)
+    return state["Rc"]
+
+
+def verify_against_rtl(num_flows=16, sim_time=300_000, seed=0):
+    """
+    Vectorized rounds against reference_update, at the hardware widths and with
+    a 10-bit timer and 8-bit rates (frequent wraps and clamps).
+    """
+    t, flow_ids, is_cnp = random_notifications(num_flows, sim_time, 2e-5, 5e-4, seed)
+    sent = np.random.default_rng(seed).integers(0, 2, size=len(t))
+    same = True
+    for widths in (HW_WIDTHS, {**HW_WIDTHS, "timer": 10, "rate": 10}):
+        rp = FixedWidthReactionPoints(num_flows, widths, Rc_init=300)
+        rates = rp.notify(t, flow_ids, is_cnp, sent)
+        order = np.lexsort((~is_cnp, t))
+        states = [
+            {
+                "Rc": 300,
+                "Rt": 300,
+                "R_max": rp.mask["rate"],
+                "alpha": 0,
+                "last_alpha_update": 0,
+                "last_T_update": 0,
+                "TC": 0,
+                "BC": 0,
+                "byte_count": 0,
+            }
+            for _ in range(num_flows)
+        ]
+        expected = np.empty(len(t), dtype=np.int64)
+        for i in order.tolist():
+            expected[i] = reference_update(
+                states[flow_ids[i]], int(t[i]), bool(is_cnp[i]), int(sent[i]), rp
+            )
+        same &= np.array_equal(rates, expected)
+        print(
+            f"Fixed-width RPs match the RTL stages ({widths['timer']}-bit timer, "
+            f"{widths['rate']}-bit rates): {np.array_equal(rates, expected)} "
+            f"({len(t):,} notifications, {rp.rt_clamps} R_max clamps)"
+        )
+    return same
+
+
+def compare_widths(num_flows, t, flow_ids, is_cnp, sent):
+    """
+    Rates at the hardware widths, at WIDE_WIDTHS and with one field widened at a
+    time: notifications whose rate differs from the wide run, per run. A field
+    whose widening alone removes the differences is too narrow.
+    """
+    reference = FixedWidthReactionPoints(num_flows, WIDE_WIDTHS)
+    wide_rates = reference.notify(t, flow_ids, is_cnp, sent)
+    runs = {"hardware": HW_WIDTHS}
+    for field in ("rate", "timer", "byte_count", "data_sent"):
+        runs[f"wide {field}"] = {**HW_WIDTHS, field: WIDE_WIDTHS[field]}
+    report = {}
+    for name, widths in runs.items():
+        rp = FixedWidthReactionPoints(num_flows, widths)
+        rates = rp.notify(t, flow_ids, is_cnp, sent)
+        differ = rates != wide_rates
+        error = np.abs(rates - wide_rates) / np.maximum(wide_rates, 1)
+        report[name] = (int(differ.sum()), float(error.max(initial=0)), rp.rt_clamps)
+        print(
+            f"{name:16s} {differ.sum():9,d} rates differ from the wide run "
+            f"(max relative error {error.max(initial=0):.2e}, "
+            f"{rp.rt_clamps:,} R_max clamps)"
+        )
+    return report
+
+
+def scan_notifications(num_flows, sim_time):
+    """Round-robin data_sent = 0 scans of RP_input_queue, one flow per idle cycle."""
+    t = np.arange(sim_time, dtype=np.int64)
+    return t, t % num_flows, np.zeros(sim_time, dtype=bool), np.zeros(sim_time, int)
+
+
+if __name__ == "__main__":
+    verify_against_rtl()
+
+    # 262k flows: random CNPs and data notifications on top of the idle scans
+    num_flows, sim_time = 262_144, 2_000_000
+    t, flow_ids, is_cnp = random_notifications(num_flows, sim_time, 1e-7, 2e-6, 0)
+    scan_t, scan_flows, scan_cnp, scan_sent = scan_notifications(num_flows, sim_time)
+    t = np.r_[t, scan_t]
+    flow_ids = np.r_[flow_ids, scan_flows]
+    is_cnp = np.r_[is_cnp, scan_cnp]
+    sent = np.r_[np.ones(len(t) - sim_time, dtype=np.int64), scan_sent]
+    print(f"Scan period {num_flows:,} cycles, timer period {1 << GLOBAL_TIMER_WIDTH:,}")
+
+    for name, widths in (("hardware", HW_WIDTHS), ("wide", WIDE_WIDTHS)):
+        rp = FixedWidthReactionPoints(num_flows, widths)
+        start = time.perf_counter()
+        rp.notify(t, flow_ids, is_cnp, sent)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name}: {rp.bytes_per_flow()} B/flow, {len(t):,} notifications "
+            f"in {elapsed:.2f} s"
+        )
+    compare_widths(num_flows, t, flow_ids, is_cnp, sent)
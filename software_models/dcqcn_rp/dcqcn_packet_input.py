@@ -9,6 +9,7 @@ import matplotlib.pyplot as plt
 from collections import deque
 from dcqcn_constants import *
 from RoCE_packet import RoCEPacket
+from plot_decimation import decimate, decimate_events, finish
 
 """
 # --- Utility function to load app layer rate changes ---
@@ -200,9 +201,13 @@ if __name__ == "__main__":
     plt.figure(figsize=(10, 7))
 
     plt.subplot(3, 1, 1)
-    plt.plot(rp.time_history, rp.rate_history, label="RP Rate (Rc)", color="b")
+    plt.plot(
+        *decimate(rp.time_history, rp.rate_history, PLOT_BUCKETS),
+        label="RP Rate (Rc)",
+        color="b",
+    )
     if cn_np.cnp_events:
-        times = [t for t, _ in cn_np.cnp_events]
+        times = decimate_events([t for t, _ in cn_np.cnp_events], PLOT_BUCKETS)
         rates = [rp.rate_history[t] for t in times]
         plt.scatter(times, rates, color="r", marker="x", label="CNP Arrival")
 
@@ -224,14 +229,12 @@ if __name__ == "__main__":
 
     plt.subplot(3, 1, 2)
     plt.plot(
-        rp.time_history,
-        cn_np.output_buffer_history,
+        *decimate(rp.time_history, cn_np.output_buffer_history, PLOT_BUCKETS),
         label="Output Buffer Occupancy",
         color="m",
     )
     plt.plot(
-        rp.time_history,
-        rp.input_buffer_history,
+        *decimate(rp.time_history, rp.input_buffer_history, PLOT_BUCKETS),
         label="Input Buffer Occupancy",
         color="b",
     )
@@ -244,7 +247,11 @@ if __name__ == "__main__":
 
     # Second plot: Alpha Adjustment
     plt.subplot(3, 1, 3)
-    plt.plot(rp.time_history, rp.alpha_history, label="Alpha History", color="g")
+    plt.plot(
+        *decimate(rp.time_history, rp.alpha_history, PLOT_BUCKETS),
+        label="Alpha History",
+        color="g",
+    )
     plt.xlabel("Time (us)")
     plt.ylabel("Alpha Value")
     plt.title("Alpha Adjustment Over Time")
@@ -252,4 +259,4 @@ if __name__ == "__main__":
     plt.grid()
 
     plt.tight_layout()
-    plt.show()
+    finish(plt.gcf(), PLOT_DIR, "dcqcn_packet_input")
@@ -4,16 +4,18 @@ Allows for running a series of simulations for different RP params
 Reads app layer rates from the csv as an input
 """
 
+import json
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 from collections import deque
+from types import SimpleNamespace
+import dcqcn_constants
 from dcqcn_constants import *
-
-
-# --- Utility function to load app layer rate changes ---
-def load_app_rate_timestamps(file_path):
-    with open(file_path, "r") as f:
-        return [tuple(map(int, line.strip().split())) for line in f if line.strip()]
+from batch_means import BatchMeans
+from result_cache import ResultCache, config_key
+from plot_decimation import decimate_events, finish, plot_series
+from model_io import load_app_rate_timestamps
 
 
 # --- Reaction Point (RP) Class ---
@@ -136,7 +138,14 @@ def run_simulation(
     CNP_THRESHOLD,
     CNP_DELAY,
     N,
+    monitor=None,
+    batch_ticks=CONVERGENCE_BATCH_TICKS,
 ):
+    """
+    monitor: BatchMeans (convergence_monitor) fed the mean RP rate and output
+    buffer of every batch_ticks ticks; the run (and the histories) end at the
+    first batch after which it converged.
+    """
     rp = ReactionPoint(RC_INIT, K, F, R_AI, G, ALPHA_INIT)
     cn_np = CongestionNotification(OUTPUT_RATE, CNP_THRESHOLD, CNP_DELAY, N)
 
@@ -154,78 +163,204 @@ def run_simulation(
         rp.process_input(t, current_app_rate, cn_np)
         event_flag = cn_np.tick(t)
         rp.update(event_flag)
+        if monitor is not None and (t + 1) % batch_ticks == 0:
+            monitor.add(
+                {
+                    "rate": np.mean(rp.rate_history[-batch_ticks:]),
+                    "output_buffer": np.mean(
+                        cn_np.output_buffer_history[-batch_ticks:]
+                    ),
+                }
+            )
+            if monitor.converged:
+                break
 
     return rp, cn_np
 
 
-if __name__ == "__main__":
-    app_rate_changes = load_app_rate_timestamps(APP_RATE_INPUT_PATH)
-
-    """
-    To run series of simulations uncomment RUN SERIES section, choose series parameter(s);
-    Otherwise run simulation once for default params defined in dcqcn_constants
-    """
-    # """
-    # RUN ONCE
-    rp, cn_np = run_simulation(
-        app_rate_changes,
-        END_OF_TIME,
-        RC_INIT,
-        K,
-        F,
-        R_AI,
-        G,
-        ALPHA_INIT,
-        OUTPUT_RATE,
-        CNP_THRESHOLD,
-        CNP_DELAY,
-        N,
+def convergence_monitor(
+    confidence=CONVERGENCE_CONFIDENCE,
+    rel_tol=CONVERGENCE_REL_TOL,
+    buffer_tol=CONVERGENCE_QUEUE_TOL,
+    min_batches=CONVERGENCE_MIN_BATCHES,
+):
+    """BatchMeans for run_simulation and its engines (empty buffers need buffer_tol)."""
+    return BatchMeans(
+        confidence,
+        rel_tol,
+        min_batches=min_batches,
+        tolerances={"output_buffer": (rel_tol, buffer_tol)},
     )
 
-    plt.figure(figsize=(10, 7))
 
-    plt.subplot(2, 1, 1)
-    plt.plot(rp.time_history, rp.rate_history, label="RP Rate (Rc)", color="b")
-    if cn_np.cnp_events:
-        times = [t for t, _ in cn_np.cnp_events]
-        rates = [rp.rate_history[t] for t in times]
-        plt.scatter(times, rates, color="r", marker="x", label="CNP Arrival")
+def result_arrays(rp, cn_np):
+    """Histories and CNP events of a run as columns."""
+    time_history = np.asarray(rp.time_history)
+    empty = np.full(len(time_history), np.nan)
+    return {
+        "time": time_history,
+        "rate": np.asarray(rp.rate_history, dtype=float),
+        "alpha": np.asarray(rp.alpha_history, dtype=float),
+        "app_rate": np.asarray(getattr(rp, "app_rate_history", empty), dtype=float),
+        "input_buffer": np.asarray(rp.input_buffer_history, dtype=float),
+        "output_buffer": np.asarray(cn_np.output_buffer_history, dtype=float),
+        "cnp_time": np.array([t for t, _ in cn_np.cnp_events], dtype=np.int64),
+        "cnp_buffer": np.array([b for _, b in cn_np.cnp_events], dtype=float),
+    }
+
 
-    plt.plot(
-        rp.time_history,
-        rp.app_rate_history,
+def plot_results(results, title, plot_dir=PLOT_DIR, name="dcqcn_simulation", dpi=150):
+    """
+    Rate and buffer plots of result_arrays (or a loaded export_results file),
+    decimated to PLOT_BUCKETS pixel columns. Shown, or saved to plot_dir.
+    """
+    time_history = results["time"]
+    fig, (ax_rate, ax_buffer) = plt.subplots(2, 1, figsize=(10, 7))
+    plot_series(
+        ax_rate,
+        time_history,
+        results["rate"],
+        PLOT_BUCKETS,
+        label="RP Rate (Rc)",
+        color="b",
+    )
+    cnp_time = decimate_events(results["cnp_time"], PLOT_BUCKETS)
+    if len(cnp_time):
+        # Histories hold one sample per us from t = 0
+        ax_rate.scatter(
+            cnp_time,
+            results["rate"][cnp_time],
+            color="r",
+            marker="x",
+            label="CNP Arrival",
+        )
+    plot_series(
+        ax_rate,
+        time_history,
+        results["app_rate"],
+        PLOT_BUCKETS,
         label="App Layer Rate",
         color="c",
         linestyle="--",
     )
-    plt.axhline(OUTPUT_RATE, color="y", linestyle="dotted", label="Output Rate")
-    plt.xlabel("Time (us)")
-    plt.ylabel("Rate (B/us)")
-    plt.title(f"RP Rate, g={G:.1f}")
-    plt.legend()
-    plt.grid()
-
-    plt.subplot(2, 1, 2)
-    plt.plot(
-        rp.time_history,
-        cn_np.output_buffer_history,
+    ax_rate.axhline(OUTPUT_RATE, color="y", linestyle="dotted", label="Output Rate")
+    ax_rate.set_xlabel("Time (us)")
+    ax_rate.set_ylabel("Rate (B/us)")
+    ax_rate.set_title(title)
+    ax_rate.legend()
+    ax_rate.grid()
+
+    plot_series(
+        ax_buffer,
+        time_history,
+        results["output_buffer"],
+        PLOT_BUCKETS,
         label="Output Buffer Occupancy",
         color="m",
     )
-    plt.plot(
-        rp.time_history,
-        rp.input_buffer_history,
+    plot_series(
+        ax_buffer,
+        time_history,
+        results["input_buffer"],
+        PLOT_BUCKETS,
         label="Input Buffer Occupancy",
         color="b",
     )
-    plt.axhline(CNP_THRESHOLD, color="r", linestyle="--", label="CNP Threshold")
-    plt.xlabel("Time (us)")
-    plt.ylabel("Buffer Size (B)")
-    plt.title("Buffer Occupancy Over Time")
-    plt.legend()
-    plt.grid()
-    plt.tight_layout()
-    plt.show()
+    ax_buffer.axhline(CNP_THRESHOLD, color="r", linestyle="--", label="CNP Threshold")
+    ax_buffer.set_xlabel("Time (us)")
+    ax_buffer.set_ylabel("Buffer Size (B)")
+    ax_buffer.set_title("Buffer Occupancy Over Time")
+    ax_buffer.legend()
+    ax_buffer.grid()
+    fig.tight_layout()
+    return finish(fig, plot_dir, name, dpi)
+
+
+def export_results(path, rp, cn_np, **params):
+    """
+    Histories and CNP events of a run as compressed NPZ columns; params (model
+    constants, seed, ...) are stored as JSON in the 0-d "metadata" array.
+    Also accepts the vectorized and adaptive models (histories as arrays).
+    """
+    np.savez_compressed(
+        path, **result_arrays(rp, cn_np), metadata=np.array(json.dumps(params))
+    )
+
+
+def cached_run_simulation(cache, app_rate_path, sim_time, *params):
+    """
+    run_simulation of the app rate file (params in run_simulation order), served
+    from cache (result_cache.ResultCache) while the constants, the file, the
+    model source and params are unchanged. Returns (rp, cn_np) with the
+    histories as arrays.
+    """
+    key = config_key(
+        (dcqcn_constants,),
+        (app_rate_path,),
+        os.path.dirname(os.path.abspath(__file__)),
+        engine="run_simulation",
+        sim_time=sim_time,
+        params=params,
+    )
+    arrays = cache.cached(
+        key,
+        lambda: result_arrays(
+            *run_simulation(load_app_rate_timestamps(app_rate_path), sim_time, *params)
+        ),
+    )
+    rp = SimpleNamespace(
+        time_history=arrays["time"],
+        rate_history=arrays["rate"],
+        alpha_history=arrays["alpha"],
+        app_rate_history=arrays["app_rate"],
+        input_buffer_history=arrays["input_buffer"],
+    )
+    cn_np = SimpleNamespace(
+        output_buffer_history=arrays["output_buffer"],
+        cnp_events=list(
+            zip(arrays["cnp_time"].tolist(), arrays["cnp_buffer"].tolist())
+        ),
+    )
+    return rp, cn_np
+
+
+if __name__ == "__main__":
+    app_rate_changes = load_app_rate_timestamps(APP_RATE_INPUT_PATH)
+
+    """
+    To run series of simulations uncomment RUN SERIES section, choose series parameter(s);
+    Otherwise run simulation once for default params defined in dcqcn_constants
+    """
+    # """
+    # RUN ONCE
+    params = (RC_INIT, K, F, R_AI, G, ALPHA_INIT, OUTPUT_RATE, CNP_THRESHOLD)
+    params += (CNP_DELAY, N)
+    if RESULT_CACHE_DIR is None:
+        rp, cn_np = run_simulation(app_rate_changes, END_OF_TIME, *params)
+    else:
+        cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES)
+        rp, cn_np = cached_run_simulation(
+            cache, APP_RATE_INPUT_PATH, END_OF_TIME, *params
+        )
+    if RESULTS_PATH is not None:
+        export_results(
+            RESULTS_PATH,
+            rp,
+            cn_np,
+            RC_INIT=RC_INIT,
+            K=K,
+            F=F,
+            R_AI=R_AI,
+            G=G,
+            ALPHA_INIT=ALPHA_INIT,
+            OUTPUT_RATE=OUTPUT_RATE,
+            CNP_THRESHOLD=CNP_THRESHOLD,
+            CNP_DELAY=CNP_DELAY,
+            N=N,
+            END_OF_TIME=END_OF_TIME,
+        )
+
+    plot_results(result_arrays(rp, cn_np), f"RP Rate, g={G:.1f}")
     # """
 
     # RUN SERIES
@@ -250,51 +385,11 @@ if __name__ == "__main__":
             N,
         )
 
-        plt.figure(figsize=(10, 7))
-
-        plt.subplot(2, 1, 1)
-        plt.plot(rp.time_history, rp.rate_history, label="RP Rate (Rc)", color="b")
-        if cn_np.cnp_events:
-            times = [t for t, _ in cn_np.cnp_events]
-            rates = [rp.rate_history[t] for t in times]
-            plt.scatter(times, rates, color="r", marker="x", label="CNP Arrival")
-
-        plt.plot(
-            rp.time_history,
-            rp.app_rate_history,
-            label="App Layer Rate",
-            color="c",
-            linestyle="--",
-        )
-        plt.axhline(OUTPUT_RATE, color="y", linestyle="dotted", label="Output Rate")
-        plt.xlabel("Time (us)")
-        plt.ylabel("Rate (B/us)")
-        plt.title(f"RP Rate, g={G:.1f}")
-        plt.legend()
-        plt.grid()
-
-        plt.subplot(2, 1, 2)
-        plt.plot(
-            rp.time_history,
-            cn_np.output_buffer_history,
-            label="Output Buffer Occupancy",
-            color="m",
+        plot_results(
+            result_arrays(rp, cn_np),
+            f"RP Rate, g={G:.1f}",
+            plot_dir=FIG_OUT_PATH,
+            name=f"dcqcn_simulation_1_{i}",
+            dpi=300,
         )
-        plt.plot(
-            rp.time_history,
-            rp.input_buffer_history,
-            label="Input Buffer Occupancy",
-            color="b",
-        )
-        plt.axhline(CNP_THRESHOLD, color="r", linestyle="--", label="CNP Threshold")
-        plt.xlabel("Time (us)")
-        plt.ylabel("Buffer Size (B)")
-        plt.title("Buffer Occupancy Over Time")
-        plt.legend()
-        plt.grid()
-
-        output_path = f"{FIG_OUT_PATH}/dcqcn_simulation_1_{i}.png"
-
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=300)
     """
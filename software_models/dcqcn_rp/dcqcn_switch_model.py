@@ -0,0 +1,318 @@
+"""
+Many-RP model of DCQCN behind a multi-port switch
+Every flow has an RP (ReactionPointArray, one array element per flow) and sends
+to one egress port of the switch (SwitchModel). Ports keep array-backed queues
+and mark arriving data RED/ECN style between KMIN and KMAX; the NP sends a CNP
+per marked flow at most once per N us. All flows and ports advance in one
+batched update per tick, so incast and fairness can be studied at high fan-in.
+Given a BatchMeans monitor (convergence_monitor), the run stops once the batch
+means of every port's queue and summed RP rate have converged.
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+from dcqcn_constants import *
+from batch_means import BatchMeans
+from plot_decimation import finish, plot_series
+from dcqcn_series_model import load_app_rate_timestamps, run_simulation
+
+
+# --- Reaction Points, one array element per flow ---
+class ReactionPointArray:
+    def __init__(self, num_flows, Rc_init, K, F, Rai, g, alpha_init):
+        self.Rc = np.full(num_flows, Rc_init, dtype=float)
+        self.Rt = self.Rc.copy()
+        self.K = K
+        self.F = F
+        self.Rai = Rai
+        self.g = g
+        self.alpha = np.full(num_flows, alpha_init, dtype=float)
+
+        self.FR_timer = np.ones(num_flows, dtype=np.int64)
+        self.F_cnt = np.ones(num_flows, dtype=np.int64)
+        self.alpha_timer = np.ones(num_flows, dtype=np.int64)
+        self.input_buffer = np.zeros(num_flows)
+
+    def process_input(self, app_rate):
+        """Data sent by every flow this tick; app_rate None = always backlogged."""
+        if app_rate is None:
+            return self.Rc.copy()
+        self.input_buffer += app_rate
+        data_to_transfer = np.minimum(self.Rc, self.input_buffer)
+        self.input_buffer -= data_to_transfer
+        return data_to_transfer
+
+    def update(self, event_flags):
+        """ReactionPoint.update for all flows; event_flags marks CNP arrivals."""
+        e = event_flags
+        self.alpha = np.where(e, (1 - self.g) * self.alpha + self.g, self.alpha)
+        self.Rt = np.where(e, self.Rc, self.Rt)
+        self.Rc = np.where(e, self.Rc * (1 - self.alpha / 2), self.Rc)
+        self.FR_timer[e] = 1
+        self.F_cnt[e] = 1
+        self.alpha_timer[e] = 1
+
+        decay = self.alpha_timer % self.K == 0
+        self.alpha = np.where(decay, (1 - self.g) * self.alpha, self.alpha)
+
+        timer = self.FR_timer % self.K == 0
+        fast_recovery = timer & (self.F_cnt <= self.F)
+        additive = timer & ~fast_recovery
+        self.F_cnt += fast_recovery
+        self.Rt = np.where(additive, self.Rt + self.Rai, self.Rt)
+        self.Rc = np.where(timer, (self.Rt + self.Rc) / 2, self.Rc)
+
+        self.FR_timer += 1
+        self.alpha_timer += 1
+
+
+# --- Switch egress ports with ECN marking and the NP ---
+class SwitchModel:
+    def __init__(
+        self, port_of_flow, port_rates, Kmin, Kmax, P_max, CNP_DELAY, N, seed=0
+    ):
+        self.port_of_flow = np.asarray(port_of_flow, dtype=np.int64)
+        self.port_rates = np.asarray(port_rates, dtype=float)
+        self.num_ports = len(self.port_rates)
+        self.num_flows = len(self.port_of_flow)
+        self.Kmin = Kmin
+        self.Kmax = Kmax
+        self.P_max = P_max
+        self.CNP_DELAY = CNP_DELAY
+        self.N = N
+        self.rng = np.random.default_rng(seed)
+
+        self.queues = np.zeros(self.num_ports)  # Bytes per port
+        # Data reaches the switch CNP_DELAY ticks after it is sent
+        self.data_ring = np.zeros((CNP_DELAY + 1, self.num_flows))
+        # CNPs reach their RP CNP_DELAY + 1 ticks after generation
+        self.cnp_ring = np.zeros((CNP_DELAY + 2, self.num_flows), dtype=bool)
+        self.next_cnp = np.zeros(self.num_flows, dtype=np.int64)  # Per-flow N us timer
+        self.cnp_count = np.zeros(self.num_flows, dtype=np.int64)
+
+    def add_data(self, data, t):
+        self.data_ring[(t + self.CNP_DELAY) % len(self.data_ring)] = data
+
+    def mark_probability(self, queues):
+        """RED/ECN marking: 0 up to Kmin, linear to P_max at Kmax, 1 above."""
+        ramp = self.P_max * (queues - self.Kmin) / max(self.Kmax - self.Kmin, 1)
+        return np.where(
+            queues > self.Kmax, 1.0, np.where(queues > self.Kmin, ramp, 0.0)
+        )
+
+    def tick(self, t):
+        """Enqueue, drain, mark and generate CNPs; returns the CNPs arriving at t."""
+        slot = t % len(self.data_ring)
+        arrivals = self.data_ring[slot].copy()
+        port_arrivals = np.bincount(
+            self.port_of_flow, weights=arrivals, minlength=self.num_ports
+        )
+        self.data_ring[slot] = 0
+        self.queues = np.maximum(0, self.queues + port_arrivals - self.port_rates)
+
+        # Marking of the data arriving now, CNP unless the flow's timer is running
+        p = self.mark_probability(self.queues)[self.port_of_flow]
+        marked = (arrivals > 0) & (self.rng.random(self.num_flows) < p)
+        cnp = marked & (self.next_cnp <= t)
+        self.next_cnp[cnp] = t + self.N - 1
+        self.cnp_count += cnp
+        self.cnp_ring[(t + self.CNP_DELAY + 1) % len(self.cnp_ring)] |= cnp
+
+        slot = t % len(self.cnp_ring)
+        events = self.cnp_ring[slot].copy()
+        self.cnp_ring[slot] = False
+        return events
+
+
+# --- Simulation Function ---
+def run_switch_simulation(
+    port_of_flow,
+    port_rates,
+    sim_time,
+    app_rate=None,
+    RC_INIT=RC_INIT,
+    K=K,
+    F=F,
+    R_AI=R_AI,
+    G=G,
+    ALPHA_INIT=ALPHA_INIT,
+    Kmin=KMIN,
+    Kmax=KMAX,
+    P_max=P_MAX,
+    CNP_DELAY=CNP_DELAY,
+    N=N,
+    seed=0,
+    monitor=None,
+    batch_ticks=CONVERGENCE_BATCH_TICKS,
+):
+    """
+    app_rate: None (backlogged flows), a per-flow array, or a function t -> array.
+    Returns the RPs, the switch and histories of port queues and per-port rate sums.
+    monitor: BatchMeans fed the per-port means of every batch_ticks ticks; the
+    run (and the histories) end at the first batch after which it converged.
+    """
+    rps = ReactionPointArray(len(port_of_flow), RC_INIT, K, F, R_AI, G, ALPHA_INIT)
+    switch = SwitchModel(
+        port_of_flow, port_rates, Kmin, Kmax, P_max, CNP_DELAY, N, seed
+    )
+    queue_history = np.empty((sim_time, switch.num_ports))
+    port_rate_history = np.empty((sim_time, switch.num_ports))
+
+    for t in range(sim_time):
+        rate = app_rate(t) if callable(app_rate) else app_rate
+        switch.add_data(rps.process_input(rate), t)
+        rps.update(switch.tick(t))
+        queue_history[t] = switch.queues
+        port_rate_history[t] = np.bincount(
+            switch.port_of_flow, weights=rps.Rc, minlength=switch.num_ports
+        )
+        if monitor is not None and (t + 1) % batch_ticks == 0:
+            batch = slice(t + 1 - batch_ticks, t + 1)
+            monitor.add(
+                {
+                    "queue": queue_history[batch].mean(axis=0),
+                    "port_rate": port_rate_history[batch].mean(axis=0),
+                }
+            )
+            if monitor.converged:
+                queue_history = queue_history[: t + 1]
+                port_rate_history = port_rate_history[: t + 1]
+                break
+
+    return rps, switch, queue_history, port_rate_history
+
+
+def convergence_monitor(
+    confidence=CONVERGENCE_CONFIDENCE,
+    rel_tol=CONVERGENCE_REL_TOL,
+    queue_tol=CONVERGENCE_QUEUE_TOL,
+    min_batches=CONVERGENCE_MIN_BATCHES,
+):
+    """BatchMeans for run_switch_simulation (empty queues need queue_tol)."""
+    return BatchMeans(
+        confidence,
+        rel_tol,
+        min_batches=min_batches,
+        tolerances={"queue": (rel_tol, queue_tol)},
+    )
+
+
+def jain_fairness(rates, port_of_flow, num_ports):
+    """Jain's fairness index of the flow rates sharing each port."""
+    port_of_flow = np.asarray(port_of_flow)
+    n = np.bincount(port_of_flow, minlength=num_ports)
+    total = np.bincount(port_of_flow, weights=rates, minlength=num_ports)
+    squares = np.bincount(port_of_flow, weights=rates**2, minlength=num_ports)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total**2 / (n * squares)
+
+
+def verify_single_flow(app_rate_changes, sim_time):
+    """
+    One flow on one port with Kmin = Kmax = CNP_THRESHOLD (hard threshold) must
+    reproduce run_simulation of dcqcn_series_model.
+    """
+    rp, cn_np = run_simulation(
+        app_rate_changes,
+        sim_time,
+        RC_INIT,
+        K,
+        F,
+        R_AI,
+        G,
+        ALPHA_INIT,
+        OUTPUT_RATE,
+        CNP_THRESHOLD,
+        CNP_DELAY,
+        N,
+    )
+    times = [t for t, _ in app_rate_changes[1:]]
+    rates = [rate for _, rate in app_rate_changes]
+    rps, switch, queue_history, _ = run_switch_simulation(
+        [0],
+        [OUTPUT_RATE],
+        sim_time,
+        app_rate=lambda t: rates[np.searchsorted(times, t, side="right")],
+        Kmin=CNP_THRESHOLD,
+        Kmax=CNP_THRESHOLD,
+    )
+    same = np.allclose(queue_history[:, 0], cn_np.output_buffer_history) and np.isclose(
+        rps.Rc[0], rp.rate_history[-1]
+    )
+    print(f"Single flow matches dcqcn_series_model: {same}")
+    return same
+
+
+if __name__ == "__main__":
+    verify_single_flow(load_app_rate_timestamps(APP_RATE_INPUT_PATH), END_OF_TIME)
+
+    # Incast: a quarter of the flows share port 0, the rest spread over the other ports
+    num_flows, num_ports = 1024, 16
+    port_of_flow = np.concatenate(
+        (
+            np.zeros(num_flows // 4, dtype=np.int64),
+            1 + np.arange(num_flows - num_flows // 4) % (num_ports - 1),
+        )
+    )
+    monitor = convergence_monitor()
+    rps, switch, queue_history, port_rate_history = run_switch_simulation(
+        port_of_flow, np.full(num_ports, PORT_RATE), 4 * END_OF_TIME, monitor=monitor
+    )
+    print(f"Stopped after {len(queue_history)} of {4 * END_OF_TIME} us")
+    monitor.print_report()
+    fairness = jain_fairness(rps.Rc, port_of_flow, num_ports)
+    print(f"CNPs sent: {switch.cnp_count.sum()}")
+    print(f"Jain fairness, incast port: {fairness[0]:.3f}")
+    print(f"Jain fairness, other ports (mean): {np.nanmean(fairness[1:]):.3f}")
+
+    # One sample per us; histories are decimated to PLOT_BUCKETS pixel columns
+    fig, (ax_rate, ax_queue) = plt.subplots(2, 1, figsize=(10, 7))
+    plot_series(
+        ax_rate,
+        None,
+        port_rate_history[:, 0],
+        PLOT_BUCKETS,
+        label="Incast port",
+        color="r",
+    )
+    plot_series(
+        ax_rate,
+        None,
+        port_rate_history[:, 1:].mean(axis=1),
+        PLOT_BUCKETS,
+        label="Other ports",
+        color="b",
+    )
+    ax_rate.axhline(PORT_RATE, color="y", linestyle="dotted", label="Port Rate")
+    ax_rate.set_xlabel("Time (us)")
+    ax_rate.set_ylabel("Sum of RP Rates (B/us)")
+    ax_rate.set_yscale("log")
+    ax_rate.set_title(f"Offered load per port, {num_flows} flows")
+    ax_rate.legend()
+    ax_rate.grid()
+
+    plot_series(
+        ax_queue,
+        None,
+        queue_history[:, 0],
+        PLOT_BUCKETS,
+        label="Incast port",
+        color="r",
+    )
+    plot_series(
+        ax_queue,
+        None,
+        queue_history[:, 1:].mean(axis=1),
+        PLOT_BUCKETS,
+        label="Other ports",
+        color="b",
+    )
+    ax_queue.axhline(KMIN, color="g", linestyle="--", label="Kmin")
+    ax_queue.axhline(KMAX, color="m", linestyle="--", label="Kmax")
+    ax_queue.set_xlabel("Time (us)")
+    ax_queue.set_ylabel("Queue Size (B)")
+    ax_queue.set_title("Port Queue Occupancy Over Time")
+    ax_queue.legend()
+    ax_queue.grid()
+    fig.tight_layout()
+    finish(fig, PLOT_DIR, "dcqcn_switch")
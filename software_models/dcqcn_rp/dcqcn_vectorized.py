@@ -0,0 +1,326 @@
+"""
+Vectorized model of the RP and DCQCN rate adjustment mechanism
+Same model as dcqcn_series_model, but advanced in chunks of VECTOR_CHUNK us:
+the RP rate is piecewise constant between K-timer boundaries and CNP arrivals,
+so both buffers follow a Lindley recursion b_t = max(0, b_(t-1) + x_t), solved
+with cumulative sums rounded as the per-tick loop. Each chunk stops at its first
+CNP_THRESHOLD crossing outside the N us CNP holdoff; the CNP then reaches the RP
+CNP_DELAY + 1 us later. CNPs fall on the same ticks as in run_simulation, even
+where a buffer lands exactly on CNP_THRESHOLD.
+"""
+
+import time
+
+import numpy as np
+from dcqcn_constants import *
+from dcqcn_series_model import load_app_rate_timestamps, run_simulation
+
+
+def lindley(b0, inflow, outflow):
+    """
+    All states of b_t = max(0, (b_(t-1) + inflow_t) - outflow_t) starting from b0,
+    rounded as the per-tick loop of run_simulation: a run of non-empty steps is one
+    sequential cumulative sum over the interleaved inflows and outflows (cumsum
+    accumulates left to right), and a run restarts from 0 after each empty step.
+    """
+    n = len(inflow)
+    steps = np.empty(2 * n)
+    steps[0::2] = inflow
+    steps[1::2] = -np.asarray(outflow)
+    from_empty = inflow - outflow  # (0 + inflow_t) - outflow_t
+    buffer = np.zeros(n)
+    t, b = 0, b0
+    while t < n:
+        if b <= 0:
+            # Skip the steps that stay empty
+            filling = np.flatnonzero(from_empty[t:] > 0)
+            if len(filling) == 0:
+                break
+            t += filling[0]
+            b = 0
+        run = np.cumsum(np.concatenate(([b], steps[2 * t :])))[2::2]
+        empty = np.flatnonzero(run <= 0)
+        end = t + empty[0] if len(empty) else n
+        buffer[t:end] = run[: end - t]
+        t, b = end + 1, 0
+    return buffer
+
+
+def app_rate_per_step(app_rate_changes, sim_time):
+    """App layer rate of every step, as switched by run_simulation."""
+    times = np.array([t for t, _ in app_rate_changes[1:]], dtype=np.int64)
+    rates = np.array([rate for _, rate in app_rate_changes])
+    return rates[np.searchsorted(times, np.arange(sim_time), side="right")]
+
+
+# --- Reaction Point (RP) with piecewise constant rate ---
+class VectorReactionPoint:
+    def __init__(self, Rc_init, K, F, Rai, g, alpha_init):
+        self.Rc = Rc_init
+        self.Rt = Rc_init
+        self.K = K
+        self.F = F
+        self.Rai = Rai
+        self.g = g
+        self.alpha = alpha_init
+
+        self.FR_timer = 1
+        self.F_cnt = 1
+        self.alpha_timer = 1
+        self.input_buffer = 0
+        self.cnp_arrivals = []  # Pending CNP arrival times, ascending
+
+    def state(self):
+        return dict(self.__dict__, cnp_arrivals=list(self.cnp_arrivals))
+
+    def restore(self, state):
+        self.__dict__.update(state)
+        self.cnp_arrivals = list(state["cnp_arrivals"])
+
+    def update(self, event_flag):
+        """One ReactionPoint.update step (without history)."""
+        if event_flag:
+            self.alpha = (1 - self.g) * self.alpha + self.g
+            self.Rt = self.Rc
+            self.Rc = self.Rc * (1 - self.alpha / 2)
+            self.FR_timer = 1
+            self.F_cnt = 1
+            self.alpha_timer = 1
+
+        if self.alpha_timer % self.K == 0:
+            self.alpha = (1 - self.g) * self.alpha
+
+        if self.FR_timer % self.K == 0:
+            if self.F_cnt <= self.F:
+                self.Rc = (self.Rt + self.Rc) / 2
+                self.F_cnt += 1
+            else:
+                self.Rt += self.Rai
+                self.Rc = (self.Rt + self.Rc) / 2
+
+        self.FR_timer += 1
+        self.alpha_timer += 1
+
+    def advance(
+        self, t0, t1, app_rate, rate_out, alpha_out, input_buffer_out, sent_out
+    ):
+        """
+        Run steps t0..t1-1: the rate only changes at timer boundaries and CNP
+        arrivals, so one scalar update per boundary and a Lindley recursion for
+        the input buffer. Histories are written into the *_out arrays.
+        """
+        lengths, seg_rates, seg_alphas = self.segments(t0, t1)
+
+        # Rate used to send at each step; the history holds the value after the update
+        rate_used = np.repeat(seg_rates[:-1], lengths)
+        rate_out[t0 : t1 - 1] = rate_used[1:]
+        rate_out[t1 - 1] = self.Rc
+        alpha_out[t0 : t1 - 1] = np.repeat(seg_alphas[:-1], lengths)[1:]
+        alpha_out[t1 - 1] = self.alpha
+
+        # Input buffer: fills at app rate, drains at Rc
+        app = app_rate[t0:t1]
+        buffer = lindley(self.input_buffer, app, rate_used)
+        previous = np.concatenate(([self.input_buffer], buffer[:-1]))
+        # A non-empty buffer sends Rc, an emptied one all it held
+        sent_out[t0:t1] = np.where(buffer > 0, rate_used, previous + app)
+        input_buffer_out[t0:t1] = buffer
+        self.input_buffer = buffer[-1]
+
+    def segments(self, t0, t1):
+        """
+        Apply the updates of steps t0..t1-1. Returns the lengths of the constant
+        (Rc, alpha) segments, each ending with the step that changes them, and the
+        values before each segment plus the final ones.
+        """
+        lengths, seg_rates, seg_alphas = [], [self.Rc], [self.alpha]
+        s = t0
+        while s < t1:
+            # Next step at which update() changes the rate or alpha
+            boundary = s + min((-self.FR_timer) % self.K, (-self.alpha_timer) % self.K)
+            event = self.cnp_arrivals[0] if self.cnp_arrivals else t1
+            c = min(boundary, event, t1 - 1)
+
+            self.FR_timer += c - s
+            self.alpha_timer += c - s
+            event_flag = c == event
+            if event_flag:
+                self.cnp_arrivals.pop(0)
+            self.update(event_flag)
+            lengths.append(c - s + 1)
+            seg_rates.append(self.Rc)
+            seg_alphas.append(self.alpha)
+            s = c + 1
+        return lengths, seg_rates, seg_alphas
+
+
+# --- Congestion Notification/Notification Point (CN/NP), chunked ---
+class VectorCongestionNotification:
+    def __init__(self, Output_rate, CNP_THRESHOLD, CNP_DELAY, N):
+        self.Output_rate = Output_rate
+        self.CNP_THRESHOLD = CNP_THRESHOLD
+        self.CNP_DELAY = CNP_DELAY
+        self.N = N
+
+        self.output_buffer = 0
+        self.next_detection = 0  # First step outside the CNP holdoff
+        self.cnp_events = []
+
+    def advance(self, t0, t1, sent, output_buffer_out):
+        """
+        Buffer occupancy for steps t0..t1-1 from the RP output sent CNP_DELAY
+        earlier. Returns the step of the first CNP generated in the chunk, or None;
+        occupancy after that step is provisional, it depends on the RP reaction.
+        """
+        arrivals = np.zeros(t1 - t0)
+        first = min(max(t0, self.CNP_DELAY), t1)  # Nothing arrives before CNP_DELAY
+        arrivals[first - t0 :] = sent[first - self.CNP_DELAY : t1 - self.CNP_DELAY]
+        buffer = lindley(
+            self.output_buffer, arrivals, np.full(t1 - t0, self.Output_rate)
+        )
+        output_buffer_out[t0:t1] = buffer
+
+        start = max(t0, self.next_detection)
+        over = np.flatnonzero(buffer[start - t0 :] > self.CNP_THRESHOLD)
+        if len(over) == 0:
+            self.output_buffer = buffer[-1]
+            return None
+
+        t_cnp = start + over[0]
+        self.output_buffer = buffer[t_cnp - t0]
+        self.cnp_events.append((int(t_cnp), float(self.output_buffer)))
+        # The holdoff timer re-arms after N - 1 steps (never for N < 2)
+        self.next_detection = (
+            t_cnp + self.N - 1 if self.N >= 2 else np.iinfo(np.int64).max
+        )
+        return t_cnp
+
+
+# --- Simulation Function ---
+def run_vectorized_simulation(
+    app_rate_changes,
+    sim_time,
+    RC_INIT,
+    K,
+    F,
+    R_AI,
+    G,
+    ALPHA_INIT,
+    OUTPUT_RATE,
+    CNP_THRESHOLD,
+    CNP_DELAY,
+    N,
+    chunk=VECTOR_CHUNK,
+    monitor=None,
+    batch_ticks=CONVERGENCE_BATCH_TICKS,
+):
+    """
+    Same arguments and result attributes as run_simulation (histories as arrays).
+    Every chunk is planned without new CNPs; if the CN/NP generates one, both
+    models are committed up to that step and the RP re-plans with the CNP arrival.
+    With a monitor chunks end at batch boundaries, so the run stops at the same
+    tick as run_simulation.
+    """
+    rp = VectorReactionPoint(RC_INIT, K, F, R_AI, G, ALPHA_INIT)
+    cn_np = VectorCongestionNotification(OUTPUT_RATE, CNP_THRESHOLD, CNP_DELAY, N)
+
+    app_rate = app_rate_per_step(app_rate_changes, sim_time)
+    rate_history = np.empty(sim_time)
+    alpha_history = np.empty(sim_time)
+    input_buffer_history = np.empty(sim_time)
+    output_buffer_history = np.empty(sim_time)
+    sent = np.empty(sim_time)
+
+    t = 0
+    while t < sim_time:
+        t1 = min(t + chunk, sim_time)
+        if monitor is not None:
+            t1 = min(t1, (t // batch_ticks + 1) * batch_ticks)
+        rp_state = rp.state()
+        histories = (rate_history, alpha_history, input_buffer_history, sent)
+        rp.advance(t, t1, app_rate, *histories)
+        t_cnp = cn_np.advance(t, t1, sent, output_buffer_history)
+        if t_cnp is None:
+            t = t1
+        else:
+            # Commit steps t..t_cnp, the RP learns about the CNP CNP_DELAY + 1 later
+            rp.restore(rp_state)
+            rp.advance(t, t_cnp + 1, app_rate, *histories)
+            rp.cnp_arrivals.append(t_cnp + CNP_DELAY + 1)
+            t = t_cnp + 1
+
+        if monitor is not None and t % batch_ticks == 0:
+            batch = slice(t - batch_ticks, t)
+            monitor.add(
+                {
+                    "rate": rate_history[batch].mean(),
+                    "output_buffer": output_buffer_history[batch].mean(),
+                }
+            )
+            if monitor.converged:
+                sim_time = t
+
+    rp.time_history = np.arange(sim_time)
+    rp.app_rate_history = app_rate[:sim_time]
+    rp.rate_history = rate_history[:sim_time]
+    rp.alpha_history = alpha_history[:sim_time]
+    rp.input_buffer_history = input_buffer_history[:sim_time]
+    cn_np.output_buffer_history = output_buffer_history[:sim_time]
+    return rp, cn_np
+
+
+def compare_with_reference(app_rate_changes, sim_time, **params):
+    """Run both models with the default constants (overridable) and report deviations."""
+    args = dict(
+        RC_INIT=RC_INIT,
+        K=K,
+        F=F,
+        R_AI=R_AI,
+        G=G,
+        ALPHA_INIT=ALPHA_INIT,
+        OUTPUT_RATE=OUTPUT_RATE,
+        CNP_THRESHOLD=CNP_THRESHOLD,
+        CNP_DELAY=CNP_DELAY,
+        N=N,
+    )
+    args.update(params)
+
+    start = time.perf_counter()
+    rp, cn_np = run_simulation(app_rate_changes, sim_time, **args)
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    rp_v, cn_np_v = run_vectorized_simulation(app_rate_changes, sim_time, **args)
+    vectorized_time = time.perf_counter() - start
+
+    # Both models round alike, a divergence is a model bug
+    events = [t for t, _ in cn_np.cnp_events]
+    events_v = [t for t, _ in cn_np_v.cnp_events]
+    same = 0
+    while same < min(len(events), len(events_v)) and events[same] == events_v[same]:
+        same += 1
+    end = sim_time
+    if same < max(len(events), len(events_v)):
+        end = min(events[same : same + 1] + events_v[same : same + 1])
+        tie = cn_np.output_buffer_history[end] - args["CNP_THRESHOLD"]
+        print(f"CNPs diverge at t={end} us, reference buffer - threshold: {tie:.3e} B")
+    rate_error = np.max(np.abs(rp_v.rate_history[:end] - rp.rate_history[:end]))
+    buffer_error = np.max(
+        np.abs(cn_np_v.output_buffer_history[:end] - cn_np.output_buffer_history[:end])
+    )
+    print(f"CNP events: {len(events)}, identical up to divergence: {same}")
+    print(f"Max rate deviation before divergence: {rate_error:.3e} B/us")
+    print(f"Max output buffer deviation before divergence: {buffer_error:.3e} B")
+    print(f"Reference: {reference_time:.3f} s, vectorized: {vectorized_time:.3f} s")
+    return same, rate_error, buffer_error
+
+
+if __name__ == "__main__":
+    app_rate_changes = load_app_rate_timestamps(APP_RATE_INPUT_PATH)
+    compare_with_reference(app_rate_changes, END_OF_TIME)
+
+    # Long run: repeat the app rate pattern
+    period = app_rate_changes[-1][0] + 200
+    long_changes = [
+        (t + i * period, rate) for i in range(1000) for t, rate in app_rate_changes
+    ]
+    compare_with_reference(long_changes, 1000 * period)
@@ -0,0 +1,166 @@
+"""
+Bulk loaders and writers of the model input files
+  - flow groups CSV ("group_id,rate" header; rate in bps)
+  - app rate timeline ("time rate" per line; us, B/us; dcqcn_rp)
+  - Rc timeline ("time rate" per line; ns, Gbps; scheduler_single_flow)
+Text is parsed in one np.loadtxt call and checked against the format (columns,
+ordering, units). The parsed arrays are kept in a sidecar <file>.cache.npz that
+is reused while the file's size and mtime match, or its content hash does after
+a touch, so repeated runs of large inputs load in milliseconds.
+The scheduling_algorithm, dcqcn_rp and scheduler_single_flow copies of this file
+are identical; edit the scheduling_algorithm one and run
+software_models/check_shared_files.py --sync.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+CACHE_SUFFIX = ".cache.npz"
+FLOW_GROUPS_HEADER = "group_id,rate"
+# Below this a flow group rate (bps) was most likely written in kbps/Mbps/Gbps
+MIN_PLAUSIBLE_BPS = 1_000
+
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cached_load(path, parse, use_cache=True):
+    """
+    parse(path) -> dict of arrays, memoized in the sidecar cache of path.
+    A cache that cannot be written (read-only checkout) is skipped silently.
+    """
+    if not use_cache:
+        return parse(path)
+    cache_path = path + CACHE_SUFFIX
+    stat = os.stat(path)
+    stamp = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    content_hash = None
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cache:
+            cached = {k: cache[k] for k in cache.files}
+        if np.array_equal(cached.pop("_stamp"), stamp):
+            cached.pop("_hash")
+            return cached
+        content_hash = file_hash(path)
+        if str(cached.pop("_hash")) == content_hash:
+            write_cache(cache_path, cached, stamp, content_hash)  # Touched only
+            return cached
+
+    arrays = parse(path)
+    write_cache(cache_path, arrays, stamp, content_hash or file_hash(path))
+    return arrays
+
+
+def write_cache(cache_path, arrays, stamp, content_hash):
+    tmp_path = cache_path + ".tmp.npz"
+    try:
+        np.savez(tmp_path, _stamp=stamp, _hash=np.array(content_hash), **arrays)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+# --- Flow groups ---
+def parse_flow_groups(path):
+    with open(path) as f:
+        header = f.readline().strip().replace(" ", "")
+    if header != FLOW_GROUPS_HEADER:
+        raise ValueError(
+            f"{path}: expected header '{FLOW_GROUPS_HEADER}', got '{header}'"
+        )
+    values = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    if values.shape[1] != 2:
+        raise ValueError(f"{path}: expected 2 columns, got {values.shape[1]}")
+    group_ids = values[:, 0].astype(np.int64)
+    rates = values[:, 1]
+    if not np.array_equal(group_ids, values[:, 0]) or np.any(group_ids < 1):
+        raise ValueError(f"{path}: group ids must be positive integers")
+    if len(np.unique(group_ids)) != len(group_ids):
+        raise ValueError(f"{path}: duplicate group ids")
+    return {"group_id": group_ids, "rate": rates}
+
+
+def load_flow_group_arrays(path, min_rate=None, use_cache=True):
+    """
+    (group_ids, rates) in file order; rates must be bps. min_rate (optional) rejects
+    lower rates; without it they are returned as written.
+    """
+    arrays = cached_load(path, parse_flow_groups, use_cache)
+    group_ids, rates = arrays["group_id"], arrays["rate"]
+    if len(rates) and not np.all(np.isfinite(rates)):
+        raise ValueError(f"{path}: non-finite group rate")
+    if len(rates) and rates.max() < MIN_PLAUSIBLE_BPS:
+        raise ValueError(f"{path}: group rates must be in bps (max {rates.max()})")
+    if min_rate is not None and len(rates) and rates.min() < min_rate:
+        raise ValueError(f"{path}: group rate {rates.min()} below {min_rate} bps")
+    return group_ids, rates
+
+
+def load_flow_groups(path, min_rate=None, use_cache=True):
+    """Flow groups as {group_id: rate}, as load_flow_groups of the schedulers."""
+    group_ids, rates = load_flow_group_arrays(path, min_rate, use_cache)
+    return dict(zip(group_ids.tolist(), rates.tolist()))
+
+
+def write_flow_groups(path, group_ids, rates):
+    """Write the flow groups CSV in one call (rates rounded to 0.01 bps)."""
+    values = np.column_stack((np.asarray(group_ids), np.round(rates, 2)))
+    np.savetxt(
+        path,
+        values,
+        fmt=("%d", "%.2f"),
+        delimiter=",",
+        header=FLOW_GROUPS_HEADER,
+        comments="",
+    )
+    return path
+
+
+# --- Timelines ("time value" lines) ---
+def parse_timeline(path):
+    values = np.loadtxt(path, ndmin=2)
+    if values.size and values.shape[1] != 2:
+        raise ValueError(
+            f"{path}: expected 'time value' lines, got {values.shape[1]} columns"
+        )
+    values = values.reshape(-1, 2)
+    times = values[:, 0]
+    if not np.array_equal(times, np.round(times)):
+        raise ValueError(f"{path}: timestamps must be integers")
+    if np.any(times < 0) or np.any(np.diff(times) <= 0):
+        raise ValueError(f"{path}: timestamps must be non-negative and increasing")
+    return {"time": times.astype(np.int64), "value": values[:, 1]}
+
+
+def load_timeline(path, use_cache=True):
+    """(times, values) arrays of a timeline file."""
+    arrays = cached_load(path, parse_timeline, use_cache)
+    if np.any(arrays["value"] < 0):
+        raise ValueError(f"{path}: negative rate")
+    return arrays["time"], arrays["value"]
+
+
+def load_app_rate_timestamps(path, use_cache=True):
+    """App rate changes [(t_us, rate_B_per_us)] as dcqcn_series_model expects."""
+    times, rates = load_timeline(path, use_cache)
+    if not np.array_equal(rates, np.round(rates)):
+        raise ValueError(f"{path}: app rates must be integer B/us")
+    return list(zip(times.tolist(), rates.astype(np.int64).tolist()))
+
+
+def load_Rc_timestamps(path, use_cache=True):
+    """Rc changes [(t_ns, rate_Gbps)] as scheduler_single_flow expects."""
+    times, rates = load_timeline(path, use_cache)
+    return list(zip(times.tolist(), rates.tolist()))
+
+
+def write_timeline(path, times, values, value_format="%.17g"):
+    np.savetxt(path, np.column_stack((times, values)), fmt=("%d", value_format))
+    return path
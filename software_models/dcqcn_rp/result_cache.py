@@ -0,0 +1,135 @@
+"""
+Content-addressed on-disk cache of simulation results
+A result (dict of arrays) is stored as <key>.npz in the cache directory, where
+key hashes everything the run depends on (config_key):
+  - the constants of the constants modules (upper-case names, by value, so
+    values changed at run time count as well)
+  - the contents of the input files (a missing file hashes as missing)
+  - the source version: the contents of every .py file of the model directory
+  - the seed and the run parameters
+A hit refreshes the file's mtime; after every store the least recently used
+files are removed until the directory is within max_bytes.
+The scheduling_algorithm and dcqcn_rp copies of this file are identical; edit
+the scheduling_algorithm one and run software_models/check_shared_files.py --sync.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+RESULT_SUFFIX = ".npz"
+
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def module_constants(module):
+    """Upper-case module attributes holding plain values, sorted by name."""
+    plain = (bool, int, float, str, tuple, type(None))
+    return {
+        name: value
+        for name, value in sorted(vars(module).items())
+        if name.isupper() and isinstance(value, plain)
+    }
+
+
+def source_version(directory):
+    """Digest of the .py files of directory (the model source)."""
+    h = hashlib.blake2b(digest_size=16)
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            h.update(name.encode())
+            h.update(file_digest(os.path.join(directory, name)).encode())
+    return h.hexdigest()
+
+
+def config_key(constants=(), input_paths=(), source_dir=None, seed=None, **params):
+    h = hashlib.blake2b(digest_size=20)
+    for module in constants:
+        h.update(repr(module_constants(module)).encode())
+    for path in input_paths:
+        digest = file_digest(path) if os.path.exists(path) else "missing"
+        h.update(f"{path}:{digest}".encode())
+    if source_dir is not None:
+        h.update(source_version(source_dir).encode())
+    h.update(repr((seed, sorted(params.items()))).encode())
+    return h.hexdigest()
+
+
+def flatten_tables(tables):
+    """{table: {column: array}} as {"table.column": array} for one npz."""
+    return {
+        f"{table}.{column}": np.asarray(values)
+        for table, columns in tables.items()
+        for column, values in columns.items()
+    }
+
+
+def unflatten_tables(arrays):
+    tables = {}
+    for name, values in arrays.items():
+        table, column = name.split(".", 1)
+        tables.setdefault(table, {})[column] = values
+    return tables
+
+
+class ResultCache:
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + RESULT_SUFFIX)
+
+    def get(self, key):
+        """Cached arrays of key, or None."""
+        path = self.path(key)
+        try:
+            with np.load(path) as cached:
+                arrays = {k: cached[k] for k in cached.files}
+            os.utime(path)  # Most recently used
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arrays
+
+    def put(self, key, arrays):
+        tmp_path = self.path(key) + ".tmp.npz"
+        try:
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, self.path(key))
+        except OSError:
+            return  # Read-only or full disk: the result is just not cached
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used results until within max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(RESULT_SUFFIX) and not name.endswith(".tmp.npz"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def cached(self, key, compute):
+        """compute() -> dict of arrays, memoized under key."""
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            self.put(key, arrays)
+        return arrays
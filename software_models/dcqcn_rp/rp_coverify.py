@@ -0,0 +1,225 @@
+"""
+Hardware-vs-model co-verification of the RP wrapper
+tb_RP_wrapper dumps one "cycle flow_id rate" line per wrapper_rate_valid_o
+(format and comparison in hw_dump.py), rate being the slot count of
+rate_2_slot_conv. RPWrapperModel replays the testbench stimulus through the
+RP_wrapper stages at cycle level:
+  - RP_input_queue_simplified: rp_input_queue.reference_queue, idle scans
+    included
+  - RP_flow_update: FixedWidthReactionPoints with the RTL constants and the
+    per-flow state of the RP_mem BRAM init, at the global timer tick of stage 2
+  - rate_2_slot_conv: C / Rc truncated to CALENDAR_SLOTS_WIDTH bits (all ones
+    for Rc = 0)
+A notification at flow_rdy_o reaches stage 2 RP_PIPELINE_STAGE_2 + 1 cycles
+later and the dump RP_PIPELINE_SIZE + DIVIDER_LATENCY + 2 cycles later.
+The replay targets hardware_models/Modelsim/RP, the copy the testbench's 7-bit
+flow id literals elaborate with. Its RP_flow_update drops the carry of Rc + Rt
+and Rt + R_AI, which FixedWidthReactionPoints keeps (as the Wrapper copy), so
+the BRAM init must keep R_max low enough that no carry occurs. tb_RP_top has no
+outputs to dump.
+The bundled rp_wrapper_model_fixture.txt.gz is written by record_fixture from
+RPWrapperModel itself: comparing it only checks the comparison, which
+verify_coverify also requires to reject perturbed copies. Point
+RP_COVERIFY_DUMP_PATH at a ModelSim dump of tb_RP_wrapper to check the RTL.
+"""
+
+import re
+
+import numpy as np
+from dcqcn_constants import *
+from dcqcn_fixed import FixedWidthReactionPoints
+from hw_dump import (
+    compare_streams,
+    read_bram_init,
+    read_dump,
+    read_vhdl_constants,
+    read_vhdl_unsigned,
+    write_dump,
+)
+from rp_input_queue import reference_queue
+
+RATE_DUMP_FIELDS = ("cycle", "flow_id", "rate")
+# tb_RP_wrapper stimulus: (cycle sampled, flow_id, is_cnp, data_sent)
+TB_RP_WRAPPER_STIMULUS = ((1, 5, False, 1), (3, 5, True, 0), (24, 9, False, 1))
+# RP_mem word fields, least significant first: (name, width name)
+RP_MEM_FIELDS = (
+    ("R_max", "RP_RATE_WIDTH"),
+    ("Rc", "RP_RATE_WIDTH"),
+    ("Rt", "RP_RATE_WIDTH"),
+    ("alpha", "ALPHA_WIDTH"),
+    ("last_alpha_update", "GLOBAL_TIMER_WIDTH"),
+    ("TC", "F_WIDTH"),
+    ("last_T_update", "GLOBAL_TIMER_WIDTH"),
+    ("BC", "F_WIDTH"),
+    ("byte_count", "B_WIDTH"),
+)
+
+
+# --- Reference model ---
+class RPWrapperModel:
+    def __init__(self, rtl_path=RP_RTL_PATH):
+        constants = f"{rtl_path}/rtl/Constants_pkg.vhd"
+        c = read_vhdl_constants(constants)
+        u = read_vhdl_unsigned(constants, c)
+        divider_latency = read_vhdl_constants(f"{rtl_path}/rtl/RP_wrapper.vhd")[
+            "DIVIDER_LATENCY"
+        ]
+        self.dividend = read_vhdl_constants(f"{rtl_path}/rtl/rate_2_slot_conv.vhd")["C"]
+        self.slot_mask = (1 << c["CALENDAR_SLOTS_WIDTH"]) - 1
+        self.num_scan = 1 << c["FLAT_FLOW_ADDRESS_WIDTH"]
+        self.fifo_depth = 1 << FIFO_ADDR_WIDTH
+        self.pipeline_depth = 1 << PIPELINE_ADDR_WIDTH
+
+        # Cycles from flow_rdy_o: stage 2 reads RP_global_timer (edge e reads e) ...
+        pipeline_size = c["RP_MEM_LATENCY"] + 6
+        self.stage_2_delay = c["RP_MEM_LATENCY"] + 2 + 1
+        # ... rate_out_reg, the divider/sync pipeline and the tb sample
+        self.dump_delay = pipeline_size + divider_latency + 2
+
+        with open(f"{rtl_path}/mem/RP_mem.vhd") as f:
+            init_name = re.search(r"signal\s+ram\s*:\s*\w+\s*:=\s*(\w+)", f.read())[1]
+        words = read_bram_init(f"{rtl_path}/mem/Bram_init_pkg.vhd", init_name)
+        words = np.array([words[a] for a in range(len(words))], dtype=object)
+        state = {}
+        for name, width in RP_MEM_FIELDS:
+            state[name] = (words & ((1 << c[width]) - 1)).astype(np.int64)
+            words = words >> c[width]
+
+        widths = {
+            "rate": c["RP_RATE_WIDTH"],
+            "alpha": c["ALPHA_WIDTH"],
+            "timer": c["GLOBAL_TIMER_WIDTH"],
+            "counter": c["F_WIDTH"],
+            "byte_count": c["B_WIDTH"],
+            "data_sent": c["RP_DATA_SENT_WIDTH"],
+        }
+        increase = max(u["R_AI"], u["R_HAI"])
+        R_max = int(state["R_max"].max())
+        if max(2 * R_max, R_max + increase) >> widths["rate"]:
+            raise ValueError(
+                f"{rtl_path}: R_max {R_max} lets Rc + Rt or Rt + R_HAI carry out of "
+                f"RP_RATE_WIDTH = {widths['rate']} bits, where the RP_flow_update "
+                f"copies differ"
+            )
+        self.rp = FixedWidthReactionPoints(
+            len(words),
+            widths,
+            K=c["K"],
+            T=c["T"],
+            B=c["B"],
+            F=c["F"],
+            Rai=u["R_AI"],
+            Rhai=u["R_HAI"],
+            g=u["G"],
+            one=u["ONE"],
+        )
+        for name, values in state.items():
+            getattr(self.rp, name)[:] = values
+
+    def rate_to_slot(self, rates):
+        """wrapper_rate_o of rate_2_slot_conv: C / rate in CALENDAR_SLOTS_WIDTH bits."""
+        slots = (self.dividend // np.maximum(rates, 1)) & self.slot_mask
+        return np.where(rates > 0, slots, self.slot_mask)
+
+    def events(self, end_cycle, stimulus=TB_RP_WRAPPER_STIMULUS):
+        """Yield {cycle, flow_id, rate} chunks of the wrapper_rate_valid_o events before end_cycle."""
+        offered, flow_ids, is_cnp, sent = np.array(stimulus, dtype=np.int64).T
+        issued = reference_queue(
+            offered,
+            flow_ids,
+            is_cnp.astype(bool),
+            sent,
+            self.num_scan,
+            self.fifo_depth,
+            self.pipeline_depth,
+            end_cycle,
+        )
+        issued = np.array(issued, dtype=np.int64).reshape(-1, 4)
+        issued = issued[issued[:, 0] + self.dump_delay < end_cycle]
+        ready, flows, cnp, data_sent = issued.T
+        rates = self.rp.notify(
+            ready + self.stage_2_delay, flows, cnp.astype(bool), data_sent
+        )
+        yield {
+            "cycle": ready + self.dump_delay,
+            "flow_id": flows,
+            "rate": self.rate_to_slot(rates),
+        }
+
+
+# --- Comparison ---
+def coverify_rp_wrapper(
+    dump_path=RP_COVERIFY_DUMP_PATH,
+    rtl_path=RP_RTL_PATH,
+    cycle_tolerance=RP_COVERIFY_CYCLE_TOLERANCE,
+    rate_tolerance=RP_COVERIFY_RATE_TOLERANCE,
+):
+    """Compare a tb_RP_wrapper dump to RPWrapperModel over the same cycles."""
+    hw = read_dump(dump_path)
+    if list(hw) != list(RATE_DUMP_FIELDS):
+        raise ValueError(f"{dump_path}: expected fields {RATE_DUMP_FIELDS}")
+    end_cycle = int(hw["cycle"][-1]) + 1 if len(hw["cycle"]) else 0
+    model = RPWrapperModel(rtl_path)
+    return compare_streams(
+        hw, model.events(end_cycle), cycle_tolerance, {"rate": rate_tolerance}
+    )
+
+
+def record_fixture(
+    path=RP_COVERIFY_DUMP_PATH, end_cycle=RP_COVERIFY_END_CYCLE, rtl_path=RP_RTL_PATH
+):
+    """Write the model's events over end_cycle cycles as a (gzipped) testbench dump."""
+    (columns,) = RPWrapperModel(rtl_path).events(end_cycle)
+    return write_dump(path, columns)
+
+
+def verify_coverify(
+    dump_path=RP_COVERIFY_DUMP_PATH,
+    rtl_path=RP_RTL_PATH,
+    cycle_tolerance=RP_COVERIFY_CYCLE_TOLERANCE,
+    rate_tolerance=RP_COVERIFY_RATE_TOLERANCE,
+):
+    """
+    The model-recorded fixture must match and copies of it with one event
+    perturbed must not: late by more than the cycle tolerance, another flow, a
+    rate off by more than the rate tolerance, or dropped. The perturbed event is
+    the rate update that follows the testbench CNP.
+    """
+    hw = read_dump(dump_path)
+    end_cycle = int(hw["cycle"][-1]) + 1
+    cnp_flow = TB_RP_WRAPPER_STIMULUS[1][1]
+    i = np.flatnonzero(hw["flow_id"] == cnp_flow)[1]
+
+    def perturbed(field, delta):
+        columns = {f: v.copy() for f, v in hw.items()}
+        columns[field][i] += delta
+        return columns
+
+    streams = {
+        "late": perturbed("cycle", cycle_tolerance + 1),
+        "flow_id": perturbed("flow_id", 1),
+        "rate": perturbed("rate", rate_tolerance + 1),
+        "dropped": {f: np.delete(v, i) for f, v in hw.items()},
+    }
+    matches = {
+        name: compare_streams(
+            columns,
+            RPWrapperModel(rtl_path).events(end_cycle),
+            cycle_tolerance,
+            {"rate": rate_tolerance},
+        ).ok
+        for name, columns in {"fixture": hw, **streams}.items()
+    }
+    ok = matches.pop("fixture") and not any(matches.values())
+    rejected = [name for name, match in matches.items() if not match]
+    print(
+        f"RP co-verification matches the fixture and rejects its perturbed copies: "
+        f"{ok} (rejected: {', '.join(rejected)})"
+    )
+    return ok
+
+
+if __name__ == "__main__":
+    verify_coverify()
+    report = coverify_rp_wrapper()
+    report.print_report()
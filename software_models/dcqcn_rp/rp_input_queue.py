@@ -0,0 +1,383 @@
+"""
+Cycle model of RP_input_queue_simplified.vhd
+CNP and data-sent notifications enter two FIFOs of FIFO_DEPTH entries (dropped
+when full). Each clock cycle at most one notification is issued to
+RP_flow_update, CNPs first:
+  - the CNP FIFO head, unless a CNP arrives this cycle; else the data FIFO
+    head, unless a data notification arrives this cycle; with both FIFOs empty
+    a data_sent = 0 scan of the next flow (round robin)
+  - a head whose flow was issued in the last PIPELINE_DEPTH - 1 cycles (still
+    in the RP pipeline) is rotated to the FIFO tail instead (stalls when full)
+and appears at flow_rdy_o one cycle later. With coalescing (not in the RTL) a
+data notification of a flow that already waits in the data FIFO adds its
+data_sent to that entry instead of taking a slot.
+The notification streams of all flows are serialized onto the two one-per-cycle
+input ports and run through one kernel over NumPy ring buffers, skipping idle
+stretches, so 262k-flow incast runs take seconds. Latency is counted from the
+offered cycle (port wait included) to flow_rdy_o.
+"""
+
+import time
+
+import numpy as np
+from dcqcn_constants import *
+
+NOT_ISSUED = -1  # issue_cycle of dropped notifications
+
+
+def serialize_ports(offered, is_cnp):
+    """
+    Port cycle of each notification: the offered cycle, or later when earlier
+    notifications of the same kind hold the one-per-cycle input port.
+    """
+    offered = np.asarray(offered, dtype=np.int64)
+    is_cnp = np.asarray(is_cnp, dtype=bool)
+    port = np.empty_like(offered)
+    for kind in (True, False):
+        idx = np.flatnonzero(is_cnp == kind)
+        idx = idx[np.argsort(offered[idx], kind="stable")]
+        # port[k] = max(offered[k], port[k - 1] + 1) = k + cummax(offered - k)
+        rank = np.arange(len(idx))
+        port[idx] = rank + np.maximum.accumulate(offered[idx] - rank)
+    return port
+
+
+def queue_kernel(
+    port,
+    flows,
+    is_cnp,
+    sent,
+    num_scan,
+    fifo_depth,
+    pipeline_depth,
+    coalesce,
+    issue_cycle,
+    merged_into,
+    issued_sent,
+    depth_hist,
+):
+    """
+    Run the queue over notifications sorted by (port cycle, CNP first), at most
+    one per kind and cycle. Fills issue_cycle (flow_rdy_o cycle), merged_into
+    (notification a coalesced one was added to, else itself), issued_sent and
+    depth_hist[fifo, depth] (cycles per depth after the cycle, 0 = CNP FIFO).
+    Returns the number of scan notifications issued.
+    """
+    n = len(port)
+    q_idx = np.empty((2, fifo_depth), dtype=np.int64)  # Notification of each slot
+    q_sent = np.zeros((2, fifo_depth), dtype=np.int64)
+    rd = [0, 0]
+    count = [0, 0]
+    last_issue = np.full(max(num_scan, flows.max(initial=0) + 1), -pipeline_depth)
+    pending = np.full(len(last_issue), -1, dtype=np.int64)  # Data FIFO slot of a flow
+    scan, scans, idle_run = 0, 0, 0
+    i = 0
+    c = int(port[0]) if n else 0
+    while i < n or count[0] or count[1]:
+        # Idle stretch: only scans, which leave no trace after pipeline_depth cycles
+        if idle_run >= pipeline_depth and port[i] - c > pipeline_depth:
+            skip = int(port[i]) - pipeline_depth - c
+            scan = (scan + skip) % num_scan
+            scans += skip
+            depth_hist[:, 0] += skip
+            c += skip
+
+        arrived = [False, False]
+        while i < n and port[i] == c:
+            q = 0 if is_cnp[i] else 1
+            arrived[q] = True
+            f = flows[i]
+            merged_into[i] = i
+            if q == 1 and coalesce and pending[f] >= 0:
+                slot = pending[f]
+                q_sent[1, slot] += sent[i]
+                merged_into[i] = q_idx[1, slot]
+            elif count[q] < fifo_depth:
+                slot = (rd[q] + count[q]) % fifo_depth
+                q_idx[q, slot] = i
+                q_sent[q, slot] = sent[i]
+                count[q] += 1
+                if q == 1:
+                    pending[f] = slot
+            i += 1
+
+        q = 0 if count[0] else 1 if count[1] else -1
+        if q >= 0:
+            if not arrived[q]:
+                head = q_idx[q, rd[q]]
+                f = flows[head]
+                if c - last_issue[f] >= pipeline_depth:
+                    last_issue[f] = c
+                    issue_cycle[head] = c + 1
+                    issued_sent[head] = q_sent[q, rd[q]]
+                    rd[q] = (rd[q] + 1) % fifo_depth
+                    count[q] -= 1
+                    if q == 1:
+                        pending[f] = -1
+                elif count[q] < fifo_depth:
+                    slot = (rd[q] + count[q]) % fifo_depth
+                    q_idx[q, slot] = head
+                    q_sent[q, slot] = q_sent[q, rd[q]]
+                    rd[q] = (rd[q] + 1) % fifo_depth
+                    if q == 1:
+                        pending[f] = slot
+            idle_run = 0
+        else:
+            if c - last_issue[scan] >= pipeline_depth:
+                last_issue[scan] = c
+                scans += 1
+            scan = (scan + 1) % num_scan
+            idle_run += 1
+        depth_hist[0, count[0]] += 1
+        depth_hist[1, count[1]] += 1
+        c += 1
+    return scans
+
+
+class QueueReport:
+    def __init__(self, offered, is_cnp, issue_cycle, merged_into, issued_sent):
+        self.is_cnp = is_cnp
+        # Coalesced notifications take effect with the entry they were added to
+        self.issue_cycle = issue_cycle[merged_into]
+        self.coalesced = merged_into != np.arange(len(merged_into))
+        self.dropped = self.issue_cycle == NOT_ISSUED
+        self.latency = (self.issue_cycle - offered)[~self.dropped]
+        self.latency_is_cnp = is_cnp[~self.dropped]
+        self.max_sent = int(issued_sent.max(initial=0))
+        self.depth_hist = None
+        self.scans = 0
+        self.cycles = 0
+
+    def drops(self, cnp):
+        return int(np.count_nonzero(self.dropped & (self.is_cnp == cnp)))
+
+    def latency_percentiles(self, cnp, q=(50, 99, 100)):
+        latency = self.latency[self.latency_is_cnp == cnp]
+        return np.percentile(latency, q) if len(latency) else np.full(len(q), np.nan)
+
+    def max_depth(self, fifo):
+        return int(np.flatnonzero(self.depth_hist[fifo])[-1])
+
+    def print_report(self):
+        ns = CLOCK_PERIOD_NS
+        print(f"Cycles: {self.cycles:,}, scans issued: {self.scans:,}")
+        for name, fifo in (("CNP", 0), ("data", 1)):
+            cnp = fifo == 0
+            total = np.count_nonzero(self.is_cnp == cnp)
+            p50, p99, top = self.latency_percentiles(cnp)
+            print(
+                f"  {name}: {total:,} notifications, {self.drops(cnp):,} dropped, "
+                f"max depth {self.max_depth(fifo)}, latency p50 {p50 * ns:.0f} ns, "
+                f"p99 {p99 * ns:.0f} ns, max {top * ns:.0f} ns"
+            )
+        if self.coalesced.any():
+            print(
+                f"  coalesced: {np.count_nonzero(self.coalesced):,}, "
+                f"max data_sent per issue {self.max_sent}"
+            )
+
+
+class RPInputQueue:
+    def __init__(
+        self,
+        num_flows,
+        fifo_addr_width=FIFO_ADDR_WIDTH,
+        pipeline_addr_width=PIPELINE_ADDR_WIDTH,
+        coalesce=QUEUE_COALESCE,
+    ):
+        self.num_flows = num_flows  # Scanned flows, 2^FLAT_FLOW_ADDRESS_WIDTH
+        self.fifo_depth = 1 << fifo_addr_width
+        self.pipeline_depth = 1 << pipeline_addr_width
+        self.coalesce = coalesce
+
+    def run(self, offered, flow_ids, is_cnp, sent=None):
+        """Push notifications (offered cycles, any order) through the queue."""
+        offered = np.asarray(offered, dtype=np.int64)
+        flow_ids = np.asarray(flow_ids, dtype=np.int64)
+        is_cnp = np.asarray(is_cnp, dtype=bool)
+        n = len(offered)
+        sent = np.ones(n, dtype=np.int64) if sent is None else np.asarray(sent)
+        if n and (flow_ids.min() < 0 or flow_ids.max() >= self.num_flows):
+            raise ValueError(f"flow ids must be in [0, {self.num_flows})")
+
+        port = serialize_ports(offered, is_cnp)
+        order = np.lexsort((~is_cnp, port))
+        issue_cycle = np.full(n, NOT_ISSUED, dtype=np.int64)
+        merged_into = np.empty(n, dtype=np.int64)
+        issued_sent = np.zeros(n, dtype=np.int64)
+        depth_hist = np.zeros((2, self.fifo_depth + 1), dtype=np.int64)
+        scans = queue_kernel(
+            port[order],
+            flow_ids[order],
+            is_cnp[order],
+            sent[order],
+            self.num_flows,
+            self.fifo_depth,
+            self.pipeline_depth,
+            self.coalesce,
+            issue_cycle,
+            merged_into,
+            issued_sent,
+            depth_hist,
+        )
+
+        # Back from port order to the caller's order
+        inverse = np.empty(n, dtype=np.int64)
+        inverse[order] = np.arange(n)
+        report = QueueReport(
+            offered,
+            is_cnp,
+            issue_cycle[inverse],
+            order[merged_into][inverse],
+            issued_sent,
+        )
+        report.depth_hist = depth_hist
+        report.scans = scans
+        report.cycles = int(depth_hist[0].sum())
+        return report
+
+
+def reference_queue(
+    offered, flow_ids, is_cnp, sent, num_flows, fifo_depth, depth, end_cycle=0
+):
+    """
+    Statement-by-statement transcription of the RTL process, one loop iteration
+    per clock cycle, scanning until end_cycle at least. Returns (flow_rdy_o
+    cycle, flow, is_cnp, data_sent) tuples.
+    """
+    port = serialize_ports(offered, is_cnp)
+    pending = {}
+    for k in np.lexsort((~np.asarray(is_cnp), port)):
+        pending.setdefault(int(port[k]), []).append(k)
+    fifos = ([], [])  # (flow, sent) entries, head first
+    pipeline = [-1] * depth
+    scan, out = 0, []
+    c, end = 0, max(end_cycle, max(pending) + 1 if pending else 0)
+    while c < end or fifos[0] or fifos[1]:
+        valid = [False, False]
+        for k in pending.get(c, []):
+            q = 0 if is_cnp[k] else 1
+            valid[q] = True
+            if len(fifos[q]) < fifo_depth:
+                fifos[q].append((int(flow_ids[k]), int(sent[k])))
+        pipeline = pipeline[1:] + [-1]
+        q = 0 if fifos[0] else 1 if fifos[1] else -1
+        if q >= 0:
+            if not valid[q]:
+                flow, data_sent = fifos[q][0]
+                if flow not in pipeline:
+                    pipeline[-1] = flow
+                    out.append((c + 1, flow, q == 0, data_sent))
+                    fifos[q].pop(0)
+                elif len(fifos[q]) < fifo_depth:
+                    fifos[q].append(fifos[q].pop(0))
+        else:
+            if scan not in pipeline:
+                pipeline[-1] = scan
+                out.append((c + 1, scan, False, 0))
+            scan = (scan + 1) % num_flows
+        c += 1
+    return out
+
+
+def verify_against_rtl(num_flows=64, cycles=5_000, fifo_addr_width=3, seed=0):
+    """Issued notifications of the kernel against reference_queue."""
+    rng = np.random.default_rng(seed)
+    n = cycles // 2
+    offered = rng.integers(cycles, size=n)
+    flow_ids = rng.integers(num_flows, size=n)
+    is_cnp = rng.random(n) < 0.3
+    sent = rng.integers(1, 4, size=n)
+    queue = RPInputQueue(num_flows, fifo_addr_width)
+    report = queue.run(offered, flow_ids, is_cnp, sent)
+    issued = ~report.dropped
+    mine = sorted(
+        zip(
+            report.issue_cycle[issued].tolist(),
+            flow_ids[issued].tolist(),
+            is_cnp[issued].tolist(),
+            sent[issued].tolist(),
+        )
+    )
+    expected = reference_queue(
+        offered,
+        flow_ids,
+        is_cnp,
+        sent,
+        num_flows,
+        queue.fifo_depth,
+        queue.pipeline_depth,
+    )
+    scans = sum(1 for _, _, cnp, s in expected if not cnp and s == 0)
+    expected = [e for e in expected if e[2] or e[3]]
+    same = mine == expected and scans == report.scans
+    print(
+        f"Queue kernel matches the RTL transcription: {same} "
+        f"({len(mine):,} issued, {report.drops(True) + report.drops(False):,} dropped)"
+    )
+    return same
+
+
+def incast_notifications(
+    num_flows,
+    num_incast,
+    duration_us,
+    onset_spread_us=1.0,
+    packet_bytes=1_500,
+    link_gbps=100,
+    seed=None,
+):
+    """
+    Offered cycles of an incast: every incast flow gets a CNP every N us (the NP
+    limit), first ones within onset_spread_us; one data notification per packet
+    at line rate, from random incast flows.
+    """
+    rng = np.random.default_rng(seed)
+    cycles_per_us = 1_000 / CLOCK_PERIOD_NS
+    end = int(duration_us * cycles_per_us)
+
+    incast = rng.choice(num_flows, size=num_incast, replace=False)
+    first = rng.uniform(0, onset_spread_us * cycles_per_us, size=num_incast)
+    repeats = int(duration_us // N) + 1
+    cnp_cycles = first[None, :] + N * cycles_per_us * np.arange(repeats)[:, None]
+    cnp_flows = np.broadcast_to(incast, cnp_cycles.shape)
+    keep = cnp_cycles < end
+
+    packet_cycles = packet_bytes * 8 / link_gbps / CLOCK_PERIOD_NS
+    data_cycles = np.arange(0, end, packet_cycles)
+    offered = np.concatenate((cnp_cycles[keep], data_cycles)).astype(np.int64)
+    flow_ids = np.concatenate(
+        (cnp_flows[keep], rng.choice(incast, size=len(data_cycles)))
+    )
+    is_cnp = np.r_[np.ones(keep.sum(), dtype=bool), np.zeros(len(data_cycles), bool)]
+    return offered, flow_ids, is_cnp
+
+
+def size_fifo(offered, flow_ids, is_cnp, num_flows, widths=range(4, 13), **kwargs):
+    """Drops and latencies per FIFO_ADDR_WIDTH, without and with coalescing."""
+    ns = CLOCK_PERIOD_NS
+    print("width coalesce  CNP drops  data drops  CNP p99 (ns)  data p99 (ns)")
+    for width in widths:
+        for coalesce in (False, True):
+            queue = RPInputQueue(num_flows, width, coalesce=coalesce, **kwargs)
+            report = queue.run(offered, flow_ids, is_cnp)
+            print(
+                f"{width:5d} {str(coalesce):8s} {report.drops(True):10,d} "
+                f"{report.drops(False):11,d} "
+                f"{report.latency_percentiles(True, (99,))[0] * ns:13.0f} "
+                f"{report.latency_percentiles(False, (99,))[0] * ns:14.0f}"
+            )
+
+
+if __name__ == "__main__":
+    verify_against_rtl()
+
+    num_flows = 262_144
+    offered, flow_ids, is_cnp = incast_notifications(
+        num_flows, num_incast=4_096, duration_us=200, seed=0
+    )
+    start = time.perf_counter()
+    report = RPInputQueue(num_flows).run(offered, flow_ids, is_cnp)
+    print(f"{len(offered):,} notifications in {time.perf_counter() - start:.2f} s")
+    report.print_report()
+    size_fifo(offered, flow_ids, is_cnp, num_flows)
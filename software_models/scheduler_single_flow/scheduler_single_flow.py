@@ -6,16 +6,8 @@ import matplotlib.pyplot as plt
 from collections import deque
 from scheduler_single_flow_constants import *
 from RoCE_packet import RoCEPacket
-
-
-def load_Rc_timestamps(file_path):
-    with open(file_path, "r") as f:
-        return [
-            (int(line.strip().split()[0]), float(line.strip().split()[1]))
-            for line in f
-            if line.strip()
-        ]
-
+from plot_decimation import decimate, decimate_events, finish
+from model_io import load_Rc_timestamps
 
 Rc_changes = load_Rc_timestamps(RC_TIMESTAPMS_PATH)
 packets = RoCEPacket.from_csv(INPUT_PACKETS_PATH)
@@ -106,15 +98,18 @@ for t in range(0, END_OF_TIME, 1):  # Simulate time in nanoseconds
 sent_times = [ts for ts, _ in scheduled_packets]
 packet_sizes = [pkt.size for _, pkt in scheduled_packets]
 
-# Plot results
+# Plot results, histories decimated to PLOT_BUCKETS pixel columns
 plt.figure(figsize=(10, 7))
 
 # First plot: Rate Adjustment & App Layer Rate
 plt.subplot(2, 1, 1)
-plt.plot(time_history, rate_history, label="Target rate (Rc)", color="b")
 plt.plot(
-    time_history,
-    real_rate_history,
+    *decimate(time_history, rate_history, PLOT_BUCKETS),
+    label="Target rate (Rc)",
+    color="b",
+)
+plt.plot(
+    *decimate(time_history, real_rate_history, PLOT_BUCKETS),
     label="Avg real rate",
     color="r",
     linestyle="dashed",
@@ -130,11 +125,13 @@ plt.grid()
 plt.subplot(2, 1, 2)
 
 plt.plot(
-    time_history, input_buffer_occupancy, label="Input Buffer Occupancy", color="b"
+    *decimate(time_history, input_buffer_occupancy, PLOT_BUCKETS),
+    label="Input Buffer Occupancy",
+    color="b",
 )  # New input buffer plot
-# Plot packet send events as vertical lines
+# Plot packet send events as vertical lines, at most one per pixel column
 plt.vlines(
-    sent_times,
+    decimate_events(sent_times, PLOT_BUCKETS),
     ymin=min(real_rate_history),
     ymax=max(real_rate_history),
     colors="r",
@@ -149,4 +146,4 @@ plt.legend()
 plt.grid()
 
 plt.tight_layout()
-plt.show()
+finish(plt.gcf(), PLOT_DIR, "scheduler_single_flow")
@@ -8,3 +8,5 @@ TX_DELAY = 100  # Transmission delay (ns)
 END_OF_TIME = 500000  # Simulation time in ns
 LINK_SPEED_BPNS = 40  # 100 bpns = Gbps link speed
 AVG_RATE_WINDOW = 3  # how many past packets included in calculating avg
+PLOT_DIR = None  # Save figures here as .png (headless) instead of showing them
+PLOT_BUCKETS = 2000  # Pixel columns histories are decimated to (plot_decimation.py)
@@ -0,0 +1,446 @@
+"""
+Array-backed calendar scheduler
+Same model as OptimizedScheduler, but all per-flow state lives in NumPy arrays and
+the per-slot loop runs in calendar_kernels (JIT-compiled when Numba is available).
+create_scheduler() picks this engine with Numba and OptimizedScheduler without it;
+both default to CounterRNG(RNG_SEED), so the choice does not change results.
+"""
+
+import numpy as np
+from scheduler_constants import *
+import calendar_kernels
+import counter_rng
+import rate_policies
+from calendar_kernels import NULL_FLOW
+from counter_rng import CounterRNG
+from flow_table import build_flow_table, compress_groups, flow_table_from_dicts
+from jit_support import HAVE_NUMBA, interpreted
+from instrumentation import Instrumentation
+from occupancy_stats import OccupancyStats
+from result_export import (
+    ResultWriter,
+    occupancy_histogram_table,
+    run_metadata,
+    run_with_export,
+)
+from scheduler_optimized import (
+    OptimizedScheduler,
+    generate_flows,
+    load_flow_groups,
+    print_occupancy_report,
+    steady_state_phase,
+)
+
+
+class ArrayScheduler:
+    def __init__(
+        self,
+        input_flow_queue,
+        Rc_memory,
+        init_rates,
+        CALENDAR_INTERVAL,
+        CALENDAR_SLOTS,
+        warm_start=None,
+        rng=None,
+        policy=None,
+        rate_trace=None,
+        occupancy_stats=None,
+        instrumentation=None,
+        flow_table=None,
+    ):
+        """
+        Dict-based inputs as for OptimizedScheduler, or None for all three and a
+        flow_table (flow_table.FLOW_DTYPE, see from_flow_table).
+        """
+        if flow_table is None:
+            flow_table = flow_table_from_dicts(input_flow_queue, Rc_memory, init_rates)
+            input_flow_queue.clear()
+        admit_order = flow_table["flow_id"]
+        real = admit_order != NULL_FLOW
+        if real.all():
+            real = slice(None)  # No shard placeholders: use the columns as they are
+        fids = admit_order[real]
+        num_flows = int(fids.max()) if len(fids) else 0
+        self.CALENDAR_INTERVAL = CALENDAR_INTERVAL
+        self.CALENDAR_SLOTS = CALENDAR_SLOTS
+        # CounterRNG: per-flow streams keyed by packet count, as in OptimizedScheduler
+        self.rng = CounterRNG(RNG_SEED) if rng is None else rng
+        # RatePolicy (default: synthetic CNP rule); policies without a JIT kernel run
+        # through a per-slot driver
+        self.policy = rate_policies.SyntheticCnpPolicy() if policy is None else policy
+        # Optional RateTrace: recorded rate changes applied at their slot
+        self.trace_cursor = None if rate_trace is None else rate_trace.cursor()
+        # Optional OccupancyStats, fed from the per-slot occupancy of every chunk
+        self.occupancy_stats = occupancy_stats
+        # Optional Instrumentation: the fused loop is timed per chunk as a single
+        # "kernel" phase and does not count IPG overflows (left at None)
+        self.instrumentation = instrumentation
+        self.t = 0  # Simulation time (ns)
+        self.current_slot = 0  # Calendar pointer
+
+        # Per-flow state, indexed by flow id (scattered column by column): the
+        # current rate and a group index; initial rates and thresholds are kept
+        # once per group
+        self.rates = np.zeros(num_flows + 1)
+        self.rates[fids] = flow_table["rate"][real]
+        groups, group_index = compress_groups(flow_table[real])
+        self.group_init_rates = groups["init_rate"]
+        self.group_thresholds = groups["threshold"]
+        self.group_of = np.zeros(num_flows + 1, dtype=group_index.dtype)
+        self.group_of[fids] = group_index
+        present = np.zeros(num_flows + 1, dtype=bool)
+        present[fids] = True
+        self.flow_ids = np.flatnonzero(present)
+        self.packets = np.zeros(num_flows + 1, dtype=np.int64)
+        self.next_flow = np.full(num_flows + 1, NULL_FLOW, dtype=np.int64)
+
+        # Calendar: one linked list of flows per slot
+        self.slot_head = np.full(CALENDAR_SLOTS, NULL_FLOW, dtype=np.int64)
+        self.slot_tail = np.full(CALENDAR_SLOTS, NULL_FLOW, dtype=np.int64)
+        self.slot_count = np.zeros(CALENDAR_SLOTS, dtype=np.int64)
+        self.scratch = np.zeros(num_flows + 1, dtype=np.int64)
+
+        # Admission order of first packets (shard placeholders are NULL_FLOW)
+        self.admit_order = admit_order.copy()
+        self.admit_pos = 0
+
+        # index = number of flows in slot, value = count of slots
+        self.tracked_occupancy = np.zeros(num_flows + 2, dtype=np.int64)
+        self.max_calendar_occupancy = 0
+
+        if warm_start:
+            self.warm_start(warm_start)
+
+    @classmethod
+    def from_flow_table(cls, flow_table, CALENDAR_INTERVAL, CALENDAR_SLOTS, **kwargs):
+        return cls(
+            None,
+            None,
+            None,
+            CALENDAR_INTERVAL,
+            CALENDAR_SLOTS,
+            flow_table=flow_table,
+            **kwargs,
+        )
+
+    def warm_start(self, mode):
+        """Place every not yet admitted flow directly into its steady-state slot."""
+        for k in range(self.admit_pos, len(self.admit_order)):
+            fid = self.admit_order[k]
+            if fid == NULL_FLOW:
+                continue
+            offset = calendar_kernels.slot_offset(
+                self.rates[fid], MTU_SIZE, self.CALENDAR_INTERVAL
+            )
+            phase = steady_state_phase(
+                k, min(offset, self.CALENDAR_SLOTS - 1), mode, self.rng, fid
+            )
+            calendar_kernels.place_flow(
+                fid,
+                (self.current_slot + phase) % self.CALENDAR_SLOTS,
+                self.slot_head,
+                self.slot_tail,
+                self.slot_count,
+                self.next_flow,
+            )
+        self.admit_pos = len(self.admit_order)
+
+    def run_simulation(self):
+        self.run_slots(None)
+
+    def run_slots(self, max_slots, slot_occupancy=None):
+        """Same contract as OptimizedScheduler.run_slots."""
+        remaining = -(-(END_OF_TIME - self.t) // self.CALENDAR_INTERVAL)
+        num_steps = max(
+            0, remaining if max_slots is None else min(max_slots, remaining)
+        )
+        stats, inst = self.occupancy_stats, self.instrumentation
+        if stats is None and inst is None:
+            self.run_steps(num_steps, slot_occupancy)
+            return num_steps
+
+        if inst is not None:
+            inst.start_run()
+        if slot_occupancy is not None:
+            self.run_observed(num_steps, slot_occupancy)
+        else:
+            # Bounded buffer: run in chunks of one statistics window / instrumentation chunk
+            chunk = stats.window_slots if inst is None else inst.chunk_slots
+            buffer = np.zeros(min(num_steps, chunk), dtype=np.int32)
+            done = 0
+            while done < num_steps:
+                n = min(len(buffer), num_steps - done)
+                self.run_observed(n, buffer)
+                done += n
+        if inst is not None:
+            inst.stop_run()
+        return num_steps
+
+    def run_observed(self, num_steps, slot_occupancy):
+        """run_steps feeding the occupancy of the chunk to stats and instrumentation."""
+        inst = self.instrumentation
+        if inst is None:
+            self.run_steps(num_steps, slot_occupancy)
+        else:
+            first_slot, first_admit = self.current_slot, self.admit_pos
+            mark = inst.begin("kernel")
+            self.run_steps(num_steps, slot_occupancy)
+            inst.end("kernel", mark)
+            admitted = self.admit_order[first_admit : self.admit_pos]
+            inst.admissions += int((admitted != NULL_FLOW).sum())
+            inst.count_slots(
+                slot_occupancy[:num_steps], first_slot, self.CALENDAR_SLOTS
+            )
+            inst.progress(self.t, END_OF_TIME)
+        if self.occupancy_stats is not None:
+            self.occupancy_stats.add_slots(slot_occupancy[:num_steps])
+
+    def run_steps(self, num_steps, slot_occupancy=None):
+        if not self.policy.jit_kernel:
+            self.run_slots_with_policy(num_steps, slot_occupancy)
+        else:
+            self.run_kernel(num_steps, slot_occupancy)
+
+    def apply_trace_updates(self):
+        """Set the rates of all trace updates due at the current slot."""
+        flow_ids, rates = self.trace_cursor.advance(self.t)
+        self.rates[flow_ids] = rates
+
+    def run_kernel(self, num_steps, slot_occupancy=None):
+        record_slots = slot_occupancy is not None
+        if not record_slots:
+            slot_occupancy = np.zeros(1, dtype=np.int32)
+        active_increase, cnp_prob, cnp_mean, cnp_std, min_rate = (
+            self.policy.kernel_params()
+        )
+        # CNP decrease = decrease_mean + decrease_std * z, per group
+        decrease_mean = cnp_mean * self.group_init_rates
+        decrease_std = cnp_std * self.group_init_rates
+
+        if self.trace_cursor is not None:
+            trace = self.trace_cursor.trace
+            trace_time, trace_flow, trace_rate = trace.time, trace.flow_id, trace.rate
+            trace_pos = self.trace_cursor.pos
+        else:
+            trace_time = trace_flow = np.zeros(0, dtype=np.int64)
+            trace_rate = np.zeros(0)
+            trace_pos = 0
+
+        # Looked up at call time so jit_support.interpreted() can swap it
+        kernel = calendar_kernels.run_slots_kernel
+        self.current_slot, self.admit_pos, trace_pos, max_occupancy = kernel(
+            num_steps,
+            self.current_slot,
+            self.admit_order,
+            self.admit_pos,
+            self.rates,
+            self.group_of,
+            self.group_thresholds,
+            decrease_mean,
+            decrease_std,
+            self.packets,
+            self.slot_head,
+            self.slot_tail,
+            self.slot_count,
+            self.next_flow,
+            self.scratch,
+            self.tracked_occupancy,
+            slot_occupancy,
+            record_slots,
+            self.t,
+            trace_time,
+            trace_flow,
+            trace_rate,
+            trace_pos,
+            self.rng.seed,
+            self.rng.stream,
+            active_increase,
+            cnp_prob,
+            min_rate,
+            MTU_SIZE,
+            self.CALENDAR_INTERVAL,
+        )
+        if self.trace_cursor is not None:
+            self.trace_cursor.pos = trace_pos
+        self.max_calendar_occupancy = max(self.max_calendar_occupancy, max_occupancy)
+        self.t += num_steps * self.CALENDAR_INTERVAL
+
+    def run_slots_with_policy(self, num_steps, slot_occupancy=None):
+        """Per-slot driver: pop/place kernels with one policy.update call per slot."""
+        num_slots = self.CALENDAR_SLOTS
+        current_slot = self.current_slot
+        for step in range(num_steps):
+            if self.trace_cursor is not None:
+                self.apply_trace_updates()
+            if self.admit_pos < len(self.admit_order):
+                fid = self.admit_order[self.admit_pos]
+                self.admit_pos += 1
+                if fid != NULL_FLOW:
+                    offset = calendar_kernels.slot_offset(
+                        self.rates[fid], MTU_SIZE, self.CALENDAR_INTERVAL
+                    )
+                    calendar_kernels.place_flow(
+                        fid,
+                        (current_slot + offset) % num_slots,
+                        self.slot_head,
+                        self.slot_tail,
+                        self.slot_count,
+                        self.next_flow,
+                    )
+
+            n = calendar_kernels.pop_slot(
+                current_slot,
+                self.slot_head,
+                self.slot_tail,
+                self.slot_count,
+                self.next_flow,
+                self.scratch,
+            )
+            self.tracked_occupancy[n] += 1
+            self.max_calendar_occupancy = max(self.max_calendar_occupancy, n)
+            if slot_occupancy is not None:
+                slot_occupancy[step] = n
+            if n:
+                fids = self.scratch[:n].copy()
+                self.packets[fids] += 1
+                groups = self.group_of[fids]
+                self.rates[fids] = self.policy.update(
+                    self.rates[fids],
+                    self.group_init_rates[groups],
+                    self.group_thresholds[groups],
+                    self.rng,
+                    fids,
+                    self.packets[fids],
+                )
+                calendar_kernels.place_flows(
+                    fids,
+                    n,
+                    current_slot,
+                    self.rates,
+                    MTU_SIZE,
+                    self.CALENDAR_INTERVAL,
+                    num_slots,
+                    self.slot_head,
+                    self.slot_tail,
+                    self.slot_count,
+                    self.next_flow,
+                )
+            current_slot = (current_slot + 1) % num_slots
+
+        self.current_slot = current_slot
+        self.t += num_steps * self.CALENDAR_INTERVAL
+
+    @property
+    def output_stats(self):
+        """Total bits sent per flow, as in OptimizedScheduler."""
+        sent = np.flatnonzero(self.packets)
+        return dict(zip(sent.tolist(), (self.packets[sent] * MTU_SIZE).tolist()))
+
+    @property
+    def Rc_memory(self):
+        return dict(zip(self.flow_ids.tolist(), self.rates[self.flow_ids].tolist()))
+
+    def print_calendar_occupancy_stats(self):
+        return print_occupancy_report(
+            self.results()["occupancy_histogram"], int(self.packets.sum())
+        )
+
+    def results(self):
+        """Per-flow stats and the occupancy histograms as columnar tables."""
+        fids = self.flow_ids
+        tables = {
+            "flow_stats": {
+                "flow_id": fids,
+                "bits_sent": self.packets[fids] * MTU_SIZE,
+                "rate": self.rates[fids],
+                "init_rate": self.group_init_rates[self.group_of[fids]],
+            },
+            "occupancy_histogram": occupancy_histogram_table(self.tracked_occupancy),
+        }
+        if self.occupancy_stats is not None:
+            tables["occupancy_windows"] = self.occupancy_stats.window_table()
+        return tables
+
+
+def create_scheduler(*args, **kwargs):
+    """JIT-compiled ArrayScheduler when Numba is available, OptimizedScheduler otherwise."""
+    if HAVE_NUMBA:
+        return ArrayScheduler(*args, **kwargs)
+    return OptimizedScheduler(*args, **kwargs)
+
+
+def create_scheduler_from_table(flow_table, *args, **kwargs):
+    """create_scheduler for a flow table (flow_table.build_flow_table)."""
+    engine = ArrayScheduler if HAVE_NUMBA else OptimizedScheduler
+    return engine.from_flow_table(flow_table, *args, **kwargs)
+
+
+def verify_equivalence(flow_groups, num_flows_per_group, calendar_interval, seed=1):
+    """
+    Run the dict-based Python path, the interpreted kernels and (if available) the
+    compiled kernels on the same input and check that their results are identical,
+    with a CounterRNG(seed) and with the engines' default RNG (rng=None), so
+    create_scheduler results do not depend on whether Numba is installed.
+    """
+    calendar_slots = CALENDAR_WINDOW // calendar_interval
+
+    def run(engine, rng):
+        queue, Rc_memory, init_rates = generate_flows(flow_groups, num_flows_per_group)
+        scheduler = engine(
+            queue,
+            Rc_memory,
+            init_rates,
+            calendar_interval,
+            calendar_slots,
+            rng=rng,
+        )
+        scheduler.run_simulation()
+        occupancy = np.trim_zeros(np.asarray(scheduler.tracked_occupancy), "b")
+        return occupancy, dict(scheduler.output_stats), scheduler.Rc_memory
+
+    for label, make_rng in (
+        (f"seed {seed}", lambda: CounterRNG(seed)),
+        ("default rng", lambda: None),
+    ):
+        results = {"python": run(OptimizedScheduler, make_rng())}
+        with interpreted(calendar_kernels, counter_rng):
+            results["kernels (interpreted)"] = run(ArrayScheduler, make_rng())
+        if HAVE_NUMBA:
+            results["kernels (numba)"] = run(ArrayScheduler, make_rng())
+
+        reference = results["python"]
+        for name, result in results.items():
+            same = (
+                np.array_equal(result[0], reference[0])
+                and result[1] == reference[1]
+                and result[2] == reference[2]
+            )
+            print(f"{name}, {label}: {'identical' if same else 'DIFFERENT'}")
+            if not same:
+                raise AssertionError(f"{name} differs from the Python path ({label})")
+
+
+if __name__ == "__main__":
+    flow_groups = load_flow_groups(OUTPUT_FLOW_GROUPS_PATH)
+    # Small equivalence run first, then the full configuration
+    verify_equivalence(dict(list(flow_groups.items())[:8]), 16, CALENDAR_INTERVAL_LIST)
+
+    scheduler = create_scheduler_from_table(
+        build_flow_table(flow_groups, NUM_FLOWS_PER_GROUP),
+        CALENDAR_INTERVAL_LIST,
+        CALENDAR_WINDOW // CALENDAR_INTERVAL_LIST,
+        warm_start=WARM_START_MODE,
+        rng=CounterRNG(RNG_SEED),
+        occupancy_stats=OccupancyStats(),
+        instrumentation=Instrumentation() if INSTRUMENT else None,
+    )
+    if RESULTS_PATH is None:
+        scheduler.run_simulation()
+    else:
+        metadata = run_metadata(type(scheduler).__name__, RNG_SEED)
+        with ResultWriter(RESULTS_PATH, metadata) as writer:
+            run_with_export(scheduler, writer)
+    scheduler.print_calendar_occupancy_stats()
+    scheduler.occupancy_stats.print_stats()
+    if scheduler.instrumentation is not None:
+        scheduler.instrumentation.print_report()
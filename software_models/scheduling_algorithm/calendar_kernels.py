@@ -0,0 +1,216 @@
+"""
+Array-backed calendar kernels
+The calendar is an intrusive linked list per slot over flow-indexed arrays
+(slot_head/slot_tail/slot_count per slot, next_flow per flow), so every flow
+sits in exactly one slot and a slot is processed without Python objects.
+Flow ids start at 1; index 0 of the per-flow arrays is unused.
+All kernels are JIT-compiled when Numba is available (see jit_support).
+"""
+
+from jit_support import jit
+from rate_policies import synthetic_cnp_rate
+
+NULL_FLOW = -1  # End of a slot list / empty slot
+
+
+@jit
+def place_flow(fid, slot, slot_head, slot_tail, slot_count, next_flow):
+    """Append a flow to the tail of a calendar slot."""
+    next_flow[fid] = NULL_FLOW
+    if slot_head[slot] == NULL_FLOW:
+        slot_head[slot] = fid
+    else:
+        next_flow[slot_tail[slot]] = fid
+    slot_tail[slot] = fid
+    slot_count[slot] += 1
+
+
+@jit
+def pop_slot(slot, slot_head, slot_tail, slot_count, next_flow, out):
+    """Detach all flows of a slot into out (in scheduling order); returns their number."""
+    n = 0
+    fid = slot_head[slot]
+    while fid != NULL_FLOW:
+        out[n] = fid
+        n += 1
+        fid = next_flow[fid]
+    slot_head[slot] = NULL_FLOW
+    slot_tail[slot] = NULL_FLOW
+    slot_count[slot] = 0
+    return n
+
+
+@jit
+def slot_offset(rate, mtu_size, calendar_interval):
+    """Calendar slots until the next packet of a flow sending at rate (bps)."""
+    ipg = max(1, int(round(mtu_size * 1e9 / rate)))
+    return ipg // calendar_interval
+
+
+@jit
+def update_rates(
+    flows,
+    n,
+    rates,
+    group_of,
+    group_thresholds,
+    decrease_mean,
+    decrease_std,
+    packets,
+    seed,
+    stream,
+    active_increase,
+    cnp_prob,
+    min_rate,
+):
+    """
+    Synthetic CNP update (rate_policies.synthetic_cnp_rate) of the n sent flows.
+    Thresholds and the decrease mean/std dev (scaled by the initial rate) are
+    per group of group_of; the other parameters come from kernel_params().
+    """
+    for i in range(n):
+        fid = flows[i]
+        packets[fid] += 1
+        g = group_of[fid]
+        rates[fid] = synthetic_cnp_rate(
+            rates[fid],
+            group_thresholds[g],
+            decrease_mean[g],
+            decrease_std[g],
+            seed,
+            stream,
+            fid,
+            packets[fid],
+            active_increase,
+            cnp_prob,
+            min_rate,
+        )
+
+
+@jit
+def place_flows(
+    flows,
+    n,
+    current_slot,
+    rates,
+    mtu_size,
+    calendar_interval,
+    num_slots,
+    slot_head,
+    slot_tail,
+    slot_count,
+    next_flow,
+):
+    """Reinsert the n sent flows at their next IPG slot."""
+    for i in range(n):
+        fid = flows[i]
+        offset = slot_offset(rates[fid], mtu_size, calendar_interval)
+        place_flow(
+            fid,
+            (current_slot + offset) % num_slots,
+            slot_head,
+            slot_tail,
+            slot_count,
+            next_flow,
+        )
+
+
+@jit
+def run_slots_kernel(
+    num_steps,
+    current_slot,
+    admit_order,
+    admit_pos,
+    rates,
+    group_of,
+    group_thresholds,
+    decrease_mean,
+    decrease_std,
+    packets,
+    slot_head,
+    slot_tail,
+    slot_count,
+    next_flow,
+    scratch,
+    occupancy_hist,
+    slot_occupancy,
+    record_slots,
+    t0,
+    trace_time,
+    trace_flow,
+    trace_rate,
+    trace_pos,
+    seed,
+    stream,
+    active_increase,
+    cnp_prob,
+    min_rate,
+    mtu_size,
+    calendar_interval,
+):
+    """
+    Fused per-slot loop: apply due trace rate changes, admit one queued flow, pop the
+    current slot, update rates, reinsert.
+    Returns (current_slot, admit_pos, trace_pos, max occupancy seen).
+    """
+    num_slots = slot_head.shape[0]
+    max_occupancy = 0
+    for step in range(num_steps):
+        # Phase 0: recorded rate changes due by the start of this slot
+        t = t0 + step * calendar_interval
+        while trace_pos < trace_time.shape[0] and trace_time[trace_pos] <= t:
+            rates[trace_flow[trace_pos]] = trace_rate[trace_pos]
+            trace_pos += 1
+
+        # Phase 1: admission of one not-yet-scheduled flow (-1 = other shard's flow)
+        if admit_pos < admit_order.shape[0]:
+            fid = admit_order[admit_pos]
+            admit_pos += 1
+            if fid != NULL_FLOW:
+                offset = slot_offset(rates[fid], mtu_size, calendar_interval)
+                place_flow(
+                    fid,
+                    (current_slot + offset) % num_slots,
+                    slot_head,
+                    slot_tail,
+                    slot_count,
+                    next_flow,
+                )
+
+        # Phase 2: process the current slot
+        n = pop_slot(current_slot, slot_head, slot_tail, slot_count, next_flow, scratch)
+        occupancy_hist[n] += 1
+        if n > max_occupancy:
+            max_occupancy = n
+        if record_slots:
+            slot_occupancy[step] = n
+        update_rates(
+            scratch,
+            n,
+            rates,
+            group_of,
+            group_thresholds,
+            decrease_mean,
+            decrease_std,
+            packets,
+            seed,
+            stream,
+            active_increase,
+            cnp_prob,
+            min_rate,
+        )
+        place_flows(
+            scratch,
+            n,
+            current_slot,
+            rates,
+            mtu_size,
+            calendar_interval,
+            num_slots,
+            slot_head,
+            slot_tail,
+            slot_count,
+            next_flow,
+        )
+        current_slot = (current_slot + 1) % num_slots
+    return current_slot, admit_pos, trace_pos, max_occupancy
@@ -0,0 +1,291 @@
+"""
+Calendar configuration optimizer
+Searches (CALENDAR_INTERVAL, CALENDAR_SLOTS) candidates for the lowest
+empty/non-empty ratio x max occupancy, the quantity scheduler_optimized.py plots
+against the interval; equal products (e.g. no empty slot at all) go to the lower
+max occupancy. Successive halving: every candidate first simulates
+END_OF_TIME / eta^(rungs - 1) ns, the best 1/eta go on for eta times longer, up
+to END_OF_TIME in the last rung. Within a rung a candidate runs in windows of
+OPT_WINDOW_SLOTS slots and is abandoned after the first window in which it is
+confidently worse than the leader: its lower bound (the max occupancy so far,
+which can only grow, times the empty ratio minus z standard errors over
+windows) is above the leader's upper bound (max occupancy + margin, empty
+ratio + z standard errors).
+Promoted candidates continue their scheduler (up to max_live are kept) and
+every completed evaluation is cached on disk under a result_cache.config_key of
+the scheduler constants, the model source, the flow table, candidate, simulated
+time, warm start and seed, so a rerun or a wider grid only simulates what is
+new, and a changed constant or engine never serves a stale record.
+The short rungs must already rank like the full run: with the default flow
+groups the warm-start transient has no empty slot for tens of ms, so an
+END_OF_TIME of a few hundred ms ranks the candidates by max occupancy alone and
+the search can miss the grid's optimum (compare_with_grid checks it).
+"""
+
+import hashlib
+import os
+import time
+
+import numpy as np
+import scheduler_constants
+from scheduler_constants import *
+from array_scheduler import create_scheduler_from_table, load_flow_groups
+from counter_rng import CounterRNG
+from flow_table import build_flow_table
+from occupancy_stats import OccupancyStats
+from result_cache import config_key
+
+CACHE_SUFFIX = ".cache.npz"  # Ignored by git like the model_io sidecars
+
+
+def candidate_grid(intervals=OPT_INTERVALS, slot_scales=OPT_SLOT_SCALES):
+    """(interval, slots) pairs, slots scaled from CALENDAR_WINDOW // interval."""
+    return [
+        (interval, max(1, int(CALENDAR_WINDOW // interval * scale)))
+        for interval in intervals
+        for scale in slot_scales
+    ]
+
+
+def rung_times(end_time=END_OF_TIME, eta=OPT_ETA, rungs=OPT_RUNGS):
+    """Simulated time (ns) of every rung, the last one end_time."""
+    return [end_time // eta ** (rungs - 1 - r) for r in range(rungs)]
+
+
+def score(stats):
+    """Objective and confidence inputs of an OccupancyStats."""
+    ratio = stats.histogram[0] / stats.count
+    empty = [h[0] / h.sum() for _, h in stats.windows]
+    se = np.std(empty, ddof=1) / np.sqrt(len(empty)) if len(empty) > 1 else np.inf
+    return {
+        "slots": stats.count,
+        "empty_ratio": float(ratio),
+        "ratio_se": float(se),
+        "max_occupancy": stats.max,
+        "p999": stats.percentile(99.9),
+        "objective": float(ratio * stats.max),
+    }
+
+
+def rank_key(record):
+    return record["objective"], record["max_occupancy"]
+
+
+def lower_bound(record, z=OPT_CONFIDENCE_Z):
+    ratio = max(record["empty_ratio"] - z * record["ratio_se"], 0.0)
+    return ratio * record["max_occupancy"]
+
+
+def upper_bound(record, z=OPT_CONFIDENCE_Z, margin=OPT_MAX_MARGIN):
+    ratio = min(record["empty_ratio"] + z * record["ratio_se"], 1.0)
+    return ratio * (record["max_occupancy"] + margin)
+
+
+class EvaluationCache:
+    """One npz of scalars per evaluation in cache_dir (None = no cache)."""
+
+    def __init__(self, cache_dir=OPT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        if self.cache_dir is None or not os.path.exists(self.path(key)):
+            return None
+        with np.load(self.path(key)) as cache:
+            return {k: cache[k].item() for k in cache.files}
+
+    def put(self, key, record):
+        if self.cache_dir is None:
+            return
+        tmp_path = self.path(key) + ".tmp.npz"
+        try:
+            np.savez(tmp_path, **record)
+            os.replace(tmp_path, self.path(key))
+        except OSError:
+            pass  # Read-only checkout: the search still works uncached
+
+
+class CalendarOptimizer:
+    def __init__(
+        self,
+        flow_table,
+        seed=0,
+        warm_start="spread",
+        cache_dir=OPT_CACHE_DIR,
+        max_live=OPT_MAX_LIVE,
+    ):
+        self.flow_table = flow_table
+        self.seed = seed
+        self.warm_start = warm_start
+        self.cache = EvaluationCache(cache_dir)
+        self.max_live = max_live
+        self.table_hash = hashlib.blake2b(
+            np.ascontiguousarray(flow_table).tobytes(), digest_size=16
+        ).hexdigest()
+        self.live = {}  # candidate -> (scheduler, stats) to continue
+        self.simulations = 0  # Evaluations not found in the cache
+        self.simulated_slots = 0
+        self.log = []  # (rung, candidate, record, outcome)
+
+    def key(self, candidate, sim_time):
+        interval, slots = candidate
+        return config_key(
+            (scheduler_constants,),
+            (),
+            os.path.dirname(os.path.abspath(__file__)),
+            self.seed,
+            engine="CalendarOptimizer",
+            flow_table=self.table_hash,
+            calendar_interval=interval,
+            calendar_slots=slots,
+            sim_time=sim_time,
+            warm_start=self.warm_start,
+        )
+
+    def evaluate(self, candidate, sim_time, keep=False, stop=None):
+        """
+        Score of candidate after sim_time ns; keep: hold the scheduler for later.
+        stop: test of the partial record after every OPT_WINDOW_SLOTS slots; once
+        it holds the run is abandoned and the partial record, marked "stopped",
+        returned (and not cached).
+        """
+        key = self.key(candidate, sim_time)
+        record = self.cache.get(key)
+        if record is not None:
+            return record
+        interval, slots = candidate
+        if candidate in self.live:
+            scheduler, stats = self.live.pop(candidate)
+        else:
+            stats = OccupancyStats(window_slots=OPT_WINDOW_SLOTS)
+            scheduler = create_scheduler_from_table(
+                self.flow_table,
+                interval,
+                slots,
+                warm_start=self.warm_start,
+                rng=CounterRNG(self.seed),
+                occupancy_stats=stats,
+            )
+        target = -(-sim_time // interval)
+        self.simulations += 1
+        while stats.count < target:
+            n = scheduler.run_slots(min(OPT_WINDOW_SLOTS, target - stats.count))
+            self.simulated_slots += n
+            if n == 0:
+                break  # END_OF_TIME reached
+            if stop is not None and stats.count < target:
+                record = score(stats)
+                if stop(record):
+                    return dict(record, stopped=True)
+        record = score(stats)
+        self.cache.put(key, record)
+        if keep:
+            self.live[candidate] = scheduler, stats
+        return record
+
+    def optimize(
+        self,
+        candidates,
+        end_time=END_OF_TIME,
+        eta=OPT_ETA,
+        rungs=OPT_RUNGS,
+        z=OPT_CONFIDENCE_Z,
+        margin=OPT_MAX_MARGIN,
+    ):
+        """Best candidate and its record at end_time (successive halving)."""
+        survivors = list(candidates)
+        times = rung_times(end_time, eta, rungs)
+        for rung, sim_time in enumerate(times):
+            last = rung == len(times) - 1
+            keep = not last and len(survivors) <= self.max_live
+            records = {}
+            leader = None
+            for candidate in survivors:
+                stop = None
+                if leader is not None:
+                    bound = upper_bound(records[leader], z, margin)
+                    stop = lambda record: lower_bound(record, z) > bound
+                record = self.evaluate(candidate, sim_time, keep, stop)
+                if record.get("stopped"):
+                    self.log.append((rung, candidate, record, "stopped"))
+                    continue
+                records[candidate] = record
+                if leader is None or rank_key(record) < rank_key(records[leader]):
+                    leader = candidate
+            ranked = sorted(records, key=lambda c: rank_key(records[c]))
+            survivors = ranked[: max(1, -(-len(survivors) // eta))] if not last else []
+            for candidate in ranked:
+                promoted = candidate in survivors
+                self.log.append(
+                    (
+                        rung,
+                        candidate,
+                        records[candidate],
+                        "promoted" if promoted else "",
+                    )
+                )
+                if not promoted:
+                    self.live.pop(candidate, None)
+        self.live.clear()
+        return ranked[0], records[ranked[0]]
+
+    def grid(self, candidates, end_time=END_OF_TIME):
+        """Every candidate at end_time: the exhaustive reference of optimize."""
+        return {c: self.evaluate(c, end_time) for c in candidates}
+
+
+def print_log(log):
+    print("rung interval    slots  sim slots  empty  max  ratio*max")
+    for rung, (interval, slots), r, outcome in log:
+        print(
+            f"{rung:4d} {interval:8d} {slots:8d} {r['slots']:10d} "
+            f"{r['empty_ratio']:6.3f} {r['max_occupancy']:4d} "
+            f"{r['objective']:10.3f} {outcome}"
+        )
+
+
+def grid_slots(candidates, end_time=END_OF_TIME):
+    """Slots the exhaustive grid simulates."""
+    return sum(-(-end_time // interval) for interval, _ in candidates)
+
+
+def compare_with_grid(optimizer, candidates, best, end_time=END_OF_TIME):
+    """
+    Check best (from optimizer.optimize) against every candidate at end_time.
+    The grid shares the optimizer's cache, so only the candidates the search
+    stopped early are simulated to the end.
+    """
+    results = optimizer.grid(candidates, end_time)
+    grid_best = min(results, key=lambda c: rank_key(results[c]))
+    same = rank_key(results[best]) == rank_key(results[grid_best])
+    print(
+        f"Optimizer {best}, grid {grid_best}: "
+        f"{'same score' if same else 'DIFFERENT'}"
+    )
+    return same
+
+
+if __name__ == "__main__":
+    flow_groups = load_flow_groups(OUTPUT_FLOW_GROUPS_PATH)
+    flow_table = build_flow_table(flow_groups, NUM_FLOWS_PER_GROUP)
+    candidates = candidate_grid()
+
+    optimizer = CalendarOptimizer(flow_table, RNG_SEED, WARM_START_MODE or "spread")
+    start = time.perf_counter()
+    best, record = optimizer.optimize(candidates)
+    elapsed = time.perf_counter() - start
+    print_log(optimizer.log)
+    print(
+        f"Best: interval {best[0]} ns, {best[1]} slots, empty ratio "
+        f"{record['empty_ratio']:.3f}, max occupancy {record['max_occupancy']}"
+    )
+    print(
+        f"{optimizer.simulations} simulations ({len(candidates)} for the grid), "
+        f"{optimizer.simulated_slots / grid_slots(candidates):.1%} of the grid's "
+        f"slots, {elapsed:.1f} s"
+    )
+    compare_with_grid(optimizer, candidates, best)
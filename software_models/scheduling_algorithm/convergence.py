@@ -0,0 +1,125 @@
+"""
+Convergence-terminated runs of the calendar engines
+run_until_converged drives a scheduler (OptimizedScheduler, ArrayScheduler) in
+base batches of batch_slots slots and feeds a BatchMeans monitor per batch:
+  - mean_occupancy, empty_ratio and max_occupancy (maximum within the batch)
+  - occupancy_distribution: share of slots per occupancy (last bin open)
+  - group_throughput: bps sent per flow group
+The run stops at the first batch after which every interval is within its
+target, or at END_OF_TIME; the stopping point is returned with the monitor.
+"""
+
+import time
+
+import numpy as np
+from scheduler_constants import *
+from array_scheduler import create_scheduler_from_table, load_flow_groups
+from batch_means import BatchMeans
+from counter_rng import CounterRNG
+from flow_table import build_flow_table, owned_flows
+
+
+def create_monitor(
+    confidence=CONVERGENCE_CONFIDENCE,
+    rel_tol=CONVERGENCE_REL_TOL,
+    fraction_tol=CONVERGENCE_FRACTION_TOL,
+    min_batches=CONVERGENCE_MIN_BATCHES,
+):
+    """BatchMeans with absolute tolerances for the slot fractions."""
+    return BatchMeans(
+        confidence,
+        rel_tol,
+        min_batches=min_batches,
+        tolerances={
+            "empty_ratio": (rel_tol, fraction_tol),
+            "occupancy_distribution": (rel_tol, fraction_tol),
+        },
+    )
+
+
+class GroupCounter:
+    """Bits sent per flow group since the last call, from a scheduler's counters."""
+
+    def __init__(self, flow_table):
+        flows = owned_flows(flow_table)
+        self.flow_ids = flows["flow_id"]
+        _, self.group_of = np.unique(flows["group_id"], return_inverse=True)
+        self.num_groups = int(self.group_of.max()) + 1 if len(flows) else 0
+        self.last = np.zeros(len(flows))
+
+    def bits_sent(self, scheduler):
+        if hasattr(scheduler, "packets"):  # ArrayScheduler
+            total = scheduler.packets[self.flow_ids] * float(MTU_SIZE)
+        else:
+            stats = scheduler.output_stats
+            total = np.array([stats.get(fid, 0) for fid in self.flow_ids.tolist()])
+        return total
+
+    def delta(self, scheduler):
+        total = self.bits_sent(scheduler)
+        sent = np.bincount(
+            self.group_of, weights=total - self.last, minlength=self.num_groups
+        )
+        self.last = total
+        return sent
+
+
+def run_until_converged(
+    scheduler,
+    flow_table,
+    monitor=None,
+    batch_slots=CONVERGENCE_BATCH_SLOTS,
+    bins=CONVERGENCE_OCCUPANCY_BINS,
+):
+    """
+    Run scheduler (built from flow_table) until monitor converges or END_OF_TIME.
+    Returns (monitor, slots run, converged). A last batch cut short by
+    END_OF_TIME is run but not added to the monitor.
+    """
+    monitor = create_monitor() if monitor is None else monitor
+    groups = GroupCounter(flow_table)
+    occupancy = np.zeros(batch_slots, dtype=np.int32)
+    batch_time = batch_slots * scheduler.CALENDAR_INTERVAL * 1e-9
+    slots = 0
+    while True:
+        n = scheduler.run_slots(batch_slots, occupancy)
+        slots += n
+        if n < batch_slots:
+            return monitor, slots, False
+        monitor.add(
+            {
+                "mean_occupancy": occupancy.mean(),
+                "empty_ratio": np.mean(occupancy == 0),
+                "max_occupancy": occupancy.max(),
+                "occupancy_distribution": np.bincount(
+                    np.minimum(occupancy, bins - 1), minlength=bins
+                )
+                / batch_slots,
+                "group_throughput": groups.delta(scheduler) / batch_time,
+            }
+        )
+        if monitor.converged:
+            return monitor, slots, True
+
+
+if __name__ == "__main__":
+    flow_groups = load_flow_groups(OUTPUT_FLOW_GROUPS_PATH)
+    flow_table = build_flow_table(flow_groups, NUM_FLOWS_PER_GROUP)
+    interval = CALENDAR_INTERVAL_LIST
+    scheduler = create_scheduler_from_table(
+        flow_table,
+        interval,
+        CALENDAR_WINDOW // interval,
+        warm_start=WARM_START_MODE,
+        rng=CounterRNG(RNG_SEED),
+    )
+    start = time.perf_counter()
+    monitor, slots, converged = run_until_converged(scheduler, flow_table)
+    elapsed = time.perf_counter() - start
+    full_slots = -(-END_OF_TIME // interval)
+    print(
+        f"{'Converged' if converged else 'Reached END_OF_TIME'} after {slots} slots "
+        f"({slots * interval / 1e6:.1f} of {END_OF_TIME / 1e6:.0f} ms, "
+        f"{slots / full_slots:.1%}) in {elapsed:.1f} s"
+    )
+    monitor.print_report()
@@ -0,0 +1,174 @@
+"""
+Counter-based random streams for reproducible CNP sampling
+Every (flow, packet) pair gets its own Philox4x32-10 block keyed by (flow_id, seed),
+so draws do not depend on global state or on the order flows are processed in.
+Scalar, batched (NumPy) and JIT evaluation give bit-identical values.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+from jit_support import jit
+
+MASK32 = 0xFFFFFFFF
+PHILOX_M0 = 0xD2511F53
+PHILOX_M1 = 0xCD9E8D57
+PHILOX_W0 = 0x9E3779B9
+PHILOX_W1 = 0xBB67AE85
+PHILOX_ROUNDS = 10
+
+UINT32_SCALE = 1.0 / 4294967296.0  # 2^-32
+
+# Piecewise-linear inverse normal CDF (4096 segments, |z| <= 3.49).
+# Only +, - and * are used on top of the table, which keeps normal draws
+# bit-identical across Python, NumPy and Numba (no libm/SVML differences).
+NORMAL_TABLE_BITS = 12
+NORMAL_TABLE_SIZE = 1 << NORMAL_TABLE_BITS
+NORMAL_FRAC_BITS = 32 - NORMAL_TABLE_BITS
+NORMAL_FRAC_SCALE = 1.0 / (1 << NORMAL_FRAC_BITS)
+_NORMAL_KNOTS = [
+    NormalDist().inv_cdf((i + 0.5) / (NORMAL_TABLE_SIZE + 1))
+    for i in range(NORMAL_TABLE_SIZE + 1)
+]
+NORMAL_TABLE = np.array(_NORMAL_KNOTS, dtype=np.float64)
+
+
+# ---------------------------------------------------
+# Scalar kernels (plain int/float ops, JIT-compiled when Numba is available)
+# ---------------------------------------------------
+@jit
+def philox4x32(c0, c1, c2, c3, k0, k1):
+    """Philox4x32-10 block function on 32-bit words."""
+    for i in range(PHILOX_ROUNDS):
+        if i:
+            k0 = (k0 + PHILOX_W0) & MASK32
+            k1 = (k1 + PHILOX_W1) & MASK32
+        p0 = PHILOX_M0 * c0
+        p1 = PHILOX_M1 * c2
+        c0, c1, c2, c3 = (
+            ((p1 >> 32) & MASK32) ^ c1 ^ k0,
+            p1 & MASK32,
+            ((p0 >> 32) & MASK32) ^ c3 ^ k1,
+            p0 & MASK32,
+        )
+    return c0, c1, c2, c3
+
+
+@jit
+def word_to_normal(w):
+    """Map a uniform 32-bit word to a standard normal sample."""
+    idx = w >> NORMAL_FRAC_BITS
+    frac = (w & ((1 << NORMAL_FRAC_BITS) - 1)) * NORMAL_FRAC_SCALE
+    lo = NORMAL_TABLE[idx]
+    return lo + frac * (NORMAL_TABLE[idx + 1] - lo)
+
+
+@jit
+def counter_draw(seed, stream, flow_id, counter):
+    """Uniform [0, 1) and standard normal draw for one (flow, counter) pair."""
+    # Plain ints when interpreted (NumPy int64 scalars would warn on overflow)
+    flow_id = int(flow_id)
+    counter = int(counter)
+    w0, w1, _, _ = philox4x32(
+        counter & MASK32, (counter >> 32) & MASK32, stream, 0, flow_id & MASK32, seed
+    )
+    return w0 * UINT32_SCALE, word_to_normal(w1)
+
+
+# ---------------------------------------------------
+# Batched kernels (NumPy uint64 lanes holding 32-bit words)
+# ---------------------------------------------------
+def philox4x32_batch(c0, c1, c2, c3, k0, k1):
+    """Vectorized Philox4x32-10; all inputs are uint64 arrays of 32-bit values."""
+    mask = np.uint64(MASK32)
+    shift = np.uint64(32)
+    m0 = np.uint64(PHILOX_M0)
+    m1 = np.uint64(PHILOX_M1)
+    for i in range(PHILOX_ROUNDS):
+        if i:
+            k0 = (k0 + np.uint64(PHILOX_W0)) & mask
+            k1 = (k1 + np.uint64(PHILOX_W1)) & mask
+        p0 = m0 * c0
+        p1 = m1 * c2
+        c0, c1, c2, c3 = (
+            (p1 >> shift) ^ c1 ^ k0,
+            p1 & mask,
+            (p0 >> shift) ^ c3 ^ k1,
+            p0 & mask,
+        )
+    return c0, c1, c2, c3
+
+
+def counter_draw_batch(seed, stream, flow_ids, counters):
+    """Batched counter_draw; returns (uniform, normal) float64 arrays."""
+    flow_ids = np.asarray(flow_ids, dtype=np.uint64)
+    counters = np.asarray(counters, dtype=np.uint64)
+    flow_ids, counters = np.broadcast_arrays(flow_ids, counters)
+    mask = np.uint64(MASK32)
+    zeros = np.zeros(flow_ids.shape, dtype=np.uint64)
+    w0, w1, _, _ = philox4x32_batch(
+        counters & mask,
+        counters >> np.uint64(32),
+        zeros + np.uint64(stream),
+        zeros,
+        flow_ids & mask,
+        zeros + np.uint64(seed),
+    )
+    idx = (w1 >> np.uint64(NORMAL_FRAC_BITS)).astype(np.intp)
+    frac = (w1 & np.uint64((1 << NORMAL_FRAC_BITS) - 1)) * NORMAL_FRAC_SCALE
+    lo = NORMAL_TABLE[idx]
+    return w0 * UINT32_SCALE, lo + frac * (NORMAL_TABLE[idx + 1] - lo)
+
+
+class CounterRNG:
+    """
+    Seeded per-flow random streams.
+    draw(flow_id, counter) is a pure function of (seed, stream, flow_id, counter);
+    use the flow's packet count as counter to get one independent draw per packet.
+    """
+
+    def __init__(self, seed, stream=0):
+        self.seed = seed & MASK32
+        self.stream = stream & MASK32
+
+    def draw(self, flow_id, counter):
+        return counter_draw(self.seed, self.stream, flow_id, counter)
+
+    def draw_batch(self, flow_ids, counters):
+        return counter_draw_batch(self.seed, self.stream, flow_ids, counters)
+
+
+if __name__ == "__main__":
+    # Random123 known-answer vectors for Philox4x32-10
+    assert philox4x32(0, 0, 0, 0, 0, 0) == (
+        0x6627E8D5,
+        0xE169C58D,
+        0xBC57AC4C,
+        0x9B00DBD8,
+    )
+    assert philox4x32(*([MASK32] * 6)) == (
+        0x408F276D,
+        0x41C83B0E,
+        0xA20BC7C6,
+        0x6D5451FD,
+    )
+
+    # Batched draws must be bit-identical to sequential ones
+    rng = CounterRNG(seed=1234)
+    flow_ids = np.repeat(np.arange(1, 1001), 50)
+    counters = np.tile(np.arange(50), 1000)
+    u_batch, z_batch = rng.draw_batch(flow_ids, counters)
+    u_seq, z_seq = zip(*(rng.draw(int(f), int(c)) for f, c in zip(flow_ids, counters)))
+    assert np.array_equal(u_batch, u_seq) and np.array_equal(z_batch, z_seq)
+    u_py, z_py = zip(
+        *(
+            counter_draw.py_func(rng.seed, 0, int(f), int(c))
+            for f, c in zip(flow_ids, counters)
+        )
+    )
+    assert np.array_equal(u_batch, u_py) and np.array_equal(z_batch, z_py)
+
+    print(
+        f"uniform mean {u_batch.mean():.4f}, normal mean/std "
+        f"{z_batch.mean():.4f}/{z_batch.std():.4f}"
+    )
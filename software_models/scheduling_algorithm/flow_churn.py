@@ -0,0 +1,546 @@
+"""
+Calendar engine with flow churn
+Flows arrive during the run (Poisson process, group picked uniformly, size in
+packets from a Pareto distribution) and finish after their last packet, so the
+population of the capacity flow id slots changes like RDMA connections do.
+  - flow ids 1..capacity are handed out by an array-backed free list (stack):
+    activation and release are O(1) and a released id is reused, as the
+    hardware reuses Flow_mem entries behind active_flag
+  - slot lists are doubly linked (prev_flow, and slot_of per flow, NULL_FLOW
+    when the flow is not in the calendar), so deactivate() unlinks a flow
+    torn down early in O(1) without scanning slots
+The per-slot loop (arrivals due by the slot, pop, rate update as in
+calendar_kernels, completion or reinsertion) runs in churn_slots_kernel,
+JIT-compiled when Numba is available. A flow's packet counter, which keys its
+CNP draws, is kept across tenants of its id so reused ids get fresh draws.
+"""
+
+import time
+
+import numpy as np
+from scheduler_constants import *
+import calendar_kernels
+import rate_policies
+from calendar_kernels import NULL_FLOW
+from counter_rng import CounterRNG
+from jit_support import jit
+from scheduler_optimized import load_flow_groups
+
+
+# ---------------------------------------------------
+# Kernels
+# ---------------------------------------------------
+@jit
+def link_flow(
+    fid, slot, slot_head, slot_tail, slot_count, next_flow, prev_flow, slot_of
+):
+    """Append a flow to the tail of a calendar slot (doubly linked)."""
+    tail = slot_tail[slot]
+    next_flow[fid] = NULL_FLOW
+    prev_flow[fid] = tail
+    if tail == NULL_FLOW:
+        slot_head[slot] = fid
+    else:
+        next_flow[tail] = fid
+    slot_tail[slot] = fid
+    slot_count[slot] += 1
+    slot_of[fid] = slot
+
+
+@jit
+def unlink_flow(fid, slot_head, slot_tail, slot_count, next_flow, prev_flow, slot_of):
+    """Remove a flow from its calendar slot in O(1); False if it is in none."""
+    slot = slot_of[fid]
+    if slot == NULL_FLOW:
+        return False
+    prev, nxt = prev_flow[fid], next_flow[fid]
+    if prev == NULL_FLOW:
+        slot_head[slot] = nxt
+    else:
+        next_flow[prev] = nxt
+    if nxt == NULL_FLOW:
+        slot_tail[slot] = prev
+    else:
+        prev_flow[nxt] = prev
+    slot_count[slot] -= 1
+    slot_of[fid] = NULL_FLOW
+    return True
+
+
+@jit
+def churn_slots_kernel(
+    num_steps,
+    current_slot,
+    t0,
+    arrival_time,
+    arrival_group,
+    arrival_size,
+    arrival_pos,
+    free_ids,
+    free_top,
+    group_rates,
+    rates,
+    group_of,
+    group_thresholds,
+    decrease_mean,
+    decrease_std,
+    packets,
+    remaining,
+    flow_size,
+    start_time,
+    slot_head,
+    slot_tail,
+    slot_count,
+    next_flow,
+    prev_flow,
+    slot_of,
+    scratch,
+    occupancy_hist,
+    slot_occupancy,
+    record_slots,
+    done_fct,
+    done_size,
+    done_flow,
+    done_count,
+    seed,
+    stream,
+    active_increase,
+    cnp_prob,
+    min_rate,
+    mtu_size,
+    calendar_interval,
+):
+    """
+    Per-slot loop with arrivals and completions. Completed flows append their
+    completion time (ns), size and flow id to done_fct/done_size/done_flow.
+    Returns (current_slot, arrival_pos, free_top, done_count, blocked, max occupancy).
+    """
+    num_slots = slot_head.shape[0]
+    blocked = 0
+    max_occupancy = 0
+    for step in range(num_steps):
+        t = t0 + step * calendar_interval
+        # Arrivals due by this slot take an id from the free list
+        while arrival_pos < arrival_time.shape[0] and arrival_time[arrival_pos] <= t:
+            g = arrival_group[arrival_pos]
+            size = arrival_size[arrival_pos]
+            arrival_pos += 1
+            if free_top == 0:
+                blocked += 1
+                continue
+            free_top -= 1
+            fid = free_ids[free_top]
+            rates[fid] = group_rates[g]
+            group_of[fid] = g
+            remaining[fid] = size
+            flow_size[fid] = size
+            start_time[fid] = t
+            offset = calendar_kernels.slot_offset(
+                rates[fid], mtu_size, calendar_interval
+            )
+            link_flow(
+                fid,
+                (current_slot + offset) % num_slots,
+                slot_head,
+                slot_tail,
+                slot_count,
+                next_flow,
+                prev_flow,
+                slot_of,
+            )
+
+        # Pop the current slot
+        n = 0
+        fid = slot_head[current_slot]
+        while fid != NULL_FLOW:
+            scratch[n] = fid
+            n += 1
+            slot_of[fid] = NULL_FLOW
+            fid = next_flow[fid]
+        slot_head[current_slot] = NULL_FLOW
+        slot_tail[current_slot] = NULL_FLOW
+        slot_count[current_slot] = 0
+        occupancy_hist[n] += 1
+        if n > max_occupancy:
+            max_occupancy = n
+        if record_slots:
+            slot_occupancy[step] = n
+
+        calendar_kernels.update_rates(
+            scratch,
+            n,
+            rates,
+            group_of,
+            group_thresholds,
+            decrease_mean,
+            decrease_std,
+            packets,
+            seed,
+            stream,
+            active_increase,
+            cnp_prob,
+            min_rate,
+        )
+        # Completed flows release their id, the others go to their next slot
+        for i in range(n):
+            fid = scratch[i]
+            remaining[fid] -= 1
+            if remaining[fid] == 0:
+                done_fct[done_count] = t + calendar_interval - start_time[fid]
+                done_size[done_count] = flow_size[fid]
+                done_flow[done_count] = fid
+                done_count += 1
+                free_ids[free_top] = fid
+                free_top += 1
+                continue
+            offset = calendar_kernels.slot_offset(
+                rates[fid], mtu_size, calendar_interval
+            )
+            link_flow(
+                fid,
+                (current_slot + offset) % num_slots,
+                slot_head,
+                slot_tail,
+                slot_count,
+                next_flow,
+                prev_flow,
+                slot_of,
+            )
+        current_slot = (current_slot + 1) % num_slots
+    return current_slot, arrival_pos, free_top, done_count, blocked, max_occupancy
+
+
+# ---------------------------------------------------
+# Arrivals
+# ---------------------------------------------------
+class ArrivalProcess:
+    """
+    Poisson flow arrivals (rate per second), uniform group, Pareto size in
+    packets (mean mean_packets, tail index shape > 1). The sample path does not
+    depend on how the run is chunked.
+    """
+
+    def __init__(self, arrival_rate, num_groups, mean_packets, shape, seed=0):
+        self.gap_ns = 1e9 / arrival_rate
+        self.num_groups = num_groups
+        self.min_packets = mean_packets * (shape - 1) / shape
+        self.shape = shape
+        # One stream per variate, so batch boundaries do not shift the draws
+        self.gaps, self.groups, self.sizes = (
+            np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(3)
+        )
+        self.last_time = 0.0
+        self.pending = (np.zeros(0), np.zeros(0, np.int64), np.zeros(0, np.int64))
+
+    def draw(self, count):
+        times = self.last_time + np.cumsum(self.gaps.exponential(self.gap_ns, count))
+        self.last_time = times[-1]
+        groups = self.groups.integers(0, self.num_groups, count)
+        sizes = np.ceil(self.min_packets * (1 + self.sizes.pareto(self.shape, count)))
+        return times, groups, sizes.astype(np.int64)
+
+    def until(self, end_time):
+        """Arrivals up to end_time (ns) not returned yet: (times, groups, sizes)."""
+        batch = max(16, int(2 * (end_time - self.last_time) / self.gap_ns))
+        while self.last_time <= end_time:
+            drawn = self.draw(batch)
+            self.pending = tuple(np.concatenate(p) for p in zip(self.pending, drawn))
+        cut = int(np.searchsorted(self.pending[0], end_time, side="right"))
+        due = tuple(p[:cut] for p in self.pending)
+        self.pending = tuple(p[cut:] for p in self.pending)
+        return due
+
+
+# ---------------------------------------------------
+# Engine
+# ---------------------------------------------------
+class ChurnScheduler:
+    def __init__(
+        self,
+        flow_groups,
+        CALENDAR_INTERVAL,
+        CALENDAR_SLOTS,
+        capacity=CHURN_MAX_FLOWS,
+        arrival_rate=CHURN_ARRIVAL_RATE,
+        mean_packets=CHURN_MEAN_PACKETS,
+        size_shape=CHURN_PARETO_SHAPE,
+        rng=None,
+        policy=None,
+        occupancy_stats=None,
+        chunk_slots=CHURN_CHUNK_SLOTS,
+    ):
+        """
+        flow_groups: {group_id: rate}; arrivals pick a group uniformly. The rate
+        update runs in the kernel, so policy must be a jit_kernel policy.
+        """
+        self.CALENDAR_INTERVAL = CALENDAR_INTERVAL
+        self.CALENDAR_SLOTS = CALENDAR_SLOTS
+        self.capacity = capacity
+        self.rng = CounterRNG(RNG_SEED) if rng is None else rng
+        self.policy = policy or rate_policies.SyntheticCnpPolicy()
+        if not self.policy.jit_kernel:
+            raise ValueError(
+                f"{type(self.policy).__name__} has no kernel parameters; "
+                "ChurnScheduler runs jit_kernel policies only"
+            )
+        self.occupancy_stats = occupancy_stats
+        self.chunk_slots = chunk_slots
+        self.t = 0
+        self.current_slot = 0
+
+        self.group_rates = np.fromiter(flow_groups.values(), dtype=float)
+        self.group_thresholds = CONGESTION_THRESHOLD * self.group_rates
+        self.arrivals = ArrivalProcess(
+            arrival_rate,
+            len(self.group_rates),
+            mean_packets,
+            size_shape,
+            seed=self.rng.seed,
+        )
+        self.arrival_buffer = None
+        self.arrival_pos = 0
+
+        # Free list: ids free_ids[:free_top] are free, the lowest handed out first
+        self.free_ids = np.arange(capacity, 0, -1, dtype=np.int64)
+        self.free_top = capacity
+
+        # Per-flow state, indexed by flow id (index 0 unused)
+        size = capacity + 1
+        self.rates = np.zeros(size)
+        self.group_of = np.zeros(size, dtype=np.int64)
+        self.packets = np.zeros(size, dtype=np.int64)
+        self.remaining = np.zeros(size, dtype=np.int64)
+        self.flow_size = np.zeros(size, dtype=np.int64)
+        self.start_time = np.zeros(size, dtype=np.int64)
+        self.next_flow = np.full(size, NULL_FLOW, dtype=np.int64)
+        self.prev_flow = np.full(size, NULL_FLOW, dtype=np.int64)
+        self.slot_of = np.full(size, NULL_FLOW, dtype=np.int64)
+        self.scratch = np.zeros(size, dtype=np.int64)
+
+        self.slot_head = np.full(CALENDAR_SLOTS, NULL_FLOW, dtype=np.int64)
+        self.slot_tail = np.full(CALENDAR_SLOTS, NULL_FLOW, dtype=np.int64)
+        self.slot_count = np.zeros(CALENDAR_SLOTS, dtype=np.int64)
+        self.tracked_occupancy = np.zeros(size + 1, dtype=np.int64)
+        self.max_calendar_occupancy = 0
+
+        self.arrived = 0
+        self.blocked = 0  # Arrivals that found no free id
+        self.torn_down = 0
+        self.completion_times = []  # Per chunk: FCT (ns) of the completed flows
+        self.completion_sizes = []  # Packets sent by them
+        self.completion_ids = []  # Flow ids they held
+
+    @property
+    def active_flows(self):
+        return self.capacity - self.free_top
+
+    def run_slots(self, max_slots, slot_occupancy=None):
+        """Same contract as OptimizedScheduler.run_slots."""
+        remaining = -(-(END_OF_TIME - self.t) // self.CALENDAR_INTERVAL)
+        num_steps = max(
+            0, remaining if max_slots is None else min(max_slots, remaining)
+        )
+        done = 0
+        while done < num_steps:
+            n = min(self.chunk_slots, num_steps - done)
+            out = None if slot_occupancy is None else slot_occupancy[done : done + n]
+            if out is None and self.occupancy_stats is not None:
+                out = np.zeros(n, dtype=np.int32)
+            self.run_chunk(n, out)
+            if self.occupancy_stats is not None:
+                self.occupancy_stats.add_slots(out)
+            done += n
+        return num_steps
+
+    def run_simulation(self):
+        self.run_slots(None)
+
+    def run_chunk(self, num_steps, slot_occupancy):
+        end_time = self.t + num_steps * self.CALENDAR_INTERVAL
+        # Arrivals are admitted at the first slot start at or after their time
+        times, groups, sizes = self.arrivals.until(end_time - self.CALENDAR_INTERVAL)
+        times = np.ceil(times).astype(np.int64)
+        self.arrived += len(times)
+        record_slots = slot_occupancy is not None
+        if not record_slots:
+            slot_occupancy = np.zeros(1, dtype=np.int32)
+        # Completions are bounded by the flows active now plus the arrivals
+        done_fct = np.zeros(self.active_flows + len(times), dtype=np.int64)
+        done_size = np.zeros(len(done_fct), dtype=np.int64)
+        done_flow = np.zeros(len(done_fct), dtype=np.int64)
+
+        active_increase, cnp_prob, cnp_mean, cnp_std, min_rate = (
+            self.policy.kernel_params()
+        )
+        result = churn_slots_kernel(
+            num_steps,
+            self.current_slot,
+            self.t,
+            times,
+            groups,
+            sizes,
+            0,
+            self.free_ids,
+            self.free_top,
+            self.group_rates,
+            self.rates,
+            self.group_of,
+            self.group_thresholds,
+            cnp_mean * self.group_rates,
+            cnp_std * self.group_rates,
+            self.packets,
+            self.remaining,
+            self.flow_size,
+            self.start_time,
+            self.slot_head,
+            self.slot_tail,
+            self.slot_count,
+            self.next_flow,
+            self.prev_flow,
+            self.slot_of,
+            self.scratch,
+            self.tracked_occupancy,
+            slot_occupancy,
+            record_slots,
+            done_fct,
+            done_size,
+            done_flow,
+            0,
+            self.rng.seed,
+            self.rng.stream,
+            active_increase,
+            cnp_prob,
+            min_rate,
+            MTU_SIZE,
+            self.CALENDAR_INTERVAL,
+        )
+        self.current_slot, _, self.free_top, done_count, blocked, max_occupancy = result
+        self.blocked += blocked
+        self.max_calendar_occupancy = max(self.max_calendar_occupancy, max_occupancy)
+        self.completion_times.append(done_fct[:done_count])
+        self.completion_sizes.append(done_size[:done_count])
+        self.completion_ids.append(done_flow[:done_count])
+        self.t = end_time
+
+    def deactivate(self, flow_ids):
+        """Tear down active flows: unlink them from their slot and free their ids."""
+        for fid in np.asarray(flow_ids, dtype=np.int64).tolist():
+            if self.slot_of[fid] == NULL_FLOW:
+                continue  # Not active
+            unlink_flow(
+                fid,
+                self.slot_head,
+                self.slot_tail,
+                self.slot_count,
+                self.next_flow,
+                self.prev_flow,
+                self.slot_of,
+            )
+            self.remaining[fid] = 0
+            self.free_ids[self.free_top] = fid
+            self.free_top += 1
+            self.torn_down += 1
+
+    def active_ids(self):
+        """Ids of the active flows (all of them sit in a calendar slot)."""
+        return np.flatnonzero(self.slot_of != NULL_FLOW)
+
+    def check_invariants(self):
+        """
+        Full O(slots + flows) consistency check of the calendar and free list:
+        every active id in exactly one slot with matching links and counts, and
+        the free ids exactly the others.
+        """
+        seen = np.zeros(self.capacity + 1, dtype=np.int64)
+        for slot in np.flatnonzero(self.slot_head != NULL_FLOW).tolist():
+            prev, fid, count = NULL_FLOW, self.slot_head[slot], 0
+            while fid != NULL_FLOW:
+                assert self.prev_flow[fid] == prev and self.slot_of[fid] == slot
+                seen[fid] += 1
+                prev, fid, count = fid, self.next_flow[fid], count + 1
+            assert self.slot_tail[slot] == prev and self.slot_count[slot] == count
+        assert self.slot_count.sum() == self.active_flows
+        assert np.all(seen[1:] <= 1) and seen.sum() == self.active_flows
+        free = self.free_ids[: self.free_top]
+        assert len(np.unique(free)) == len(free) and not np.any(seen[free])
+        return True
+
+    def completions(self):
+        """(flow completion times in ns, sizes in packets) of the finished flows."""
+        fct = np.concatenate([np.zeros(0, np.int64)] + self.completion_times)
+        return fct, np.concatenate([np.zeros(0, np.int64)] + self.completion_sizes)
+
+
+def verify_churn(flow_groups, seed=1, slots=1_000_000, teardown=256):
+    """
+    Small run with early teardowns between chunks; the invariants must hold
+    after every chunk, and the packets sent on every flow id (its counter, kept
+    across tenants) must equal the sizes of its completed tenants plus the
+    packets sent by its torn-down and still active ones.
+    """
+    scheduler = ChurnScheduler(
+        flow_groups,
+        CALENDAR_INTERVAL_LIST,
+        CALENDAR_SLOTS,
+        capacity=4096,
+        arrival_rate=40_000,
+        mean_packets=4,
+        rng=CounterRNG(seed),
+        chunk_slots=20_000,
+    )
+    rng = np.random.default_rng(seed)
+    torn_down_sent = np.zeros(scheduler.capacity + 1, dtype=np.int64)
+    for _ in range(slots // 20_000):
+        scheduler.run_slots(20_000)
+        scheduler.check_invariants()
+        active = scheduler.active_ids()
+        ids = rng.choice(active, min(teardown, len(active)), False)
+        sent = scheduler.flow_size[ids] - scheduler.remaining[ids]
+        np.add.at(torn_down_sent, ids, sent)
+        scheduler.deactivate(ids)
+        scheduler.check_invariants()
+
+    _, sizes = scheduler.completions()
+    completed = np.bincount(
+        np.concatenate(scheduler.completion_ids),
+        weights=sizes,
+        minlength=scheduler.capacity + 1,
+    ).astype(np.int64)
+    active = scheduler.slot_of != NULL_FLOW
+    in_progress = np.where(active, scheduler.flow_size - scheduler.remaining, 0)
+    expected = completed + torn_down_sent + in_progress
+    sent_ok = np.array_equal(scheduler.packets, expected)
+    ok = scheduler.arrived > scheduler.capacity and scheduler.torn_down > 0 and sent_ok
+    print(
+        f"Churn invariants hold: {ok} ({scheduler.arrived} arrivals, "
+        f"{scheduler.blocked} blocked, {scheduler.torn_down} torn down, "
+        f"{len(sizes)} completed, packets sent per flow id match: {sent_ok})"
+    )
+    return ok
+
+
+if __name__ == "__main__":
+    flow_groups = load_flow_groups(OUTPUT_FLOW_GROUPS_PATH)
+    verify_churn(flow_groups)
+
+    scheduler = ChurnScheduler(
+        flow_groups,
+        CALENDAR_INTERVAL_LIST,
+        CALENDAR_SLOTS,
+        rng=CounterRNG(RNG_SEED),
+    )
+    start = time.perf_counter()
+    scheduler.run_simulation()
+    elapsed = time.perf_counter() - start
+    fct, sizes = scheduler.completions()
+    print(f"{scheduler.arrived} arrivals in {END_OF_TIME / 1e9:.1f} s, {elapsed:.1f} s")
+    print(
+        f"Active flows at the end: {scheduler.active_flows} of {scheduler.capacity}, "
+        f"blocked arrivals: {scheduler.blocked}"
+    )
+    if len(fct):
+        print(
+            f"{len(fct)} completed, FCT p50 {np.percentile(fct, 50) / 1e6:.1f} ms, "
+            f"p99 {np.percentile(fct, 99) / 1e6:.1f} ms"
+        )
+    print("Max calendar slot occupancy:", scheduler.max_calendar_occupancy)
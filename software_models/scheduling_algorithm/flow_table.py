@@ -0,0 +1,102 @@
+"""
+NumPy flow table
+One structured array row per admission slot, in round-robin admission order
+(one flow of every group in turn), built without per-flow Python objects.
+Flow ids are numbered group by group from 1, as in generate_flows. Rows of
+flows owned by another shard are placeholders (flow_id PLACEHOLDER) that keep
+the admission timing. The engines take the table through from_flow_table().
+"""
+
+import numpy as np
+from scheduler_constants import *
+
+PLACEHOLDER = -1  # Same value as calendar_kernels.NULL_FLOW
+
+FLOW_DTYPE = np.dtype(
+    [
+        ("flow_id", np.int64),
+        ("group_id", np.int64),
+        ("rate", np.float64),  # Current rate (bps), initially the group rate
+        ("init_rate", np.float64),
+        ("threshold", np.float64),  # Congestion threshold of the synthetic CNP rule
+    ]
+)
+
+GROUP_DTYPE = np.dtype([("init_rate", np.float64), ("threshold", np.float64)])
+
+
+def build_flow_table(flow_groups, num_flows_per_group, shard_group_ids=None):
+    """
+    flow_groups: {group_id: rate}. With shard_group_ids only those groups get real
+    rows, the others become placeholders (trailing placeholders are dropped).
+    """
+    group_ids = np.fromiter(flow_groups.keys(), dtype=np.int64, count=len(flow_groups))
+    group_rates = np.fromiter(
+        flow_groups.values(), dtype=np.float64, count=len(flow_groups)
+    )
+    num_groups = len(group_ids)
+
+    # Viewed as (flow index, group) the table is the transposed group-major grid:
+    # row k holds the k-th flow of every group, group columns are broadcast
+    table = np.empty(num_groups * num_flows_per_group, dtype=FLOW_DTYPE)
+    grid = table.reshape(num_flows_per_group, num_groups)
+    first_ids = np.arange(num_groups, dtype=np.int64) * num_flows_per_group + 1
+    grid["flow_id"] = first_ids + np.arange(num_flows_per_group)[:, None]
+    grid["group_id"] = group_ids
+    grid["rate"] = group_rates
+    grid["init_rate"] = group_rates
+    grid["threshold"] = CONGESTION_THRESHOLD * group_rates
+
+    if shard_group_ids is not None:
+        owned = np.isin(table["group_id"], np.asarray(list(shard_group_ids)))
+        table["flow_id"][~owned] = PLACEHOLDER
+        last = np.flatnonzero(owned)
+        table = table[: last[-1] + 1 if len(last) else 0]
+    return table
+
+
+def compress_groups(table):
+    """
+    (groups, group_index): the distinct (init_rate, threshold) pairs of the rows as
+    a GROUP_DTYPE array, and for every row the index of its pair in the smallest
+    unsigned dtype (uint8 for up to 256 groups).
+    """
+    params = np.empty(len(table), dtype=GROUP_DTYPE)
+    params["init_rate"] = table["init_rate"]
+    params["threshold"] = table["threshold"]
+    groups, group_index = np.unique(params, return_inverse=True)
+    return groups, group_index.astype(np.min_scalar_type(max(len(groups) - 1, 0)))
+
+
+def owned_flows(table):
+    """Rows of real flows, sorted by flow id."""
+    flows = table[table["flow_id"] != PLACEHOLDER]
+    return flows[np.argsort(flows["flow_id"], kind="stable")]
+
+
+def flow_table_to_dicts(table):
+    """(input_flow_queue list, Rc_memory, init_rates) of the dict-based engines."""
+    flows = owned_flows(table)
+    ids = flows["flow_id"].tolist()
+    Rc_memory = dict(zip(ids, flows["rate"].tolist()))
+    init_rates = dict(zip(ids, flows["init_rate"].tolist()))
+    queue = table["flow_id"].tolist()
+    if len(flows) < len(table):
+        queue = [None if fid == PLACEHOLDER else fid for fid in queue]
+    return queue, Rc_memory, init_rates
+
+
+def flow_table_from_dicts(input_flow_queue, Rc_memory, init_rates):
+    """Flow table of dict-based engine inputs (None queue entries = placeholders)."""
+    ids = np.array(
+        [PLACEHOLDER if fid is None else fid for fid in input_flow_queue],
+        dtype=np.int64,
+    )
+    table = np.zeros(len(ids), dtype=FLOW_DTYPE)
+    table["flow_id"] = ids
+    real = ids != PLACEHOLDER
+    real_ids = ids[real].tolist()
+    table["rate"][real] = [Rc_memory[fid] for fid in real_ids]
+    table["init_rate"][real] = [init_rates[fid] for fid in real_ids]
+    table["threshold"] = CONGESTION_THRESHOLD * table["init_rate"]
+    return table
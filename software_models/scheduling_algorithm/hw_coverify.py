@@ -0,0 +1,219 @@
+"""
+Hardware-vs-model co-verification of the scheduler pipeline
+tb_Scheduler_pipeline_top dumps one "cycle qp seq_nr" line per flow_ready_out
+(format and comparison in hw_dump.py; tb_RP_wrapper dumps are checked by
+dcqcn_rp/rp_coverify.py).
+PipelineModel replays the same stimulus as tb_Scheduler_pipeline_top (reset
+release, then the Flow/Rate/Calendar BRAM init of Bram_init_pkg.vhd) at
+transaction level: a slot advance snapshots the slot's linked list into the
+overflow FIFO (dropped when full), the pipeline walks one chain at a time,
+emitting every active flow with seq_nr + 1 and reinserting it at the list head
+of slot cur_slot + rate. Event cycles follow the register and BRAM latencies
+of Scheduler_pipeline.vhd/Calendar.vhd; same-edge insert/advance collisions are
+not modelled, hence the cycle tolerance.
+The bundled pipeline_model_fixture.txt.gz is written by record_fixture from
+PipelineModel itself, in the testbench dump format: comparing it only checks the
+comparison, which verify_coverify also requires to reject perturbed copies. Point
+COVERIFY_DUMP_PATH at a ModelSim dump to check the RTL.
+"""
+
+from collections import deque
+
+import numpy as np
+from scheduler_constants import *
+from hw_dump import (
+    compare_streams,
+    read_bram_init,
+    read_dump,
+    read_vhdl_constants,
+    write_dump,
+)
+
+FLOW_DUMP_FIELDS = ("cycle", "qp", "seq_nr")
+
+
+# --- Reference model ---
+class PipelineModel:
+    def __init__(self, rtl_path=HW_RTL_PATH):
+        c = read_vhdl_constants(f"{rtl_path}/rtl/Constants_pkg.vhd")
+        self.num_slots = c["CALENDAR_SLOTS"]
+        self.interval = c["CALENDAR_INTERVAL"]
+        self.seq_mask = (1 << c["SEQ_NR_WIDTH"]) - 1
+        self.fifo_depth = 1 << c["OVERFLOW_BUFFER_SIZE"]
+        addr_width = c["FLAT_FLOW_ADDRESS_WIDTH"] + 1
+        null = (1 << addr_width) - 1
+        seq_shift = addr_width + c["QP_WIDTH"]
+
+        # Cycles, counted from edge 0 out of reset (see the module docstring):
+        # slot k is read and cleared at edge interval * k + 1 ...
+        cal_latency = c["CALENDAR_MEM_LATENCY"]
+        stage_2 = c["FLOW_MEM_LATENCY"] + 2
+        self.append_delay = cal_latency + 1  # ... and appended to the FIFO here
+        self.pop_delay = 2  # FIFO pop decision to stage 0 (pop, fifo_access)
+        self.chain_step = stage_2 + 1  # Stage 2 feeds the next address to stage 0
+        self.emit_delay = stage_2 + 2  # Stage 0 to flow_ready_out sampled by the tb
+        self.insert_delay = stage_2 + 3  # Stage 0 to the calendar BRAM write
+        self.ready_delay = stage_2 + 2  # Last chain element to the next pop decision
+
+        bram_init = f"{rtl_path}/mem/Bram_init_pkg.vhd"
+        words = read_bram_init(bram_init, "init_flow_mem_1024")
+        rates = read_bram_init(bram_init, "init_rate_mem_1024")
+        heads = read_bram_init(bram_init, "init_calendar_mem_512")
+        self.qp = {a: w & null for a, w in words.items()}
+        self.next_addr = {a: (w >> addr_width) & null for a, w in words.items()}
+        self.seq_nr = {a: (w >> seq_shift) & self.seq_mask for a, w in words.items()}
+        self.active = {
+            a: w >> (seq_shift + c["SEQ_NR_WIDTH"]) for a, w in words.items()
+        }
+        self.rate = [rates.get(a, 0) for a in range(max(words) + 1)]
+
+        # Slot lists in insertion order: the list head (walked first) is last
+        self.calendar = [[] for _ in range(self.num_slots)]
+        for slot, head in heads.items():
+            chain = []
+            while head != null:
+                chain.append(head)
+                head = self.next_addr[head]
+            self.calendar[slot] = chain[::-1]
+        self.fifo_drops = 0  # Flows lost with slot lists appended to a full FIFO
+
+    def events(self, end_cycle, chunk_events=COVERIFY_CHUNK_EVENTS):
+        """Yield {cycle, qp, seq_nr} chunks of the flow_ready_out events before end_cycle."""
+        calendar, rate, active, seq_nr, qp = (
+            self.calendar,
+            self.rate,
+            self.active,
+            self.seq_nr,
+            self.qp,
+        )
+        slot_mask = self.num_slots - 1
+        fifo = deque()  # (append edge, slot, chain in walk order)
+        chain, pos, base, edge = None, 0, 0, 0  # Walked chain, stage 0 edge of pos
+        ready = 0  # Earliest FIFO pop edge given the pipeline
+        k = 1  # Next slot advance (slot counter leaves 0 first)
+        cycles, qps, seqs = [], [], []
+        while True:
+            read_edge = self.interval * k + 1
+            if chain is None and fifo:
+                append_edge, base, chain = fifo.popleft()
+                edge = max(ready, append_edge + 1) + self.pop_delay
+                pos = 0
+            if chain is not None and (
+                edge + self.insert_delay < read_edge or read_edge >= end_cycle
+            ):
+                if edge + self.emit_delay >= end_cycle:
+                    break
+                fid = chain[pos]
+                seq = (seq_nr[fid] + 1) & self.seq_mask
+                seq_nr[fid] = seq
+                if active[fid]:
+                    cycles.append(edge + self.emit_delay)
+                    qps.append(qp[fid])
+                    seqs.append(seq)
+                calendar[(base + rate[fid]) & slot_mask].append(fid)
+                pos += 1
+                if pos == len(chain):
+                    chain = None
+                    ready = edge + self.ready_delay
+                edge += self.chain_step
+                if len(cycles) == chunk_events:
+                    yield self.chunk(cycles, qps, seqs)
+                    cycles, qps, seqs = [], [], []
+                continue
+
+            if read_edge >= end_cycle:
+                break
+            slot = k & slot_mask
+            if calendar[slot]:
+                if len(fifo) < self.fifo_depth:
+                    fifo.append(
+                        (read_edge + self.append_delay, slot, calendar[slot][::-1])
+                    )
+                else:
+                    self.fifo_drops += len(calendar[slot])
+                calendar[slot] = []
+            k += 1
+        yield self.chunk(cycles, qps, seqs)
+
+    @staticmethod
+    def chunk(cycles, qps, seqs):
+        return {
+            "cycle": np.array(cycles, dtype=np.int64),
+            "qp": np.array(qps, dtype=np.int64),
+            "seq_nr": np.array(seqs, dtype=np.int64),
+        }
+
+
+def coverify_scheduler(
+    dump_path=COVERIFY_DUMP_PATH,
+    rtl_path=HW_RTL_PATH,
+    cycle_tolerance=COVERIFY_CYCLE_TOLERANCE,
+    chunk_events=COVERIFY_CHUNK_EVENTS,
+):
+    """Compare a tb_Scheduler_pipeline_top dump to PipelineModel over the same cycles."""
+    hw = read_dump(dump_path)
+    if list(hw) != list(FLOW_DUMP_FIELDS):
+        raise ValueError(f"{dump_path}: expected fields {FLOW_DUMP_FIELDS}")
+    end_cycle = int(hw["cycle"][-1]) + 1 if len(hw["cycle"]) else 0
+    model = PipelineModel(rtl_path)
+    report = compare_streams(hw, model.events(end_cycle, chunk_events), cycle_tolerance)
+    report.fifo_drops = model.fifo_drops
+    return report
+
+
+def record_fixture(path=COVERIFY_DUMP_PATH, end_cycle=50_000, rtl_path=HW_RTL_PATH):
+    """Write the model's events over end_cycle cycles as a (gzipped) testbench dump."""
+    chunks = list(PipelineModel(rtl_path).events(end_cycle))
+    columns = {f: np.concatenate([c[f] for c in chunks]) for f in FLOW_DUMP_FIELDS}
+    return write_dump(path, columns)
+
+
+def verify_coverify(
+    dump_path=COVERIFY_DUMP_PATH,
+    rtl_path=HW_RTL_PATH,
+    cycle_tolerance=COVERIFY_CYCLE_TOLERANCE,
+):
+    """
+    The model-recorded fixture must match and copies of it with one event
+    perturbed must not: late by more than the cycle tolerance, another qp, another
+    seq_nr, or dropped.
+    """
+    hw = read_dump(dump_path)
+    end_cycle = int(hw["cycle"][-1]) + 1
+    i = len(hw["cycle"]) // 2
+
+    def perturbed(field, delta):
+        columns = {f: v.copy() for f, v in hw.items()}
+        columns[field][i] += delta
+        return columns
+
+    streams = {
+        "late": perturbed("cycle", cycle_tolerance + 1),
+        "qp": perturbed("qp", 1),
+        "seq_nr": perturbed("seq_nr", 1),
+        "dropped": {f: np.delete(v, i) for f, v in hw.items()},
+    }
+    matches = {
+        name: compare_streams(
+            columns, PipelineModel(rtl_path).events(end_cycle), cycle_tolerance
+        ).ok
+        for name, columns in {"fixture": hw, **streams}.items()
+    }
+    ok = matches.pop("fixture") and not any(matches.values())
+    rejected = [name for name, match in matches.items() if not match]
+    print(
+        f"Co-verification matches the fixture and rejects its perturbed copies: {ok} "
+        f"(rejected: {', '.join(rejected)})"
+    )
+    return ok
+
+
+if __name__ == "__main__":
+    import time
+
+    verify_coverify()
+    start = time.perf_counter()
+    report = coverify_scheduler()
+    print(f"Compared in {time.perf_counter() - start:.2f} s")
+    report.print_report()
+    print(f"Model FIFO drops: {report.fifo_drops} flows")
@@ -0,0 +1,154 @@
+"""
+Testbench dumps and VHDL sources of the hardware co-verification
+The testbenches write cycle-stamped dumps, one line per output event, under a
+"# cycle <fields>" header, where cycle counts rising edges from the first one
+out of reset. Dumps may be gzipped, and are parsed once into a model_io sidecar
+cache. compare_streams diffs a dump against chunks of model events event by
+event, cycles within a tolerance, other fields within per-field tolerances, so
+multi-million-cycle dumps compare in seconds. The readers take the integer and
+unsigned constants of Constants_pkg.vhd and the BRAM init of Bram_init_pkg.vhd.
+The scheduling_algorithm and dcqcn_rp copies of this file are identical; edit
+the scheduling_algorithm one and run software_models/check_shared_files.py --sync.
+"""
+
+import gzip
+import re
+
+import numpy as np
+from model_io import cached_load
+
+
+# --- VHDL sources ---
+def read_vhdl_constants(path):
+    """Integer literal constants of a VHDL file, e.g. Constants_pkg.vhd."""
+    with open(path) as f:
+        text = f.read()
+    pattern = r"constant\s+(\w+)\s*:\s*(?:integer|natural)\s*:=\s*(-?\d+)\s*;"
+    return {name: int(value) for name, value in re.findall(pattern, text)}
+
+
+def read_vhdl_unsigned(path, integers):
+    """
+    unsigned(<width> - 1 downto 0) constants given as to_unsigned(n, ...), a bit
+    string or (others => '0'/'1'); integers: constants naming the widths.
+    """
+    with open(path) as f:
+        text = f.read()
+    pattern = (
+        r"constant\s+(\w+)\s*:\s*unsigned\((\w+)\s*-\s*1\s+downto\s+0\)\s*:=\s*(.+?);"
+    )
+    values = {}
+    for name, width, value in re.findall(pattern, text):
+        width = integers[width] if width in integers else int(width)
+        if match := re.match(r"to_unsigned\((\d+)", value):
+            values[name] = int(match[1])
+        elif match := re.match(r'"([01]+)"', value):
+            values[name] = int(match[1], 2)
+        elif match := re.match(r"\(others\s*=>\s*'([01])'\)", value):
+            values[name] = (1 << width) - 1 if match[1] == "1" else 0
+    return values
+
+
+def read_bram_init(path, name):
+    """{address: int} of the init constant `name` of Bram_init_pkg.vhd."""
+    with open(path) as f:
+        text = f.read()
+    start = text.index(f"constant {name}")
+    body = text[start : text.index(");", start)]
+    return {
+        int(a): int(bits, 2) for a, bits in re.findall(r'(\d+)\s*=>\s*"([01]+)"', body)
+    }
+
+
+# --- Dumps ---
+def parse_dump(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        header = f.readline()
+    if not header.startswith("#"):
+        raise ValueError(f"{path}: expected a '# cycle <fields>' header")
+    fields = header[1:].split()
+    if not fields or fields[0] != "cycle":
+        raise ValueError(f"{path}: first dump field must be 'cycle', got {fields}")
+    values = np.loadtxt(path, dtype=np.int64, ndmin=2).reshape(-1, len(fields))
+    if np.any(np.diff(values[:, 0]) < 0):
+        raise ValueError(f"{path}: dump cycles must be non-decreasing")
+    return {field: values[:, i] for i, field in enumerate(fields)}
+
+
+def read_dump(path, use_cache=True):
+    """Dump columns as {field: int64 array}, in file order."""
+    return cached_load(path, parse_dump, use_cache)
+
+
+def write_dump(path, columns):
+    """Write columns ({field: array}, cycle first) in the testbench dump format."""
+    fields = list(columns)
+    values = np.column_stack([np.asarray(columns[field]) for field in fields])
+    np.savetxt(path, values, fmt="%d", header=" ".join(fields))
+    return path
+
+
+# --- Comparison ---
+class CoverifyReport:
+    def __init__(self, fields, max_reported):
+        self.fields = fields
+        self.max_reported = max_reported
+        self.hw_events = 0
+        self.model_events = 0
+        self.mismatches = dict.fromkeys(fields, 0)  # Events out of tolerance
+        self.first = []  # (event index, field, hw value, model value)
+        self.max_cycle_error = 0
+
+    @property
+    def ok(self):
+        return self.hw_events == self.model_events and not any(self.mismatches.values())
+
+    def print_report(self):
+        print(f"Events: hardware {self.hw_events}, model {self.model_events}")
+        print(f"Max cycle error: {self.max_cycle_error}")
+        for field, count in self.mismatches.items():
+            if count:
+                print(f"  {field}: {count} mismatches")
+        for index, field, hw, model in self.first:
+            print(f"  event {index}: {field} hardware {hw}, model {model}")
+        print("MATCH" if self.ok else "MISMATCH")
+
+
+def compare_streams(
+    hw, model_chunks, cycle_tolerance=0, tolerances=None, max_reported=20
+):
+    """
+    hw: dump columns; model_chunks: iterable of column chunks with the same fields.
+    Events are matched by index; fields other than cycle are exact unless given
+    a tolerance in tolerances ({field: max abs difference}).
+    """
+    fields = list(hw)
+    tolerances = {**(tolerances or {}), "cycle": cycle_tolerance}
+    report = CoverifyReport(fields, max_reported)
+    report.hw_events = n_hw = len(hw["cycle"])
+    offset = 0
+    for chunk in model_chunks:
+        n = len(chunk["cycle"])
+        report.model_events += n
+        end = min(offset + n, n_hw)
+        if end > offset:
+            for field in fields:
+                diff = np.abs(hw[field][offset:end] - chunk[field][: end - offset])
+                if field == "cycle" and len(diff):
+                    report.max_cycle_error = max(
+                        report.max_cycle_error, int(diff.max())
+                    )
+                bad = np.flatnonzero(diff > tolerances.get(field, 0))
+                report.mismatches[field] += len(bad)
+                for i in bad[: max_reported - len(report.first)]:
+                    report.first.append(
+                        (
+                            offset + int(i),
+                            field,
+                            int(hw[field][offset + i]),
+                            int(chunk[field][i]),
+                        )
+                    )
+        offset += n
+    return report
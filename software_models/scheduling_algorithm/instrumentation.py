@@ -0,0 +1,133 @@
+"""
+Opt-in instrumentation of the calendar engines
+An engine given an Instrumentation calls its hooks from its slot loop; without one
+the hooks are skipped, so disabled instrumentation costs one check per phase.
+Collects per-phase wall time, hot-path counters and a periodic progress/ETA line.
+OptimizedScheduler times trace, admission, slot_pop, rate_update and reinsertion;
+ArrayScheduler runs them fused in one compiled loop and reports a single "kernel"
+phase, without IPG overflow counts.
+Phases named in profile_phases run under cProfile; perf=True enables the perf
+stack trampoline (Python 3.12+) so `perf record` resolves Python frames.
+"""
+
+import cProfile
+import pstats
+import sys
+import time
+
+from scheduler_constants import *
+
+PHASES = ("trace", "admission", "slot_pop", "rate_update", "reinsertion", "kernel")
+
+
+class Instrumentation:
+    def __init__(
+        self,
+        progress_interval=PROGRESS_INTERVAL,
+        profile_phases=(),
+        perf=False,
+        chunk_slots=INSTRUMENT_CHUNK_SLOTS,
+    ):
+        self.progress_interval = progress_interval  # Seconds, None = silent
+        self.profile_phases = set(profile_phases)
+        self.profiler = cProfile.Profile() if self.profile_phases else None
+        self.perf = perf
+        self.chunk_slots = chunk_slots  # Slots per chunk of the fused kernel loop
+
+        self.phase_time = dict.fromkeys(PHASES, 0.0)
+        self.slots = 0
+        self.busy_slots = 0
+        self.packets = 0
+        self.max_packets_per_slot = 0
+        self.admissions = 0
+        self.wraparounds = 0  # Calendar pointer returned to slot 0
+        # Next packet further away than the calendar window (None = not counted
+        # by the engine)
+        self.ipg_overflows = None
+
+        self.run_start = None
+        self.last_report = None
+        self.last_report_slots = 0
+
+    # --- Phase brackets ---
+    def begin(self, phase):
+        if phase in self.profile_phases:
+            self.profiler.enable()
+        return time.perf_counter()
+
+    def end(self, phase, start):
+        self.phase_time[phase] += time.perf_counter() - start
+        if phase in self.profile_phases:
+            self.profiler.disable()
+
+    # --- Counters ---
+    def count_slot(self, n):
+        self.slots += 1
+        if n:
+            self.busy_slots += 1
+            self.packets += n
+            if n > self.max_packets_per_slot:
+                self.max_packets_per_slot = n
+
+    def count_slots(self, occupancy, first_slot, num_slots):
+        """Counters for a chunk of slot occupancies starting at calendar slot first_slot."""
+        n = len(occupancy)
+        self.slots += n
+        self.busy_slots += int((occupancy > 0).sum())
+        self.packets += int(occupancy.sum())
+        if n:
+            self.max_packets_per_slot = max(
+                self.max_packets_per_slot, int(occupancy.max())
+            )
+        self.wraparounds += (first_slot + n) // num_slots
+
+    # --- Run brackets and progress ---
+    def start_run(self):
+        now = time.perf_counter()
+        if self.run_start is None:
+            self.run_start = now
+            self.last_report = now
+        if self.perf:
+            if hasattr(sys, "activate_stack_trampoline"):
+                sys.activate_stack_trampoline("perf")
+            else:
+                print("perf trampoline needs Python 3.12+, perf=True ignored")
+                self.perf = False
+
+    def stop_run(self):
+        if self.perf:
+            sys.deactivate_stack_trampoline()
+
+    def progress(self, t, end_time):
+        """Report slots/s and ETA at most once per progress_interval seconds."""
+        if self.progress_interval is None:
+            return
+        now = time.perf_counter()
+        if now - self.last_report < self.progress_interval:
+            return
+        rate = (self.slots - self.last_report_slots) / (now - self.last_report)
+        remaining = (end_time - t) / max(t, 1) * (now - self.run_start)
+        print(
+            f"Progress: {t * 100 // end_time}%, {rate:,.0f} slots/s, "
+            f"ETA {remaining:.0f} s"
+        )
+        self.last_report = now
+        self.last_report_slots = self.slots
+
+    def print_report(self, top=20):
+        total = sum(self.phase_time.values())
+        print("Phase times:")
+        for phase, seconds in self.phase_time.items():
+            if seconds:
+                print(f"  {phase}: {seconds:.3f} s ({seconds / total:.1%})")
+        elapsed = time.perf_counter() - self.run_start if self.run_start else 0.0
+        if elapsed:
+            print(f"Slots/s: {self.slots / elapsed:,.0f}")
+        print(f"Slots: {self.slots}, busy: {self.busy_slots}")
+        print(f"Packets: {self.packets}, max per slot: {self.max_packets_per_slot}")
+        print(f"Admissions: {self.admissions}, wraparounds: {self.wraparounds}")
+        if self.ipg_overflows is not None:
+            print(f"IPG overflows: {self.ipg_overflows}")
+        if self.profiler is not None:
+            print(f"cProfile of {', '.join(sorted(self.profile_phases))}:")
+            pstats.Stats(self.profiler).sort_stats("cumulative").print_stats(top)
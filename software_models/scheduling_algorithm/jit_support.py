@@ -0,0 +1,39 @@
+"""
+Optional Numba support
+Kernels are written once as plain Python over NumPy arrays; `jit` compiles them
+when Numba is installed and leaves them as ordinary Python functions otherwise.
+"""
+
+from contextlib import contextmanager
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional
+    njit = None
+
+HAVE_NUMBA = njit is not None
+
+
+def jit(func):
+    """Compile func with Numba if available; the Python source stays in .py_func."""
+    if njit is None:
+        func.py_func = func
+        return func
+    return njit(cache=True)(func)
+
+
+@contextmanager
+def interpreted(*modules):
+    """Temporarily swap the compiled kernels of modules for their Python source."""
+    swapped = []
+    for module in modules:
+        for name, func in list(vars(module).items()):
+            py_func = getattr(func, "py_func", None)
+            if py_func is not None and py_func is not func:
+                swapped.append((module, name, func))
+                setattr(module, name, py_func)
+    try:
+        yield
+    finally:
+        for module, name, func in swapped:
+            setattr(module, name, func)
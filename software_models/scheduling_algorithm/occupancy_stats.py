@@ -0,0 +1,161 @@
+"""
+Streaming calendar occupancy statistics
+OccupancyStats consumes the number of flows in each processed slot, either one
+slot at a time (add) or a chunk at a time (add_slots, vectorized), and keeps:
+  - the run histogram and one histogram per window of window_slots slots
+    (the last max_windows windows are kept), so warm-up and steady state differ
+  - running mean/variance (Welford, merged per chunk with Chan's formula)
+  - percentiles from the histogram (p99, p999) and the exact maximum
+  - the longest run of consecutive busy (non-empty) slots; in Scheduler_pipeline
+    every slot advance with a non-empty list appends to the overflow FIFO
+Histograms have max_occupancy + 1 bins, higher occupancies share the last bin.
+Work per slot is O(1) and memory is bounded by the bins and max_windows.
+"""
+
+from collections import deque
+
+import numpy as np
+from scheduler_constants import *
+
+
+class OccupancyStats:
+    def __init__(
+        self,
+        window_slots=OCCUPANCY_WINDOW_SLOTS,
+        max_occupancy=OCCUPANCY_MAX_BIN,
+        max_windows=OCCUPANCY_MAX_WINDOWS,
+    ):
+        self.window_slots = window_slots
+        self.max_occupancy = max_occupancy
+        self.histogram = np.zeros(max_occupancy + 1, dtype=np.int64)
+        self.window = np.zeros(max_occupancy + 1, dtype=np.int64)
+        self.window_start = 0  # First slot of the current window
+        self.window_fill = 0  # Slots in the current window
+        self.windows = deque(maxlen=max_windows)  # (first slot, histogram)
+
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the mean
+        self.max = 0
+        self.busy_run = 0  # Busy slots up to the last one added
+        self.max_busy_burst = 0
+
+    def add(self, n):
+        """One slot with n flows."""
+        b = min(n, self.max_occupancy)
+        self.histogram[b] += 1
+        self.window[b] += 1
+
+        self.count += 1
+        delta = n - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (n - self.mean)
+        if n > self.max:
+            self.max = n
+
+        self.busy_run = self.busy_run + 1 if n else 0
+        if self.busy_run > self.max_busy_burst:
+            self.max_busy_burst = self.busy_run
+
+        self.window_fill += 1
+        if self.window_fill == self.window_slots:
+            self.close_window()
+
+    def add_slots(self, occupancy):
+        """Consecutive slots, e.g. the slot_occupancy buffer filled by run_slots."""
+        occupancy = np.asarray(occupancy, dtype=np.int64)
+        if len(occupancy) == 0:
+            return
+        start = 0
+        while start < len(occupancy):
+            end = min(len(occupancy), start + self.window_slots - self.window_fill)
+            counts = np.bincount(
+                np.minimum(occupancy[start:end], self.max_occupancy),
+                minlength=self.max_occupancy + 1,
+            )
+            self.histogram += counts
+            self.window += counts
+            self.window_fill += end - start
+            if self.window_fill == self.window_slots:
+                self.close_window()
+            start = end
+
+        # Chan et al. merge of the chunk moments into the running ones
+        n = len(occupancy)
+        chunk_mean = occupancy.mean()
+        chunk_m2 = ((occupancy - chunk_mean) ** 2).sum()
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta**2 * self.count * n / total
+        self.count = total
+        self.max = max(self.max, int(occupancy.max()))
+
+        # Busy runs: lengths between idle slots, the first one continues the last chunk
+        idle = np.flatnonzero(occupancy == 0)
+        if len(idle) == 0:
+            self.busy_run += n
+        else:
+            runs = np.diff(idle) - 1
+            longest = runs.max() if len(runs) else 0
+            longest = max(longest, self.busy_run + idle[0])
+            self.max_busy_burst = max(self.max_busy_burst, int(longest))
+            self.busy_run = n - 1 - idle[-1]
+        self.max_busy_burst = max(self.max_busy_burst, self.busy_run)
+
+    def close_window(self):
+        self.windows.append((self.window_start, self.window))
+        self.window = np.zeros(self.max_occupancy + 1, dtype=np.int64)
+        self.window_start += self.window_slots
+        self.window_fill = 0
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else 0.0
+
+    def percentile(self, q, histogram=None):
+        """Smallest occupancy with at least q percent of the slots at or below it."""
+        histogram = self.histogram if histogram is None else histogram
+        cumulative = np.cumsum(histogram)
+        if cumulative[-1] == 0:
+            return 0
+        b = int(np.searchsorted(cumulative, q / 100 * cumulative[-1]))
+        # The last bin holds everything above max_occupancy: report the maximum
+        return self.max if b == self.max_occupancy else b
+
+    def window_table(self):
+        """Kept window histograms as a long table (first slot, occupancy, slots)."""
+        first_slot, occupancy, slots = [], [], []
+        for start, histogram in self.windows:
+            nonzero = np.flatnonzero(histogram)
+            first_slot.append(np.full(len(nonzero), start, dtype=np.int64))
+            occupancy.append(nonzero)
+            slots.append(histogram[nonzero])
+        empty = [np.zeros(0, dtype=np.int64)]
+        return {
+            "first_slot": np.concatenate(empty + first_slot),
+            "occupancy": np.concatenate(empty + occupancy),
+            "slots": np.concatenate(empty + slots),
+        }
+
+    def summary(self):
+        return {
+            "slots": self.count,
+            "mean": float(self.mean),
+            "std": float(self.variance) ** 0.5,
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max,
+            "max_busy_burst": self.max_busy_burst,
+        }
+
+    def print_stats(self):
+        s = self.summary()
+        print(f"Occupancy over {s['slots']} slots:")
+        print(f"Mean: {s['mean']:.4f}, std: {s['std']:.4f}")
+        print(f"p99: {s['p99']}, p999: {s['p999']}, max: {s['max']}")
+        print(f"Max busy burst: {s['max_busy_burst']} slots")
+        for start, histogram in self.windows:
+            p99 = self.percentile(99, histogram)
+            busy = 1 - histogram[0] / histogram.sum()
+            print(f"Window from slot {start}: busy {busy:.3f}, p99 {p99}")
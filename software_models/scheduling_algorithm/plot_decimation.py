@@ -0,0 +1,191 @@
+"""
+Decimated plotting of long histories
+A figure is only so many pixels wide, so a series of millions of samples is
+reduced to the minimum and the maximum of every pixel column (bucket of equal
+x width) before it reaches matplotlib: the drawn envelope, spikes included, is
+the same as with every sample, and drawing costs O(buckets).
+  - MinMaxDecimator is fed in chunks with increasing x (a running simulation or
+    slices of a memmap), so the full series never has to be in memory at once
+  - decimate() does that for a whole array or memmap; NaN samples are skipped
+  - decimate_events() keeps the first of the events in every bucket, e.g.
+    packet send times drawn as vlines
+finish() shows the figure, or with a plot directory saves it there and closes
+it, so runs render headless (no display needed with MPLBACKEND=Agg).
+The scheduling_algorithm, dcqcn_rp and scheduler_single_flow copies of this
+file are identical; edit the scheduling_algorithm one and run
+software_models/check_shared_files.py --sync.
+"""
+
+import os
+import tempfile
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+DEFAULT_BUCKETS = 2000  # Pixel columns: about the width of a saved figure
+DEFAULT_CHUNK = 1 << 22  # Samples read per chunk of an array or memmap
+
+
+class MinMaxDecimator:
+    """Minimum and maximum (with their x) of every bucket of [x_start, x_end]."""
+
+    def __init__(self, x_start, x_end, buckets=DEFAULT_BUCKETS):
+        self.x_start = float(x_start)
+        self.x_end = float(x_end)
+        self.buckets = buckets
+        self.scale = buckets / max(self.x_end - self.x_start, 1e-300)
+        self.y_min = np.full(buckets, np.inf)
+        self.y_max = np.full(buckets, -np.inf)
+        self.x_min = np.zeros(buckets)
+        self.x_max = np.zeros(buckets)
+
+    def add(self, x, y):
+        """One chunk; x non-decreasing within and across chunks."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        keep = ~np.isnan(y) & (x >= self.x_start) & (x <= self.x_end)
+        x, y = x[keep], y[keep]
+        if not len(y):
+            return
+        bucket = np.minimum(
+            ((x - self.x_start) * self.scale).astype(np.int64), self.buckets - 1
+        )
+        # Buckets are contiguous runs of the sorted x
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        run_of = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(y)]))
+        bucket = bucket[starts]
+        for values, best, best_x, better in (
+            (np.minimum.reduceat(y, starts), self.y_min, self.x_min, np.less),
+            (np.maximum.reduceat(y, starts), self.y_max, self.x_max, np.greater),
+        ):
+            # x of the first sample reaching the extreme of its run
+            hits = np.flatnonzero(y == values[run_of])
+            first = hits[np.unique(run_of[hits], return_index=True)[1]]
+            update = better(values, best[bucket])
+            best[bucket[update]] = values[update]
+            best_x[bucket[update]] = x[first[update]]
+
+    def points(self):
+        """(x, y) of the extremes of the non-empty buckets, in x order."""
+        filled = np.isfinite(self.y_min)
+        x = np.stack([self.x_min[filled], self.x_max[filled]], axis=1)
+        y = np.stack([self.y_min[filled], self.y_max[filled]], axis=1)
+        swap = x[:, 0] > x[:, 1]
+        x[swap] = x[swap, ::-1]
+        y[swap] = y[swap, ::-1]
+        x, y = x.ravel(), y.ravel()
+        # A bucket whose extremes are one sample keeps one point
+        single = np.zeros(len(x), dtype=bool)
+        single[1::2] = (x[1::2] == x[0::2]) & (y[1::2] == y[0::2])
+        return x[~single], y[~single]
+
+
+def decimate(x, y, buckets=DEFAULT_BUCKETS, chunk=DEFAULT_CHUNK):
+    """
+    Min/max decimation of an array or memmap y against increasing x (None: the
+    sample index). Short series are returned as they are.
+    """
+    n = len(y)
+    if x is None and n <= 2 * buckets:
+        return np.arange(n), np.asarray(y)
+    if n <= 2 * buckets:
+        return np.asarray(x), np.asarray(y)
+    x_start, x_end = (0, n - 1) if x is None else (x[0], x[-1])
+    decimator = MinMaxDecimator(x_start, x_end, buckets)
+    for i in range(0, n, chunk):
+        xs = np.arange(i, min(i + chunk, n)) if x is None else x[i : i + chunk]
+        decimator.add(xs, y[i : i + chunk])
+    return decimator.points()
+
+
+def decimate_events(times, buckets=DEFAULT_BUCKETS, chunk=DEFAULT_CHUNK):
+    """First event time of every bucket with events (times increasing)."""
+    times = np.asarray(times) if not isinstance(times, np.ndarray) else times
+    if len(times) <= buckets:
+        return times
+    t_start, t_end = float(times[0]), float(times[-1])
+    scale = buckets / max(t_end - t_start, 1e-300)
+    seen = np.zeros(buckets, dtype=bool)
+    kept = []
+    for i in range(0, len(times), chunk):
+        t = times[i : i + chunk]
+        bucket = np.minimum(((t - t_start) * scale).astype(np.int64), buckets - 1)
+        bucket, first = np.unique(bucket, return_index=True)
+        new = ~seen[bucket]
+        seen[bucket[new]] = True
+        kept.append(t[first[new]])
+    return np.concatenate(kept)
+
+
+def plot_series(ax, x, y, buckets=DEFAULT_BUCKETS, **kwargs):
+    """ax.plot of the decimated series."""
+    return ax.plot(*decimate(x, y, buckets), **kwargs)
+
+
+def finish(fig, plot_dir=None, name="figure", dpi=150):
+    """Show fig, or save it as <plot_dir>/<name>.png and close it. Returns the path."""
+    if plot_dir is None:
+        plt.show()
+        return None
+    os.makedirs(plot_dir, exist_ok=True)
+    path = os.path.join(plot_dir, name + ".png")
+    fig.savefig(path, dpi=dpi)
+    plt.close(fig)
+    return path
+
+
+def verify_decimation(n=1_000_003, buckets=997, seed=0):
+    """
+    Random walk with spikes: every bucket's extremes must equal a brute-force
+    reduction, chunked input must decimate like one chunk, and a memmap like
+    the array.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.cumsum(rng.exponential(1.0, n))
+    y = np.cumsum(rng.normal(size=n))
+    y[rng.integers(0, n, 50)] += 1e3
+    y[rng.integers(0, n, 50)] = np.nan
+    px, py = decimate(x, y, buckets, chunk=65_537)
+    whole = decimate(x, y, buckets, chunk=n)
+    finite = ~np.isnan(y)
+    bucket = np.minimum(
+        ((x - x[0]) * (buckets / (x[-1] - x[0]))).astype(int), buckets - 1
+    )
+    lo = np.full(buckets, np.inf)
+    hi = np.full(buckets, -np.inf)
+    np.minimum.at(lo, bucket[finite], y[finite])
+    np.maximum.at(hi, bucket[finite], y[finite])
+    pb = np.minimum(((px - x[0]) * (buckets / (x[-1] - x[0]))).astype(int), buckets - 1)
+    starts = np.unique(pb, return_index=True)[1]
+    filled = np.isfinite(lo)
+    ok = (
+        np.array_equal(np.minimum.reduceat(py, starts), lo[filled])
+        and np.array_equal(np.maximum.reduceat(py, starts), hi[filled])
+        and np.array_equal(px, whole[0])
+        and np.array_equal(py, whole[1])
+        and np.all(np.diff(px) >= 0)
+    )
+    path = os.path.join(tempfile.gettempdir(), "plot_decimation_verify.npy")
+    np.save(path, y)
+    try:
+        mx, my = decimate(None, np.load(path, mmap_mode="r"), buckets, chunk=65_537)
+        ix, iy = decimate(None, y, buckets)
+        ok = ok and np.array_equal(mx, ix) and np.array_equal(my, iy)
+    finally:
+        os.remove(path)
+    print(f"Decimation matches brute force: {ok} ({n} samples -> {len(px)} points)")
+    return ok
+
+
+if __name__ == "__main__":
+    import time
+
+    verify_decimation()
+    n = 10_000_000
+    y = np.cumsum(np.random.default_rng(1).normal(size=n))
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=(10, 5))
+    plot_series(ax, None, y, label="Random walk")
+    ax.legend()
+    path = finish(fig, tempfile.gettempdir(), "plot_decimation_demo")
+    print(f"{n} samples plotted to {path} in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,60 @@
+"""
+Calendar slot occupancy distribution of a recorded run
+Plots the occupancy_histogram table of a result set written by ResultWriter:
+    python plot_occupancy_distribution.py [<results path>]
+(default RESULTS_PATH). Kept out of scheduler_constants so importing the
+constants has no plot side effect.
+"""
+
+import sys
+
+import matplotlib.pyplot as plt
+import numpy as np
+from scheduler_constants import *
+from plot_decimation import finish
+from result_export import load_results
+
+
+def plot_occupancy_distribution(path=RESULTS_PATH, plot_dir=PLOT_DIR):
+    """Bar chart of slots per occupancy of an exported run; shown or saved to plot_dir."""
+    if path is None:
+        raise ValueError("No results path given and RESULTS_PATH is None")
+    tables, metadata = load_results(path)
+    histogram = tables["occupancy_histogram"]
+    packets_per_slot = histogram["occupancy"]
+    slot_counts = histogram["slots"]
+    interval = metadata.get(
+        "calendar_interval", metadata["constants"].get("CALENDAR_INTERVAL_LIST")
+    )
+
+    # Create the bar chart
+    fig = plt.figure(figsize=(8, 5))
+    plt.bar(packets_per_slot, slot_counts, color="skyblue", edgecolor="black")
+
+    # --- Applying the descriptive titles ---
+    plt.xlabel("Slot Occupancy", fontsize=16)
+    plt.ylabel("Frequency (Number of Slots)", fontsize=16)
+    plt.title(
+        f"Distribution of Calendar Slot Occupancy ({interval}ns Interval)",
+        fontsize=16,
+        fontweight="bold",
+    )
+
+    # Make the y-axis more readable (e.g., 150k instead of 150000)
+    plt.ticklabel_format(style="sci", axis="y", scilimits=(0, 0))
+    plt.gca().yaxis.set_major_formatter(
+        plt.FuncFormatter(lambda x, p: format(int(x), ","))
+    )
+
+    # Set x-axis ticks to be integers, showing all values
+    plt.xticks(np.arange(0, packets_per_slot.max() + 1, 1))
+
+    # Add a grid for better readability
+    plt.grid(axis="y", linestyle="--", alpha=0.7)
+
+    plt.tight_layout()
+    return finish(fig, plot_dir, "occupancy_distribution")
+
+
+if __name__ == "__main__":
+    plot_occupancy_distribution(sys.argv[1] if len(sys.argv) > 1 else RESULTS_PATH)
@@ -0,0 +1,175 @@
+"""
+Bit-width and quantization sweep of the rate -> calendar slot conversion
+Every candidate (rate bits, CALENDAR_SLOTS_WIDTH, CALENDAR_INTERVAL) is applied
+to every flow group rate in one NumPy broadcast, following the hardware path:
+  - the rate is quantized to rate_bits over the full scale
+    (LSB = full_scale / 2^rate_bits, code at least 1)
+  - IPG_DIVIDEND = MTU_SIZE * 1e9 / (LSB * interval), truncated to an integer
+    like the constant C of rate_2_slot_conv.vhd, slot offset = IPG_DIVIDEND // code
+  - the offset is kept in slot_bits (to_unsigned wraps), 0 being a full turn
+  - achieved rate = MTU_SIZE * 1e9 / (offset * interval)
+Configurations are scored by percentiles of the relative achieved rate error,
+memory bits (calendar heads, Rate_mem offsets, RP Rc/Rt/R_max fields) and
+the mean number of flows per slot the pipeline has to walk in one interval.
+The Pareto front over (p99 error, memory, load) is the shortlist that
+simulate_shortlist() runs through the calendar engine.
+"""
+
+import time
+
+import numpy as np
+from scheduler_constants import *
+from array_scheduler import create_scheduler_from_table, load_flow_groups
+from counter_rng import CounterRNG
+from flow_table import build_flow_table
+from occupancy_stats import OccupancyStats
+
+SWEEP_PERCENTILES = (50, 99, 100)
+
+
+def sweep(
+    group_rates,
+    rate_bits=SWEEP_RATE_BITS,
+    slot_bits=SWEEP_SLOT_BITS,
+    intervals=SWEEP_INTERVALS,
+    full_scale=None,
+    num_flows_per_group=NUM_FLOWS_PER_GROUP,
+    error_rates=None,
+):
+    """
+    group_rates: flow group rates (bps), which set the flow count and slot load.
+    The error is evaluated at error_rates (default the group rates). Returns a
+    columnar table with one row per configuration and a "pareto" column.
+    """
+    group_rates = np.asarray(group_rates, dtype=float)
+    rates = group_rates if error_rates is None else np.asarray(error_rates, float)
+    if full_scale is None:
+        full_scale = group_rates.max() * SWEEP_RATE_HEADROOM
+
+    # Axes: (rate bits, slot bits, interval, flow group)
+    R = np.asarray(rate_bits)[:, None, None, None]
+    S = np.asarray(slot_bits)[None, :, None, None]
+    I = np.asarray(intervals, dtype=float)[None, None, :, None]
+    lsb = full_scale / 2.0**R
+    code = np.clip(np.floor(rates / lsb), 1, 2.0**R - 1)
+    dividend = np.floor(MTU_SIZE * 1e9 / (lsb * I))
+    offset = np.floor(dividend / code) % 2.0**S
+    wrapped = np.floor(dividend / code) >= 2.0**S
+    offset = np.where(offset == 0, 2.0**S, offset)
+    error = np.abs(MTU_SIZE * 1e9 / (offset * I) / rates - 1)
+
+    grid = np.meshgrid(rate_bits, slot_bits, intervals, indexing="ij")
+    num_flows = len(group_rates) * num_flows_per_group
+    address_bits = int(np.ceil(np.log2(max(num_flows, 2)))) + 1  # + null address
+    table = {
+        "rate_bits": grid[0].ravel(),
+        "slot_bits": grid[1].ravel(),
+        "interval": grid[2].ravel(),
+    }
+    for q, values in zip(
+        SWEEP_PERCENTILES, np.percentile(error, SWEEP_PERCENTILES, axis=-1)
+    ):
+        table[f"error_p{q}"] = values.ravel()
+    table["wrapped"] = wrapped.mean(axis=-1).ravel()  # Share of the rates
+    table["memory_bits"] = 2 ** table["slot_bits"] * address_bits + num_flows * (
+        table["slot_bits"] + 3 * table["rate_bits"]
+    )
+    # Packets per interval at the requested rates
+    table["slot_load"] = (
+        num_flows_per_group * group_rates.sum() * table["interval"] / (MTU_SIZE * 1e9)
+    )
+    objectives = np.column_stack(
+        (table["error_p99"], table["memory_bits"], table["slot_load"])
+    )
+    table["pareto"] = pareto_front(objectives)
+    return table
+
+
+def pareto_front(objectives):
+    """Rows of objectives (minimized) not dominated by another row."""
+    below = objectives[:, None, :] <= objectives[None, :, :]
+    strictly = objectives[:, None, :] < objectives[None, :, :]
+    dominates = below.all(axis=-1) & strictly.any(axis=-1)  # [i, j]: i dominates j
+    return ~dominates.any(axis=0)
+
+
+def shortlist(table, max_error=None):
+    """Pareto rows (within max_error at p99), best p99 error first."""
+    rows = np.flatnonzero(table["pareto"])
+    if max_error is not None:
+        rows = rows[table["error_p99"][rows] <= max_error]
+    return rows[np.argsort(table["error_p99"][rows], kind="stable")]
+
+
+def print_rows(table, rows):
+    print("rate_bits slot_bits interval  p50 err  p99 err  max err  memory kb  load")
+    for r in rows:
+        print(
+            f"{table['rate_bits'][r]:9d} {table['slot_bits'][r]:9d} "
+            f"{table['interval'][r]:8.0f} {table['error_p50'][r]:8.2%} "
+            f"{table['error_p99'][r]:8.2%} {table['error_p100'][r]:8.2%} "
+            f"{table['memory_bits'][r] / 8192:10.1f} {table['slot_load'][r]:5.2f}"
+        )
+
+
+def simulate_shortlist(
+    table,
+    rows,
+    flow_groups,
+    num_flows_per_group=NUM_FLOWS_PER_GROUP,
+    max_slots=SWEEP_SIMULATE_SLOTS,
+    seed=0,
+):
+    """
+    Occupancy of the calendar engine for the given rows (interval, 2^slot_bits
+    slots). The engine keeps float rates, so this checks the calendar geometry;
+    the rate quantization itself is covered by the sweep (rows that differ
+    only in rate bits share one run).
+    """
+    results, runs = [], {}
+    for r in rows:
+        interval = int(table["interval"][r])
+        slot_bits = int(table["slot_bits"][r])
+        if (slot_bits, interval) not in runs:
+            stats = OccupancyStats()
+            scheduler = create_scheduler_from_table(
+                build_flow_table(flow_groups, num_flows_per_group),
+                interval,
+                2**slot_bits,
+                warm_start="spread",
+                rng=CounterRNG(seed),
+                occupancy_stats=stats,
+            )
+            scheduler.run_slots(max_slots)
+            runs[slot_bits, interval] = stats.summary()
+        results.append(runs[slot_bits, interval])
+        s = results[-1]
+        print(
+            f"rate_bits {table['rate_bits'][r]}, slot_bits {table['slot_bits'][r]}, "
+            f"interval {interval} ns: mean {s['mean']:.2f}, p999 {s['p999']}, "
+            f"max {s['max']}, max busy burst {s['max_busy_burst']}"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    flow_groups = load_flow_groups(OUTPUT_FLOW_GROUPS_PATH)
+    rates = np.fromiter(flow_groups.values(), dtype=float)
+
+    start = time.perf_counter()
+    table = sweep(rates)
+    elapsed = time.perf_counter() - start
+    rows = shortlist(table)
+    print(
+        f"{len(table['pareto'])} configurations x {len(rates)} group rates "
+        f"in {elapsed:.2f} s, {len(rows)} on the Pareto front"
+    )
+    print_rows(table, rows)
+
+    # Rates move between MIN_RATE and the congestion threshold at run time
+    full_scale = rates.max() * SWEEP_RATE_HEADROOM
+    dynamic = sweep(rates, error_rates=np.geomspace(MIN_RATE, full_scale, 4096))
+    print(f"Over [{MIN_RATE}, {full_scale:.0f}] bps:")
+    print_rows(dynamic, shortlist(dynamic, max_error=0.05))
+
+    simulate_shortlist(table, shortlist(table, max_error=0.05)[:4], flow_groups)
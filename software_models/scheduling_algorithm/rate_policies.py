@@ -0,0 +1,223 @@
+"""
+Pluggable rate-update policies for the calendar engines
+A policy turns the rates of the flows sent in one slot into their next rates:
+    update(rates, init_rates, thresholds, rng, flow_ids, counters) -> new rates
+All arguments are arrays over the sent flows (counters = packets sent so far,
+including this one); rng is a CounterRNG so draws stay per-flow reproducible.
+The synthetic CNP rule is defined once, in synthetic_cnp_rate: SyntheticCnpPolicy
+(the default of every engine) and the calendar kernels both call it, with the
+parameters of the policy's kernel_params().
+"""
+
+import numpy as np
+from scheduler_constants import *
+from counter_rng import counter_draw
+from jit_support import jit
+
+
+@jit
+def synthetic_cnp_rate(
+    rate,
+    threshold,
+    decrease_mean,
+    decrease_std,
+    seed,
+    stream,
+    flow_id,
+    counter,
+    active_increase,
+    cnp_prob,
+    min_rate,
+):
+    """
+    Next rate of one sent flow: active increase, then above threshold a CNP with
+    probability cnp_prob that removes max(0, decrease_mean + decrease_std * z),
+    clamped at min_rate. The draw is the flow's counter-th (packets sent).
+    """
+    new_rate = rate + rate * active_increase
+    if new_rate > threshold:
+        u, z = counter_draw(seed, stream, flow_id, counter)
+        if u < cnp_prob:
+            decrease = decrease_mean + decrease_std * z
+            if decrease > 0:
+                new_rate -= decrease
+    return max(min_rate, new_rate)
+
+
+class RatePolicy:
+    """
+    Base class. Policies expressible by the fused ArrayScheduler kernel set
+    jit_kernel = True and return its parameters from kernel_params().
+    """
+
+    jit_kernel = False
+
+    def update(self, rates, init_rates, thresholds, rng, flow_ids, counters):
+        raise NotImplementedError
+
+    def kernel_params(self):
+        """(active_increase, cnp_prob, cnp_mean, cnp_std, min_rate) of the fused kernel."""
+        raise NotImplementedError
+
+    def update_one(self, rate, init_rate, threshold, rng, flow_id, counter):
+        """update() of a single flow, without the array round trip for jit_kernel policies."""
+        if not self.jit_kernel:
+            return float(
+                self.update(
+                    np.array([rate]),
+                    np.array([init_rate]),
+                    np.array([threshold]),
+                    rng,
+                    np.array([flow_id]),
+                    np.array([counter]),
+                )[0]
+            )
+        active_increase, cnp_prob, cnp_mean, cnp_std, min_rate = self.kernel_params()
+        return synthetic_cnp_rate(
+            rate,
+            threshold,
+            cnp_mean * init_rate,
+            cnp_std * init_rate,
+            rng.seed,
+            rng.stream,
+            flow_id,
+            counter,
+            active_increase,
+            cnp_prob,
+            min_rate,
+        )
+
+
+class SyntheticCnpPolicy(RatePolicy):
+    """
+    The fake DCQCN rule: active increase by ACTIVE_INCREASE_FACTOR, then above the
+    congestion threshold a CNP with probability CNP_OCCURRENCE_PROB that removes a
+    Gaussian share of the initial rate, clamped at MIN_RATE.
+    """
+
+    jit_kernel = True
+
+    def update(self, rates, init_rates, thresholds, rng, flow_ids, counters):
+        active_increase, cnp_prob, cnp_mean, cnp_std, min_rate = self.kernel_params()
+        return np.array(
+            [
+                synthetic_cnp_rate(
+                    rate,
+                    threshold,
+                    cnp_mean * init_rate,
+                    cnp_std * init_rate,
+                    rng.seed,
+                    rng.stream,
+                    fid,
+                    counter,
+                    active_increase,
+                    cnp_prob,
+                    min_rate,
+                )
+                for rate, init_rate, threshold, fid, counter in zip(
+                    np.asarray(rates).tolist(),
+                    np.asarray(init_rates).tolist(),
+                    np.asarray(thresholds).tolist(),
+                    np.asarray(flow_ids).tolist(),
+                    np.asarray(counters).tolist(),
+                )
+            ],
+            dtype=float,
+        )
+
+    def kernel_params(self):
+        return (
+            ACTIVE_INCREASE_FACTOR,
+            CNP_OCCURRENCE_PROB,
+            CNP_MEAN_DECREASE,
+            CNP_STD_DEV,
+            float(MIN_RATE),
+        )
+
+
+class HoldRatePolicy(RatePolicy):
+    """Rates never change on send; used when a RateTrace drives the rates."""
+
+    jit_kernel = True
+
+    def update(self, rates, init_rates, thresholds, rng, flow_ids, counters):
+        return rates
+
+    def kernel_params(self):
+        return 0.0, 0.0, 0.0, 0.0, 0.0
+
+
+class DcqcnPolicy(RatePolicy):
+    """
+    DCQCN reaction point state machine per flow (alpha, Rt, Rc as in ReactionPoint).
+    Congestion is signalled by the synthetic CNP rule; the K-timer of the RP is
+    counted in sent packets (k_packets) since the calendar engines have no per-flow tick.
+    """
+
+    def __init__(
+        self,
+        num_flows,
+        g=DCQCN_G,
+        alpha_init=DCQCN_ALPHA_INIT,
+        f=DCQCN_F,
+        rate_ai=PROBING_INCREASE_BPS,
+        k_packets=DCQCN_K_PACKETS,
+    ):
+        self.g = g
+        self.f = f
+        self.rate_ai = rate_ai
+        self.k_packets = k_packets
+        self.alpha = np.full(num_flows + 1, alpha_init)
+        self.Rt = np.zeros(num_flows + 1)  # Target rate, 0 = not initialised yet
+        self.stage_cnt = np.zeros(num_flows + 1, dtype=np.int64)  # Packets since CNP
+
+    def update(self, rates, init_rates, thresholds, rng, flow_ids, counters):
+        Rt = np.where(self.Rt[flow_ids] > 0, self.Rt[flow_ids], rates)
+        alpha = self.alpha[flow_ids]
+        stage_cnt = self.stage_cnt[flow_ids] + 1
+
+        u, _ = rng.draw_batch(flow_ids, counters)
+        cnp = (rates > thresholds) & (u < CNP_OCCURRENCE_PROB)
+
+        # Rate decrease on CNP
+        alpha_cnp = (1 - self.g) * alpha + self.g
+        Rt = np.where(cnp, rates, Rt)
+        new_rates = np.where(cnp, rates * (1 - alpha_cnp / 2), rates)
+        alpha = np.where(cnp, alpha_cnp, alpha)
+        stage_cnt = np.where(cnp, 0, stage_cnt)
+
+        # Every k_packets: alpha decay and fast recovery / additive increase
+        timer = ~cnp & (stage_cnt % self.k_packets == 0)
+        additive = timer & (stage_cnt // self.k_packets > self.f)
+        alpha = np.where(timer, (1 - self.g) * alpha, alpha)
+        Rt = np.where(additive, Rt + self.rate_ai, Rt)
+        new_rates = np.where(timer, FAST_RECOVERY_FACTOR * (Rt + new_rates), new_rates)
+
+        self.alpha[flow_ids] = alpha
+        self.Rt[flow_ids] = Rt
+        self.stage_cnt[flow_ids] = stage_cnt
+        return np.maximum(MIN_RATE, new_rates)
+
+
+class TraceReplayPolicy(RatePolicy):
+    """
+    Replays recorded per-flow rate sequences: the n-th packet of a flow sets its rate
+    to the n-th recorded value (the last value is held). Flows without a trace keep
+    their rate.
+    """
+
+    def __init__(self, traces, num_flows):
+        self.offsets = np.zeros(num_flows + 2, dtype=np.int64)
+        lengths = np.zeros(num_flows + 1, dtype=np.int64)
+        for fid, trace in traces.items():
+            lengths[fid] = len(trace)
+        self.offsets[1:] = np.cumsum(lengths)
+        self.lengths = lengths
+        self.values = np.zeros(self.offsets[-1])
+        for fid, trace in traces.items():
+            self.values[self.offsets[fid] : self.offsets[fid + 1]] = trace
+
+    def update(self, rates, init_rates, thresholds, rng, flow_ids, counters):
+        lengths = self.lengths[flow_ids]
+        index = self.offsets[flow_ids] + np.minimum(counters, lengths) - 1
+        return np.where(lengths > 0, self.values[np.maximum(index, 0)], rates)
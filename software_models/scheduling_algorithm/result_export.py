@@ -0,0 +1,199 @@
+"""
+Columnar result export
+A result set is a group of named tables (dicts of equal-length column arrays) plus
+run metadata (constants, seed, code version). ResultWriter appends tables in row
+groups while a run is in progress: Parquet files when pyarrow is available, or
+a compressed NPZ-style zip with one .npy member per column and row group.
+load_results() reads either back into NumPy columns.
+"""
+
+import json
+import os
+import subprocess
+import time
+import zipfile
+
+import numpy as np
+import scheduler_constants
+from scheduler_constants import *
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+METADATA_NAME = "metadata.json"
+
+
+def code_version():
+    """git describe of the working tree, "unknown" outside a checkout."""
+    try:
+        result = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return "unknown"
+    return result.stdout.strip() or "unknown"
+
+
+def run_metadata(engine, seed=None, **extra):
+    """Engine name, seed, code version and every scheduler constant."""
+    constants = {
+        name: value
+        for name, value in vars(scheduler_constants).items()
+        if name.isupper() and isinstance(value, (int, float, str, bool, type(None)))
+    }
+    metadata = {
+        "engine": engine,
+        "seed": seed,
+        "version": code_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "constants": constants,
+    }
+    metadata.update(extra)
+    return metadata
+
+
+class ResultWriter:
+    """
+    Streams tables to path: a directory of <table>.parquet files (format
+    "parquet") or a zip of <table>/<column>/<row group>.npy members (format "npz").
+    """
+
+    def __init__(self, path, metadata, format=None):
+        self.path = path
+        self.format = format or ("parquet" if HAVE_PYARROW else "npz")
+        self.row_groups = {}  # Row groups written per table
+        if self.format == "parquet":
+            os.makedirs(path, exist_ok=True)
+            self.parquet_writers = {}
+            with open(os.path.join(path, METADATA_NAME), "w") as f:
+                json.dump(metadata, f, indent=2)
+        else:
+            self.zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+            self.zip.writestr(METADATA_NAME, json.dumps(metadata, indent=2))
+
+    def write(self, table, columns):
+        """Append one row group; all columns must have the same length."""
+        columns = {name: np.asarray(values) for name, values in columns.items()}
+        index = self.row_groups.get(table, 0)
+        self.row_groups[table] = index + 1
+        if self.format == "parquet":
+            batch = pa.table(columns)
+            if table not in self.parquet_writers:
+                self.parquet_writers[table] = pq.ParquetWriter(
+                    os.path.join(self.path, f"{table}.parquet"),
+                    batch.schema,
+                    compression="zstd",
+                )
+            self.parquet_writers[table].write_table(batch)
+        else:
+            for name, values in columns.items():
+                with self.zip.open(f"{table}/{name}/{index:06d}.npy", "w") as f:
+                    np.lib.format.write_array(f, values, allow_pickle=False)
+
+    def close(self):
+        if self.format == "parquet":
+            for writer in self.parquet_writers.values():
+                writer.close()
+        else:
+            self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_results(path):
+    """Returns (tables, metadata); tables = {table: {column: array}}."""
+    tables = {}
+    if os.path.isdir(path):
+        with open(os.path.join(path, METADATA_NAME)) as f:
+            metadata = json.load(f)
+        for file_name in sorted(os.listdir(path)):
+            if file_name.endswith(".parquet"):
+                table = pq.read_table(os.path.join(path, file_name))
+                tables[file_name[: -len(".parquet")]] = {
+                    name: table.column(name).to_numpy() for name in table.column_names
+                }
+        return tables, metadata
+
+    with zipfile.ZipFile(path) as archive:
+        metadata = json.loads(archive.read(METADATA_NAME))
+        parts = {}
+        for member in sorted(archive.namelist()):
+            if member == METADATA_NAME:
+                continue
+            table, column, _ = member.split("/")
+            with archive.open(member) as f:
+                parts.setdefault(table, {}).setdefault(column, []).append(
+                    np.lib.format.read_array(f, allow_pickle=False)
+                )
+    for table, columns in parts.items():
+        tables[table] = {name: np.concatenate(v) for name, v in columns.items()}
+    return tables, metadata
+
+
+def run_with_export(scheduler, writer, chunk_slots=EXPORT_CHUNK_SLOTS):
+    """
+    Run a scheduler with run_slots/results (OptimizedScheduler, ArrayScheduler)
+    to the end, streaming the per-slot occupancy in row groups of chunk_slots.
+    """
+    slot_occupancy = np.zeros(chunk_slots, dtype=np.int32)
+    first_slot = 0
+    while True:
+        n = scheduler.run_slots(chunk_slots, slot_occupancy)
+        if n == 0:
+            break
+        slots = np.arange(first_slot, first_slot + n)
+        writer.write(
+            "slot_occupancy",
+            {
+                "time": slots * scheduler.CALENDAR_INTERVAL,
+                "occupancy": slot_occupancy[:n].copy(),
+            },
+        )
+        first_slot += n
+    for table, columns in scheduler.results().items():
+        writer.write(table, columns)
+
+
+def occupancy_histogram_table(tracked_occupancy):
+    """Non-zero entries of an occupancy histogram as a table."""
+    counts = np.asarray(tracked_occupancy)
+    occupancy = np.flatnonzero(counts)
+    return {"occupancy": occupancy, "slots": counts[occupancy]}
+
+
+def flow_stats_table(output_stats, Rc_memory, init_rates=None):
+    """Per-flow bits sent, final rate and (optional) initial rate."""
+    flow_ids = np.array(sorted(Rc_memory), dtype=np.int64)
+    columns = {
+        "flow_id": flow_ids,
+        "bits_sent": np.array([output_stats.get(fid, 0) for fid in flow_ids.tolist()]),
+        "rate": np.array([Rc_memory[fid] for fid in flow_ids.tolist()], dtype=float),
+    }
+    if init_rates is not None:
+        columns["init_rate"] = np.array(
+            [init_rates[fid] for fid in flow_ids.tolist()], dtype=float
+        )
+    return columns
+
+
+if __name__ == "__main__":
+    # Summary of a result set: python result_export.py <path>
+    import sys
+
+    tables, metadata = load_results(sys.argv[1])
+    print(f"{metadata['engine']} (seed {metadata['seed']}, {metadata['version']})")
+    for table, columns in tables.items():
+        rows = len(next(iter(columns.values())))
+        print(f"{table}: {rows} rows, columns {', '.join(columns)}")
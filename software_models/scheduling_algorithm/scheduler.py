@@ -1,10 +1,20 @@
-import csv
-import random
 from collections import deque, defaultdict
 from dataclasses import dataclass
 import numpy as np  # Import numpy for normal distribution
 import matplotlib.pyplot as plt
 from scheduler_constants import *
+from counter_rng import CounterRNG
+from flow_table import build_flow_table, owned_flows
+from rate_policies import SyntheticCnpPolicy
+import model_io
+from model_io import write_flow_groups
+from plot_decimation import decimate, finish, plot_series
+from result_export import (
+    ResultWriter,
+    flow_stats_table,
+    occupancy_histogram_table,
+    run_metadata,
+)
 
 
 @dataclass
@@ -20,29 +30,17 @@ def generate_flow_groups_csv(num_groups, mean_rate, var_rate, output_file):
     rates = np.clip(rates, a_min=MIN_RATE, a_max=None)  # Ensure rates are at least 1
 
     # Write to CSV file
-    with open(output_file, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["group_id", "rate"])
-        for group_id, rate in enumerate(rates, start=1):
-            writer.writerow([group_id, round(rate, 2)])
-
+    write_flow_groups(output_file, np.arange(1, num_groups + 1), rates)
     print(f"Flow groups saved to {output_file}")
 
 
 def load_flow_groups(file_path):
     """
-    Load flow group information from a CSV file.
-    Returns a dictionary {group_id: rate}.
+    Load flow group information from a CSV file (model_io, validated and cached).
+    Returns a dictionary {group_id: rate}. Rates below MIN_RATE are kept as
+    written; the rate update clamps them to MIN_RATE.
     """
-    flow_groups = {}
-    with open(file_path, "r") as f:
-        reader = csv.reader(f)
-        next(reader)  # Skip header
-        for row in reader:
-            group_id = int(row[0])
-            rate = float(row[1])
-            flow_groups[group_id] = rate
-    return flow_groups
+    return model_io.load_flow_groups(file_path)
 
 
 def generate_flows(flow_groups, num_flows_per_group):
@@ -50,26 +48,19 @@ def generate_flows(flow_groups, num_flows_per_group):
     Generate flows based on the group information.
     Flows are interleaved in a round-robin manner.
     Returns a deque of Flow objects and Rc_memory.
+    Built from the NumPy flow table (build_flow_table), as in scheduler_optimized.
     """
-    input_flow_queue = deque()
-    Rc_memory = {}
-
-    # Create flows
-    flow_list = []
-    flow_id = 1  # Unique flow ID
-
-    for group_id, rate in flow_groups.items():
-        for i in range(num_flows_per_group):
-            flow = Flow(flow_id, rate, group_id)
-            flow_list.append(flow)
-            Rc_memory[flow_id] = rate  # Store initial rate
-            flow_id += 1
-
-    # Interleave flows in round-robin order
-    for i in range(num_flows_per_group):
-        for flow in flow_list[i::num_flows_per_group]:  # Select one per group in order
-            input_flow_queue.append(flow)
-
+    table = build_flow_table(flow_groups, num_flows_per_group)
+    flows = owned_flows(table)  # By flow id
+    Rc_memory = dict(zip(flows["flow_id"].tolist(), flows["rate"].tolist()))
+    input_flow_queue = deque(
+        map(
+            Flow,
+            table["flow_id"].tolist(),
+            table["rate"].tolist(),
+            table["group_id"].tolist(),
+        )
+    )
     return input_flow_queue, Rc_memory
 
 
@@ -87,9 +78,37 @@ def compute_cnp_rate_thresholds(input_flow_settings):
     return cnp_rate_thresholds
 
 
+GOLDEN_RATIO_FRACTION = 0.6180339887498949
+
+
+def steady_state_phase(k, offset, mode, rng=None, fid=None):
+    """
+    Slot (relative to now) of the next packet of a flow that sends every `offset` slots.
+    In steady state this is uniform over [0, offset]:
+      - "spread": deterministic low-discrepancy phase of the k-th flow (golden ratio)
+      - "stationary": phase sampled from the stationary (uniform) distribution, with
+        the draw of flow fid at counter 0 of the CounterRNG rng (CNP draws start at
+        counter 1), so it is reproducible and independent of sharding
+    """
+    if mode == "spread":
+        return int(((k * GOLDEN_RATIO_FRACTION) % 1.0) * (offset + 1))
+    if mode == "stationary":
+        u, _ = rng.draw(fid, 0)
+        return min(int(u * (offset + 1)), offset)
+    raise ValueError(f"Unknown warm start mode: {mode}")
+
+
 # Scheduler Simulation
 class Scheduler:
-    def __init__(self, input_flow_settings, Rc_memory, tracked_flow_id=100):
+    def __init__(
+        self,
+        input_flow_settings,
+        Rc_memory,
+        tracked_flow_id=100,
+        warm_start=None,
+        rng=None,
+        policy=None,
+    ):
         self.input_flow_queue = input_flow_settings  # Used for initial scheduling
         self.Rc_memory = Rc_memory  # Current rates per flow
         self.input_flow_settings = (
@@ -97,6 +116,10 @@ class Scheduler:
         )  # Used for Rc calculation base on initial rate
         self.cnp_rate_thresholds = compute_cnp_rate_thresholds(input_flow_settings)
         self.calendar_counter = 0
+        # CounterRNG: per-flow streams keyed by packet count
+        self.rng = CounterRNG(RNG_SEED) if rng is None else rng
+        # RatePolicy (rate_policies); default = the synthetic CNP rule
+        self.policy = SyntheticCnpPolicy() if policy is None else policy
 
         self.calendar_queue = deque([] for _ in range(CALENDAR_SLOTS))
         self.output_stats = defaultdict(int)  # Track bytes sent per flow
@@ -113,6 +136,23 @@ class Scheduler:
 
         self.progress_bar = deque([i * (END_OF_TIME // 100) for i in range(1, 101)])
 
+        if warm_start:
+            self.warm_start(warm_start)
+
+    def warm_start(self, mode):
+        """
+        Place every flow of the input queue directly into its steady-state slot,
+        so the run starts at full load instead of admitting one flow per slot.
+        """
+        k = 0
+        while self.input_flow_queue:
+            flow = self.input_flow_queue.popleft()
+            ipg = compute_ipg(flow.rate)
+            offset = min(ipg // CALENDAR_INTERVAL_LIST, CALENDAR_SLOTS - 1)
+            phase = steady_state_phase(k, offset, mode, self.rng, flow.id)
+            self.calendar_queue[phase].append(flow)
+            k += 1
+
     def run_simulation(self):
         for t in range(0, END_OF_TIME, SIMULATION_STEP):
 
@@ -208,71 +248,52 @@ class Scheduler:
         """
 
     def update_rate(self, flow_id):
-        # Active increase: Always increase rate by RATE_VARIATION_FACTOR
-        rate_change = self.Rc_memory[flow_id] * ACTIVE_INCREASE_FACTOR
-        self.Rc_memory[flow_id] += rate_change
-
-        # Get the flow's initial rate
-        initial_rate = self.input_flow_settings[flow_id]
-
-        # Define congestion threshold (150% of initial rate)
-        congestion_threshold = self.cnp_rate_thresholds[flow_id]
-
-        # Check if current rate exceeds congestion threshold
-        if self.Rc_memory[flow_id] > congestion_threshold:
-            if random.random() < CNP_OCCURRENCE_PROB:
-                decrease_factor = max(
-                    0,
-                    random.gauss(
-                        CNP_MEAN_DECREASE * initial_rate, CNP_STD_DEV * initial_rate
-                    ),
-                )
-                # Apply decrease
-                self.Rc_memory[flow_id] -= decrease_factor
-
-        # Ensure minimum rate of 300kbps
-        self.Rc_memory[flow_id] = max(MIN_RATE, self.Rc_memory[flow_id])
-
-    def plot_results(self):
-        plt.figure(figsize=(10, 5))
-
-        # Remove None values from real rate for plotting
-        notnull_real_rates = [r for r in self.tracked_real_rates if r is not None]
-
-        # max_real_rate = max(notnull_real_rates)
-        valid_real_rates = [
-            # r / max_real_rate for r in self.tracked_real_rates if r is not None
-            r
-            for r in self.tracked_real_rates
-            if r is not None
-        ]
-        valid_time = self.tracked_time[
-            len(self.tracked_real_rates) - len(valid_real_rates) :
-        ]
-
-        # max_Rc_memory = max(self.tracked_Rc_memory) if self.tracked_Rc_memory else 0
-        # valid_Rc_memory = [r / max_Rc_memory for r in self.tracked_Rc_memory]
-        valid_Rc_memory = [r for r in self.tracked_Rc_memory]
-
-        plt.plot(
-            valid_time,
-            valid_real_rates,
-            label="Real Rate (4-timestamp avg)",
-            marker="o",
+        self.Rc_memory[flow_id] = self.policy.update_one(
+            self.Rc_memory[flow_id],
+            self.input_flow_settings[flow_id],
+            self.cnp_rate_thresholds[flow_id],
+            self.rng,
+            flow_id,
+            self.output_stats[flow_id] // MTU_SIZE,
         )
-        plt.plot(
-            self.tracked_time,
-            valid_Rc_memory,
+
+    def plot_results(self, plot_dir=PLOT_DIR):
+        """Tracked flow rates, decimated to PLOT_BUCKETS pixel columns."""
+        time_history = np.array(self.tracked_time, dtype=np.int64)
+        # None (fewer than 4 send times yet) becomes NaN and is skipped
+        real_rates = np.array(self.tracked_real_rates, dtype=float)
+        fig, ax = plt.subplots(figsize=(10, 5))
+        x, y = decimate(time_history, real_rates, PLOT_BUCKETS)
+        marker = "o" if len(real_rates) <= 2 * PLOT_BUCKETS else None
+        ax.plot(x, y, label="Real Rate (4-timestamp avg)", marker=marker)
+        plot_series(
+            ax,
+            time_history,
+            np.array(self.tracked_Rc_memory, dtype=float),
+            PLOT_BUCKETS,
             label="Rc Memory Rate",
             linestyle="dashed",
         )
 
-        plt.xlabel("Time (ns)")
-        plt.ylabel("Rate (bps)")
-        plt.title(f"Rate Evolution for Flow {self.tracked_flow_id}")
-        plt.legend()
-        plt.grid()
-        plt.show()
+        ax.set_xlabel("Time (ns)")
+        ax.set_ylabel("Rate (bps)")
+        ax.set_title(f"Rate Evolution for Flow {self.tracked_flow_id}")
+        ax.legend()
+        ax.grid()
+        finish(fig, plot_dir, f"rate_flow_{self.tracked_flow_id}")
+
+    def results(self):
+        """Per-flow stats, occupancy histogram and tracked flow series as tables."""
+        real_rates = [np.nan if r is None else r for r in self.tracked_real_rates]
+        return {
+            "flow_stats": flow_stats_table(self.output_stats, self.Rc_memory),
+            "occupancy_histogram": occupancy_histogram_table(self.tracked_occupancy),
+            "tracked_flow": {
+                "time": np.array(self.tracked_time, dtype=np.int64),
+                "Rc": np.array(self.tracked_Rc_memory, dtype=float),
+                "real_rate": np.array(real_rates, dtype=float),
+            },
+        }
 
 
 if GENERATE_NEW_PACKETS:
@@ -289,8 +310,19 @@ flow_groups = load_flow_groups(OUTPUT_FLOW_GROUPS_PATH)
 flow_settings, Rc_memory = generate_flows(flow_groups, NUM_FLOWS_PER_GROUP)
 
 
-scheduler = Scheduler(flow_settings, Rc_memory, TRACKED_FLOW)
+scheduler = Scheduler(
+    flow_settings,
+    Rc_memory,
+    TRACKED_FLOW,
+    WARM_START_MODE,
+    CounterRNG(RNG_SEED),
+)
 scheduler.run_simulation()
+if RESULTS_PATH is not None:
+    metadata = run_metadata("Scheduler", RNG_SEED, tracked_flow=TRACKED_FLOW)
+    with ResultWriter(RESULTS_PATH, metadata) as writer:
+        for table, columns in scheduler.results().items():
+            writer.write(table, columns)
 scheduler.plot_results()
 tracked_output_stats = scheduler.output_stats.get(TRACKED_FLOW, 0)
 # sorted_output_stats = dict(sorted(scheduler.output_stats.items()))
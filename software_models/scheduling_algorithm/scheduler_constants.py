@@ -4,6 +4,10 @@ CALENDAR_WINDOW = 67_108_864  # MTU_SIZE / MIN_RATE * 1e9 (ns)
 CALENDAR_INTERVAL_LIST = 500
 CALENDAR_SLOTS = CALENDAR_WINDOW // CALENDAR_INTERVAL_LIST  # 60k slots
 MTU_SIZE = 12_000  # Fixed packet size in bits
+# Warm start: place every flow straight into its steady-state slot instead of
+# admitting one flow per slot from the input queue
+# None = cold start, "spread" = golden-ratio phase spread, "stationary" = random phase
+WARM_START_MODE = None
 
 # Rate Control Constants
 # For deterministic simulation modify: CNP_OCCURRENCE_PROB = 1.0; CNP_STD_DEV = 0.0
@@ -15,75 +19,92 @@ CNP_MEAN_DECREASE = 0.4  # Mean decrease = 40% of initial rate
 CNP_STD_DEV = 0.1  # Standard deviation = 10% of initial rate
 CONGESTION_THRESHOLD = 1.5  # 150% of initial rate
 MIN_RATE = 220_000  # Minimum rate in bps
+# DcqcnPolicy (rate_policies.py): RP state machine driven by the synthetic CNPs
+DCQCN_G = 0.3  # Alpha weight factor
+DCQCN_ALPHA_INIT = 0.5  # Initial reduction factor
+DCQCN_F = 5  # Fast recovery iterations
+DCQCN_K_PACKETS = 10  # Sent packets per alpha/rate-increase timer event
+# Seed of the per-flow counter-based CNP streams (counter_rng), the default of every engine
+RNG_SEED = 0
 
-# Flow Generation Constants
-# target number of flows: 256k
-# target total speed: 100Gbps
-# Therefore, target max rate per flow: 100Gbps / 256k = 390625bps
-GENERATE_NEW_PACKETS = False
-NUM_GROUPS = 256
-NUM_FLOWS_PER_GROUP = 1024
-GROUP_RATE_MEAN = 320_000
-GROUP_RATE_VAR = 500_000_000  # mind the sqrt
-TRACKED_FLOW = 100
-OUTPUT_FLOW_GROUPS_PATH = "software_models/scheduling_algorithm/flow_groups.csv"
+# Sharded engine (sharded_scheduler.py): flows are partitioned by group
+NUM_SHARDS = 64  # Worker processes
+SHARD_EPOCH_SLOTS = 65_536  # Calendar slots between shard synchronizations
+SHARD_TIMEOUT = 600  # Seconds the parent waits for all shards at a synchronization
 
-import matplotlib.pyplot as plt
-import numpy as np
+# Result export (result_export.py): Parquet directory with pyarrow, zip of .npy otherwise
+RESULTS_PATH = None  # None = no export
+EXPORT_CHUNK_SLOTS = 65_536  # Calendar slots per exported row group
 
-# Data from your simulation
-occupancy_data = {
-    0: 119776,
-    1: 115827,
-    2: 155246,
-    3: 172302,
-    4: 163886,
-    5: 124386,
-    6: 77728,
-    7: 40268,
-    8: 19252,
-    9: 7757,
-    10: 2682,
-    11: 685,
-    12: 158,
-    13: 40,
-    14: 5,
-    15: 1,
-    17: 1,
-}
+# Result cache (result_cache.py) of whole runs, keyed by constants, inputs, source, seed
+RESULT_CACHE_DIR = None  # e.g. "software_models/scheduling_algorithm/result_cache"
+RESULT_CACHE_MAX_BYTES = 2 * 1024**3  # Least recently used results are evicted above
 
-# Prepare data for plotting
-packets_per_slot = list(occupancy_data.keys())
-slot_counts = list(occupancy_data.values())
+# Plotting (plot_decimation.py): long histories are min/max decimated per pixel column
+PLOT_DIR = None  # Save figures here as .png (headless) instead of showing them
+PLOT_BUCKETS = 2000  # Pixel columns of a figure
 
-# Create the bar chart
-plt.figure(figsize=(8, 5))
-bars = plt.bar(packets_per_slot, slot_counts, color="skyblue", edgecolor="black")
+# Streaming occupancy statistics (occupancy_stats.py)
+OCCUPANCY_WINDOW_SLOTS = 1_000_000  # Calendar slots per windowed histogram
+OCCUPANCY_MAX_BIN = 255  # Histogram bins 0..255, higher occupancies share the last
+OCCUPANCY_MAX_WINDOWS = 1024  # Most recent windows kept
 
-# --- Applying the descriptive titles ---
-plt.xlabel("Slot Occupancy", fontsize=16)
-plt.ylabel("Frequency (Number of Slots)", fontsize=16)
-plt.title(
-    "Distribution of Calendar Slot Occupancy (500ns Interval)",
-    fontsize=16,
-    fontweight="bold",
-)
+# Instrumentation (instrumentation.py), opt-in per engine
+INSTRUMENT = False  # Attach an Instrumentation in the __main__ runs
+PROGRESS_INTERVAL = 10.0  # Seconds between progress/ETA lines
+PROGRESS_CHECK_SLOTS = 4096  # Slots between clock reads of the progress reporter
+INSTRUMENT_CHUNK_SLOTS = 262_144  # Slots per timed chunk of the fused kernel loop
 
-# Make the y-axis more readable (e.g., 150k instead of 150000)
-plt.ticklabel_format(style="sci", axis="y", scilimits=(0, 0))
-plt.gca().yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: format(int(x), ",")))
+# Hardware co-verification (hw_coverify.py) against the Scheduler_pipeline testbench
+HW_RTL_PATH = "hardware_models/Modelsim/Wrapper"  # rtl/Constants_pkg, mem/Bram_init_pkg
+# Dump to compare; the default is recorded from PipelineModel, not from the RTL
+COVERIFY_DUMP_PATH = (
+    "software_models/scheduling_algorithm/pipeline_model_fixture.txt.gz"
+)
+COVERIFY_CYCLE_TOLERANCE = 2  # Clock cycles an event may be off
+COVERIFY_CHUNK_EVENTS = 262_144  # Events per compared chunk
 
+# Quantization sweep (quantization_sweep.py) of the rate -> calendar slot conversion
+SWEEP_RATE_BITS = tuple(range(8, 21))  # Width of the rate fed to rate_2_slot_conv
+SWEEP_SLOT_BITS = tuple(range(8, 19))  # CALENDAR_SLOTS_WIDTH
+SWEEP_INTERVALS = (100, 200, 250, 500, 1000, 2000)  # CALENDAR_INTERVAL (ns)
+SWEEP_RATE_HEADROOM = CONGESTION_THRESHOLD  # Rate full scale / max group rate
+SWEEP_SIMULATE_SLOTS = 1_000_000  # Calendar slots per shortlisted full simulation
 
-# Set x-axis ticks to be integers, showing all values
-plt.xticks(np.arange(0, max(packets_per_slot) + 1, 1))
+# Calendar configuration optimizer (calendar_optimizer.py): successive halving
+OPT_INTERVALS = tuple(range(100, 2001, 100))  # Candidate CALENDAR_INTERVALs (ns)
+OPT_SLOT_SCALES = (0.5, 1.0)  # Candidate slots / (CALENDAR_WINDOW // interval)
+OPT_ETA = 3  # 1/eta of the candidates go on per rung, for eta x the time
+OPT_RUNGS = 4  # The last rung simulates END_OF_TIME
+OPT_CONFIDENCE_Z = 2.0  # Standard errors of the empty ratio for an early stop
+OPT_MAX_MARGIN = 1  # Max occupancy the leader may still gain in later rungs
+OPT_WINDOW_SLOTS = 4096  # Slots per window of the empty ratio standard error
+OPT_MAX_LIVE = 16  # Schedulers kept in memory to continue in the next rung
+OPT_CACHE_DIR = "software_models/scheduling_algorithm/optimizer_cache"
 
-# Add a grid for better readability
-plt.grid(axis="y", linestyle="--", alpha=0.7)
+# Convergence monitor (convergence.py): batch means, stop once the intervals are tight
+CONVERGENCE_BATCH_SLOTS = 16_384  # Calendar slots per base batch
+CONVERGENCE_CONFIDENCE = 0.95
+CONVERGENCE_REL_TOL = 0.02  # Target half width relative to the mean
+CONVERGENCE_FRACTION_TOL = 0.001  # Half width always small enough for slot fractions
+CONVERGENCE_MIN_BATCHES = 20  # Batches after the warm-up cut
+CONVERGENCE_OCCUPANCY_BINS = 32  # Bins of the occupancy distribution, the last open
 
-# Add data labels on top of bars (optional, can be crowded)
-# for bar in bars:
-#     yval = bar.get_height()
-#     plt.text(bar.get_x() + bar.get_width()/2.0, yval, int(yval), va='bottom', ha='center')
+# Flow churn (flow_churn.py)
+CHURN_MAX_FLOWS = 262_144  # Flow id slots shared by arriving flows
+CHURN_ARRIVAL_RATE = 250_000  # Flow arrivals per second
+CHURN_MEAN_PACKETS = 16  # Mean flow size in packets
+CHURN_PARETO_SHAPE = 1.5  # Tail index of the flow size distribution
+CHURN_CHUNK_SLOTS = 65_536  # Slots per kernel call (arrivals drawn per chunk)
 
-plt.tight_layout()
-plt.show()
+# Flow Generation Constants
+# target number of flows: 256k
+# target total speed: 100Gbps
+# Therefore, target max rate per flow: 100Gbps / 256k = 390625bps
+GENERATE_NEW_PACKETS = False
+NUM_GROUPS = 256
+NUM_FLOWS_PER_GROUP = 1024
+GROUP_RATE_MEAN = 320_000
+GROUP_RATE_VAR = 500_000_000  # mind the sqrt
+TRACKED_FLOW = 100
+OUTPUT_FLOW_GROUPS_PATH = "software_models/scheduling_algorithm/flow_groups.csv"
@@ -1,9 +1,24 @@
-import csv
-import random
+import os
 from collections import deque, defaultdict
 import numpy as np
 import matplotlib.pyplot as plt
+import scheduler_constants
 from scheduler_constants import *
+from counter_rng import CounterRNG
+import rate_policies
+import model_io
+from model_io import write_flow_groups
+from flow_table import PLACEHOLDER, build_flow_table, flow_table_to_dicts
+from instrumentation import Instrumentation
+from occupancy_stats import OccupancyStats
+from result_export import (
+    ResultWriter,
+    flow_stats_table,
+    occupancy_histogram_table,
+    run_metadata,
+    run_with_export,
+)
+from result_cache import ResultCache, config_key, flatten_tables, unflatten_tables
 
 """
 # Constants
@@ -34,25 +49,17 @@ def generate_flow_groups_csv(num_groups, mean_rate, var_rate, output_file):
     # Generate group rates from a normal distribution and clip to MIN_RATE
     rates = np.random.normal(loc=mean_rate, scale=np.sqrt(var_rate), size=num_groups)
     rates = np.clip(rates, a_min=MIN_RATE, a_max=None)
-    with open(output_file, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["group_id", "rate"])
-        for group_id, rate in enumerate(rates, start=1):
-            writer.writerow([group_id, round(rate, 2)])
+    write_flow_groups(output_file, np.arange(1, num_groups + 1), rates)
     print(f"Flow groups saved to {output_file}")
 
 
 def load_flow_groups(file_path):
-    """Load flow group information from CSV. Returns a dict {group_id: rate}."""
-    flow_groups = {}
-    with open(file_path, "r") as f:
-        reader = csv.reader(f)
-        next(reader)  # Skip header
-        for row in reader:
-            group_id = int(row[0])
-            rate = float(row[1])
-            flow_groups[group_id] = rate
-    return flow_groups
+    """
+    Load flow group information from a CSV file (model_io, validated and cached).
+    Returns a dictionary {group_id: rate}. Rates below MIN_RATE are kept as
+    written; the rate update clamps them to MIN_RATE.
+    """
+    return model_io.load_flow_groups(file_path)
 
 
 def generate_flows(flow_groups, num_flows_per_group):
@@ -62,27 +69,11 @@ def generate_flows(flow_groups, num_flows_per_group):
     Also returns two dictionaries:
       - Rc_memory: current rate per flow (initially the group rate)
       - init_rates: initial rate per flow (for use in rate update)
+    Built from the NumPy flow table (build_flow_table), which engines also take directly.
     """
-    input_flow_queue = deque()
-    Rc_memory = {}
-    init_rates = {}
-    flow_list = []
-    flow_id = 1
-
-    # For each group, create flows with the group's rate
-    for group_id, rate in flow_groups.items():
-        for _ in range(num_flows_per_group):
-            flow_list.append(flow_id)
-            Rc_memory[flow_id] = rate
-            init_rates[flow_id] = rate
-            flow_id += 1
-
-    # Round-robin interleaving: take one flow from each group in order
-    for i in range(num_flows_per_group):
-        for fid in flow_list[i::num_flows_per_group]:
-            input_flow_queue.append(fid)
-
-    return input_flow_queue, Rc_memory, init_rates
+    table = build_flow_table(flow_groups, num_flows_per_group)
+    input_flow_queue, Rc_memory, init_rates = flow_table_to_dicts(table)
+    return deque(input_flow_queue), Rc_memory, init_rates
 
 
 def compute_cnp_rate_thresholds(init_rates):
@@ -90,12 +81,69 @@ def compute_cnp_rate_thresholds(init_rates):
     return {fid: CONGESTION_THRESHOLD * rate for fid, rate in init_rates.items()}
 
 
+GOLDEN_RATIO_FRACTION = 0.6180339887498949
+
+
+def steady_state_phase(k, offset, mode, rng=None, fid=None):
+    """
+    Slot (relative to now) of the next packet of a flow that sends every `offset` slots.
+    In steady state this is uniform over [0, offset]:
+      - "spread": deterministic low-discrepancy phase of the k-th flow (golden ratio)
+      - "stationary": phase sampled from the stationary (uniform) distribution, with
+        the draw of flow fid at counter 0 of the CounterRNG rng (CNP draws start at
+        counter 1), so it is reproducible and independent of sharding
+    """
+    if mode == "spread":
+        return int(((k * GOLDEN_RATIO_FRACTION) % 1.0) * (offset + 1))
+    if mode == "stationary":
+        u, _ = rng.draw(fid, 0)
+        return min(int(u * (offset + 1)), offset)
+    raise ValueError(f"Unknown warm start mode: {mode}")
+
+
+def warm_start_calendar(
+    calendar_queue,
+    input_flow_queue,
+    Rc_memory,
+    calendar_interval,
+    mode,
+    rng,
+    current_slot=0,
+):
+    """
+    Drain the input queue by placing every flow directly into its steady-state slot,
+    so the calendar is fully loaded from the first slot (no fill-up transient).
+    rng (CounterRNG) draws the "stationary" phases.
+    """
+    num_slots = len(calendar_queue)
+    k = 0
+    while input_flow_queue:
+        fid = input_flow_queue.popleft()
+        if fid is not None:  # None marks a flow owned by another shard
+            ipg = max(1, int(round(MTU_SIZE * 1e9 / Rc_memory[fid])))
+            offset = min(ipg // calendar_interval, num_slots - 1)
+            phase = steady_state_phase(k, offset, mode, rng, fid)
+            calendar_queue[(current_slot + phase) % num_slots].append(fid)
+        k += 1
+
+
 # ---------------------------------------------------
 # Optimized Scheduler (for calendar occupancy stats only)
 # ---------------------------------------------------
 class OptimizedScheduler:
     def __init__(
-        self, input_flow_queue, Rc_memory, init_rates, CALENDAR_INTERVAL, CALENDAR_SLOTS
+        self,
+        input_flow_queue,
+        Rc_memory,
+        init_rates,
+        CALENDAR_INTERVAL,
+        CALENDAR_SLOTS,
+        warm_start=None,
+        rng=None,
+        policy=None,
+        rate_trace=None,
+        occupancy_stats=None,
+        instrumentation=None,
     ):
         self.input_flow_queue = input_flow_queue  # Deque of flow IDs (first scheduling)
         self.Rc_memory = Rc_memory  # Current rate per flow (dict)
@@ -107,25 +155,116 @@ class OptimizedScheduler:
         # For calendar occupancy stats: index = number of flows in slot, value = count of slots
         self.tracked_occupancy = [0] * 10000
         self.max_calendar_occupancy = 0
+        # Optional OccupancyStats (occupancy_stats): windowed histograms, percentiles
+        self.occupancy_stats = occupancy_stats
+        # Optional Instrumentation (instrumentation): phase timers and counters
+        self.instrumentation = instrumentation
         self.CALENDAR_INTERVAL = CALENDAR_INTERVAL
         self.CALENDAR_SLOTS = CALENDAR_SLOTS
+        self.t = 0  # Simulation time (ns)
+        self.current_slot = 0  # Calendar pointer
+        # CounterRNG: per-flow streams keyed by packet count
+        self.rng = CounterRNG(RNG_SEED) if rng is None else rng
+        # RatePolicy (rate_policies); default = the synthetic CNP rule
+        self.policy = rate_policies.SyntheticCnpPolicy() if policy is None else policy
+        # Optional RateTrace (rate_trace): recorded rate changes applied at their slot
+        self.trace_cursor = None if rate_trace is None else rate_trace.cursor()
+        if warm_start:
+            # Start at full load: every flow already sits in its steady-state slot
+            warm_start_calendar(
+                self.calendar_queue,
+                self.input_flow_queue,
+                self.Rc_memory,
+                CALENDAR_INTERVAL,
+                warm_start,
+                self.rng,
+            )
+
+    @classmethod
+    def from_flow_table(cls, flow_table, CALENDAR_INTERVAL, CALENDAR_SLOTS, **kwargs):
+        """Engine for a flow table (flow_table.build_flow_table), using its thresholds."""
+        input_flow_queue, Rc_memory, init_rates = flow_table_to_dicts(flow_table)
+        scheduler = cls(
+            deque(input_flow_queue),
+            Rc_memory,
+            init_rates,
+            CALENDAR_INTERVAL,
+            CALENDAR_SLOTS,
+            **kwargs,
+        )
+        flows = flow_table[flow_table["flow_id"] != PLACEHOLDER]
+        scheduler.cnp_rate_thresholds = dict(
+            zip(flows["flow_id"].tolist(), flows["threshold"].tolist())
+        )
+        return scheduler
 
     def run_simulation(self):
+        self.run_slots(None)
+
+    def run_slots(self, max_slots, slot_occupancy=None):
+        """
+        Advance at most max_slots calendar slots (None = until END_OF_TIME).
+        If slot_occupancy is given, entry i receives the number of flows in the
+        i-th processed slot. Returns the number of processed slots.
+        With an Instrumentation the phases of every slot are timed and counted;
+        without one its hooks are skipped.
+        """
+        inst = self.instrumentation
+        if inst is not None:
+            inst.start_run()
         num_slots = self.CALENDAR_SLOTS
-        current_slot = 0
-        t = 0
+        current_slot = self.current_slot
+        t = self.t
+        end_time = END_OF_TIME
+        if max_slots is not None:
+            end_time = min(END_OF_TIME, t + max_slots * self.CALENDAR_INTERVAL)
+        processed = 0
+        ipg_overflows = 0  # Next packets further away than the calendar window
+        trace_time = None
+        if self.trace_cursor is not None:
+            trace_time = self.trace_cursor.next_time()
+        # Policies of the fused kernel run its scalar rule per flow, others per slot
+        rule = None
+        if self.policy.jit_kernel:
+            # Looked up at call time so jit_support.interpreted() can swap it
+            rule = rate_policies.synthetic_cnp_rate
+            active_increase, cnp_prob, cnp_mean, cnp_std, min_rate = (
+                self.policy.kernel_params()
+            )
+            seed, stream = self.rng.seed, self.rng.stream
 
         # Advance time slot by slot (each step = CALENDAR_INTERVAL ns)
-        while t < END_OF_TIME:
+        while t < end_time:
+            # Phase 0: apply recorded rate changes that are due by this slot
+            if inst is not None:
+                mark = inst.begin("trace")
+            if trace_time is not None and t >= trace_time:
+                flow_ids, rates = self.trace_cursor.advance(t)
+                for fid, rate in zip(flow_ids.tolist(), rates.tolist()):
+                    self.Rc_memory[fid] = rate
+                trace_time = self.trace_cursor.next_time()
+
             # Phase 1: If any flows have not yet been scheduled, schedule one packet from the input queue.
+            if inst is not None:
+                inst.end("trace", mark)
+                mark = inst.begin("admission")
             if self.input_flow_queue:
                 fid = self.input_flow_queue.popleft()
-                ipg = max(1, int(round(MTU_SIZE * 1e9 / self.Rc_memory[fid])))
-                offset = ipg // self.CALENDAR_INTERVAL
-                scheduled_slot = (current_slot + offset) % num_slots
-                self.calendar_queue[scheduled_slot].append(fid)
+                # None marks a flow owned by another shard (keeps admission timing)
+                if fid is not None:
+                    ipg = max(1, int(round(MTU_SIZE * 1e9 / self.Rc_memory[fid])))
+                    offset = ipg // self.CALENDAR_INTERVAL
+                    if offset >= num_slots:
+                        ipg_overflows += 1
+                    scheduled_slot = (current_slot + offset) % num_slots
+                    self.calendar_queue[scheduled_slot].append(fid)
+                    if inst is not None:
+                        inst.admissions += 1
 
             # Phase 2: Process flows in the current calendar slot.
+            if inst is not None:
+                inst.end("admission", mark)
+                mark = inst.begin("slot_pop")
             flows = self.calendar_queue[current_slot]
             n_flows = len(flows)
             # Ensure our occupancy list is long enough:
@@ -136,53 +275,181 @@ class OptimizedScheduler:
             self.tracked_occupancy[n_flows] += 1
             if n_flows > self.max_calendar_occupancy:
                 self.max_calendar_occupancy = n_flows
+            if slot_occupancy is not None:
+                slot_occupancy[processed] = n_flows
+            if self.occupancy_stats is not None:
+                self.occupancy_stats.add(n_flows)
+            processed += 1
+            if inst is not None:
+                inst.count_slot(n_flows)
+                inst.end("slot_pop", mark)
+
+            if flows:
+                # Detach the slot: next packets a whole window away wrap onto the
+                # fresh list, as in calendar_kernels
+                self.calendar_queue[current_slot] = []
+
+                # Send every flow and update its rate (active increase, then possible
+                # congestion decrease)
+                if inst is not None:
+                    mark = inst.begin("rate_update")
+                if rule is None:
+                    for fid in flows:
+                        self.output_stats[fid] += MTU_SIZE
+                    self.update_rates_with_policy(flows)
+                else:
+                    for fid in flows:
+                        self.output_stats[fid] += MTU_SIZE
+                        initial_rate = self.init_rates[fid]
+                        self.Rc_memory[fid] = rule(
+                            self.Rc_memory[fid],
+                            self.cnp_rate_thresholds[fid],
+                            cnp_mean * initial_rate,
+                            cnp_std * initial_rate,
+                            seed,
+                            stream,
+                            fid,
+                            self.output_stats[fid] // MTU_SIZE,
+                            active_increase,
+                            cnp_prob,
+                            min_rate,
+                        )
+
+                # Schedule the next packet of every flow.
+                if inst is not None:
+                    inst.end("rate_update", mark)
+                    mark = inst.begin("reinsertion")
+                for fid in flows:
+                    ipg = max(1, int(round(MTU_SIZE * 1e9 / self.Rc_memory[fid])))
+                    offset = ipg // self.CALENDAR_INTERVAL
+                    if offset >= num_slots:
+                        ipg_overflows += 1
+                    scheduled_slot = (current_slot + offset) % num_slots
+                    self.calendar_queue[scheduled_slot].append(fid)
+                if inst is not None:
+                    inst.end("reinsertion", mark)
 
-            # Process each flow scheduled in the current slot.
-            for fid in flows:
-                # Update total bytes sent
-                self.output_stats[fid] += MTU_SIZE
-
-                # Update the flow's rate (active increase, then possible congestion decrease)
-                rate = self.Rc_memory[fid]
-                new_rate = rate + rate * ACTIVE_INCREASE_FACTOR
-                initial_rate = self.init_rates[fid]
-                threshold = self.cnp_rate_thresholds[fid]
-                if new_rate > threshold and random.random() < CNP_OCCURRENCE_PROB:
-                    # Use random.gauss (faster than np.random.normal for a single value)
-                    decrease = random.gauss(
-                        CNP_MEAN_DECREASE * initial_rate, CNP_STD_DEV * initial_rate
-                    )
-                    if decrease < 0:
-                        decrease = 0
-                    new_rate -= decrease
-                new_rate = max(MIN_RATE, new_rate)
-                self.Rc_memory[fid] = new_rate
-
-                # Schedule the next packet for this flow.
-                ipg = max(1, int(round(MTU_SIZE * 1e9 / new_rate)))
-                offset = ipg // self.CALENDAR_INTERVAL
-                scheduled_slot = (current_slot + offset) % num_slots
-                self.calendar_queue[scheduled_slot].append(fid)
-
-            # Clear the current slot once processed.
-            self.calendar_queue[current_slot].clear()
             # Advance time and calendar pointer.
             t += self.CALENDAR_INTERVAL
             current_slot = (current_slot + 1) % num_slots
+            if inst is not None:
+                if current_slot == 0:
+                    inst.wraparounds += 1
+                if processed % PROGRESS_CHECK_SLOTS == 0:
+                    inst.progress(t, END_OF_TIME)
+
+        self.t = t
+        self.current_slot = current_slot
+        if inst is not None:
+            inst.ipg_overflows = (inst.ipg_overflows or 0) + ipg_overflows
+            inst.stop_run()
+        return processed
+
+    def update_rates_with_policy(self, flows):
+        """New rates of the sent flows from one policy call (output_stats already counted)."""
+        new_rates = self.policy.update(
+            np.array([self.Rc_memory[fid] for fid in flows]),
+            np.array([self.init_rates[fid] for fid in flows]),
+            np.array([self.cnp_rate_thresholds[fid] for fid in flows]),
+            self.rng,
+            np.array(flows, dtype=np.int64),
+            np.array([self.output_stats[fid] // MTU_SIZE for fid in flows]),
+        )
+        for fid, new_rate in zip(flows, new_rates.tolist()):
+            self.Rc_memory[fid] = new_rate
 
     def print_calendar_occupancy_stats(self):
-        print("Calendar occupancy statistics:")
-        for occupancy, count in enumerate(self.tracked_occupancy):
-            if count:
-                print(f"Calendar occupancy {occupancy} packets: {count}")
-        empty_non_empty_ratio = self.tracked_occupancy[0] / sum(self.tracked_occupancy)
-        print(f"Empty/non_empty ratio: {empty_non_empty_ratio:.3f}")
+        return print_occupancy_report(
+            occupancy_histogram_table(self.tracked_occupancy),
+            sum(self.output_stats.values()) // MTU_SIZE,
+        )
 
-        print("Max calendar slot occupancy:", self.max_calendar_occupancy)
-        total_pkts = sum(self.output_stats.values()) // MTU_SIZE
-        print(f"Number of packets sent: {total_pkts}")
+    def results(self):
+        """Per-flow stats and the occupancy histograms as columnar tables."""
+        tables = {
+            "flow_stats": flow_stats_table(
+                self.output_stats, self.Rc_memory, self.init_rates
+            ),
+            "occupancy_histogram": occupancy_histogram_table(self.tracked_occupancy),
+        }
+        if self.occupancy_stats is not None:
+            tables["occupancy_windows"] = self.occupancy_stats.window_table()
+        return tables
+
+
+def cached_simulation(
+    cache,
+    calendar_interval,
+    calendar_slots,
+    seed,
+    flow_groups_path=OUTPUT_FLOW_GROUPS_PATH,
+    num_flows_per_group=NUM_FLOWS_PER_GROUP,
+    warm_start=WARM_START_MODE,
+):
+    """
+    results() tables of a whole OptimizedScheduler run plus its per-slot occupancy
+    ("slot_occupancy" table), served from cache (result_cache.ResultCache) when the
+    constants, the flow groups file, the model source, the seed and the arguments
+    are unchanged. Every random choice of the run, the "stationary" warm start
+    included, is drawn from CounterRNG(seed), so a cached result is the result of
+    the run.
+    """
+    key = config_key(
+        (scheduler_constants,),
+        (flow_groups_path,),
+        os.path.dirname(os.path.abspath(__file__)),
+        seed,
+        engine="OptimizedScheduler",
+        calendar_interval=calendar_interval,
+        calendar_slots=calendar_slots,
+        num_flows_per_group=num_flows_per_group,
+        warm_start=warm_start,
+    )
 
-        return empty_non_empty_ratio, self.max_calendar_occupancy
+    def run():
+        input_flow_queue, Rc_memory, init_rates = generate_flows(
+            load_flow_groups(flow_groups_path), num_flows_per_group
+        )
+        scheduler = OptimizedScheduler(
+            input_flow_queue,
+            Rc_memory,
+            init_rates,
+            calendar_interval,
+            calendar_slots,
+            warm_start=warm_start,
+            rng=CounterRNG(seed),
+        )
+        slot_occupancy = np.zeros(-(-END_OF_TIME // calendar_interval), dtype=np.int32)
+        scheduler.run_slots(None, slot_occupancy)
+        tables = scheduler.results()
+        tables["slot_occupancy"] = {"occupancy": slot_occupancy}
+        return flatten_tables(tables)
+
+    return unflatten_tables(cache.cached(key, run))
+
+
+def occupancy_summary(histogram):
+    """(empty/non-empty ratio, max occupancy) of an occupancy_histogram table."""
+    slots = histogram["slots"]
+    empty = slots[histogram["occupancy"] == 0].sum()
+    return empty / slots.sum(), int(histogram["occupancy"].max())
+
+
+def print_occupancy_report(histogram, packets):
+    """
+    Occupancy histogram, empty/non-empty ratio, max occupancy and packets sent of a
+    run, from its occupancy_histogram table. Returns (ratio, max occupancy).
+    """
+    print("Calendar occupancy statistics:")
+    for occupancy, count in zip(
+        histogram["occupancy"].tolist(), histogram["slots"].tolist()
+    ):
+        print(f"Calendar occupancy {occupancy} packets: {count}")
+    ratio, max_occupancy = occupancy_summary(histogram)
+    print(f"Empty/non_empty ratio: {ratio:.3f}")
+    print("Max calendar slot occupancy:", max_occupancy)
+    print(f"Number of packets sent: {packets}")
+    return ratio, max_occupancy
 
 
 # ---------------------------------------------------
@@ -202,10 +469,47 @@ if __name__ == "__main__":
 
     results_ratio = []
     results_max_occupancy = []
+    # Instrumented runs measure the run itself and are never served from the cache
+    cache = None
+    if RESULT_CACHE_DIR is not None and not INSTRUMENT:
+        cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES)
 
     for calendar_interval in CALENDAR_INTERVAL_LIST:
         CALENDAR_SLOTS_TEMP = CALENDAR_WINDOW // calendar_interval
         print(f"Calendar interval: {calendar_interval} ns")
+        if cache is not None:
+            # Same export and reports as a live run, rebuilt from the cached tables
+            tables = cached_simulation(
+                cache, calendar_interval, CALENDAR_SLOTS_TEMP, RNG_SEED
+            )
+            slot_occupancy = tables.pop("slot_occupancy")["occupancy"]
+            occupancy_stats = OccupancyStats()
+            occupancy_stats.add_slots(slot_occupancy)
+            tables["occupancy_windows"] = occupancy_stats.window_table()
+            if RESULTS_PATH is not None:
+                metadata = run_metadata(
+                    "OptimizedScheduler", RNG_SEED, calendar_interval=calendar_interval
+                )
+                path = f"{RESULTS_PATH}_{calendar_interval}ns"
+                with ResultWriter(path, metadata) as writer:
+                    slots = np.arange(len(slot_occupancy))
+                    writer.write(
+                        "slot_occupancy",
+                        {
+                            "time": slots * calendar_interval,
+                            "occupancy": slot_occupancy,
+                        },
+                    )
+                    for table, columns in tables.items():
+                        writer.write(table, columns)
+            ratio, max_occupancy = print_occupancy_report(
+                tables["occupancy_histogram"],
+                int(tables["flow_stats"]["bits_sent"].sum()) // MTU_SIZE,
+            )
+            occupancy_stats.print_stats()
+            results_ratio.append(ratio)
+            results_max_occupancy.append(max_occupancy)
+            continue
         flow_groups = load_flow_groups(OUTPUT_FLOW_GROUPS_PATH)
         input_flow_queue, Rc_memory, init_rates = generate_flows(
             flow_groups, NUM_FLOWS_PER_GROUP
@@ -216,9 +520,24 @@ if __name__ == "__main__":
             init_rates,
             calendar_interval,
             CALENDAR_SLOTS_TEMP,
+            warm_start=WARM_START_MODE,
+            rng=CounterRNG(RNG_SEED),
+            occupancy_stats=OccupancyStats(),
+            instrumentation=Instrumentation() if INSTRUMENT else None,
         )
-        scheduler.run_simulation()
+        if RESULTS_PATH is None:
+            scheduler.run_simulation()
+        else:
+            metadata = run_metadata(
+                "OptimizedScheduler", RNG_SEED, calendar_interval=calendar_interval
+            )
+            path = f"{RESULTS_PATH}_{calendar_interval}ns"
+            with ResultWriter(path, metadata) as writer:
+                run_with_export(scheduler, writer)
         ratio, max_occupancy = scheduler.print_calendar_occupancy_stats()
+        scheduler.occupancy_stats.print_stats()
+        if scheduler.instrumentation is not None:
+            scheduler.instrumentation.print_report()
         results_ratio.append(ratio)
         results_max_occupancy.append(max_occupancy)
 
@@ -0,0 +1,264 @@
+"""
+Sharded multi-core calendar engine
+Flows are partitioned by group across worker processes; each worker runs its own
+calendar shard (create_scheduler_from_table). The fake-CNP rate update has no
+cross-flow interaction, so shards only meet at epoch boundaries, where the parent
+sums their per-slot occupancy counts (shared memory) into the global occupancy
+histogram.
+With a CounterRNG the merged result equals the single-process run.
+A shard that fails aborts the epoch barrier; the parent also gives up after
+SHARD_TIMEOUT seconds or when a worker has exited, and raises ShardError.
+"""
+
+import multiprocessing as mp
+import queue
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+from scheduler_constants import *
+from counter_rng import CounterRNG
+from array_scheduler import create_scheduler_from_table
+from flow_table import build_flow_table
+from occupancy_stats import OccupancyStats
+from result_export import (
+    ResultWriter,
+    flow_stats_table,
+    occupancy_histogram_table,
+    run_metadata,
+)
+from scheduler_optimized import load_flow_groups, print_occupancy_report
+
+
+class ShardError(RuntimeError):
+    """A shard worker failed, exited early or missed a synchronization."""
+
+
+def shard_groups(group_ids, num_shards):
+    """Round-robin partition of group ids over shards."""
+    return [list(group_ids)[i::num_shards] for i in range(num_shards)]
+
+
+def _shard_worker(
+    shard_index,
+    flow_groups,
+    num_flows_per_group,
+    shard_group_ids,
+    calendar_interval,
+    calendar_slots,
+    seed,
+    warm_start,
+    epoch_slots,
+    num_epochs,
+    shm_name,
+    num_shards,
+    barrier,
+    result_queue,
+):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    occupancy = np.ndarray((num_shards, epoch_slots), dtype=np.int32, buffer=shm.buf)
+    row = occupancy[shard_index]
+
+    try:
+        # Same flow ids and admission order as the single-process table, with
+        # placeholders for flows of other shards so every flow is admitted in the same slot
+        flow_table = build_flow_table(flow_groups, num_flows_per_group, shard_group_ids)
+        scheduler = create_scheduler_from_table(
+            flow_table,
+            calendar_interval,
+            calendar_slots,
+            warm_start=warm_start,
+            rng=CounterRNG(seed),
+        )
+
+        for _ in range(num_epochs):
+            scheduler.run_slots(epoch_slots, slot_occupancy=row)
+            barrier.wait()  # Epoch counts are ready
+            barrier.wait()  # Parent merged them, row may be overwritten
+    except BaseException:
+        barrier.abort()  # Release the parent and the other shards
+        raise
+    finally:
+        del row, occupancy
+        shm.close()
+
+    result_queue.put((shard_index, dict(scheduler.output_stats), scheduler.Rc_memory))
+
+
+class ShardedScheduler:
+    def __init__(
+        self,
+        flow_groups,
+        num_flows_per_group,
+        CALENDAR_INTERVAL,
+        CALENDAR_SLOTS,
+        num_shards=NUM_SHARDS,
+        seed=RNG_SEED,
+        warm_start=None,
+        epoch_slots=SHARD_EPOCH_SLOTS,
+        occupancy_stats=None,
+    ):
+        self.flow_groups = flow_groups
+        self.num_flows_per_group = num_flows_per_group
+        self.CALENDAR_INTERVAL = CALENDAR_INTERVAL
+        self.CALENDAR_SLOTS = CALENDAR_SLOTS
+        self.num_shards = min(num_shards, len(flow_groups))
+        self.seed = seed
+        self.warm_start = warm_start
+        self.epoch_slots = epoch_slots
+
+        self.output_stats = {}  # Total bytes sent per flow (merged)
+        self.Rc_memory = {}  # Final rate per flow (merged)
+        self.tracked_occupancy = np.zeros(1, dtype=np.int64)
+        self.max_calendar_occupancy = 0
+        # Optional OccupancyStats, fed with the merged occupancy of every epoch
+        self.occupancy_stats = occupancy_stats
+
+    def run_simulation(self, writer=None):
+        """writer: optional ResultWriter, receives the merged occupancy per epoch."""
+        total_slots = -(-END_OF_TIME // self.CALENDAR_INTERVAL)
+        num_epochs = -(-total_slots // self.epoch_slots)
+        shards = shard_groups(self.flow_groups.keys(), self.num_shards)
+
+        ctx = mp.get_context()
+        shm = shared_memory.SharedMemory(
+            create=True, size=self.num_shards * self.epoch_slots * 4
+        )
+        occupancy = np.ndarray(
+            (self.num_shards, self.epoch_slots), dtype=np.int32, buffer=shm.buf
+        )
+        barrier = ctx.Barrier(self.num_shards + 1)
+        result_queue = ctx.Queue()
+        workers = [
+            ctx.Process(
+                target=_shard_worker,
+                args=(
+                    i,
+                    self.flow_groups,
+                    self.num_flows_per_group,
+                    shards[i],
+                    self.CALENDAR_INTERVAL,
+                    self.CALENDAR_SLOTS,
+                    self.seed,
+                    self.warm_start,
+                    self.epoch_slots,
+                    num_epochs,
+                    shm.name,
+                    self.num_shards,
+                    barrier,
+                    result_queue,
+                ),
+            )
+            for i in range(self.num_shards)
+        ]
+        try:
+            for w in workers:
+                w.start()
+
+            for epoch in range(num_epochs):
+                n = min(self.epoch_slots, total_slots - epoch * self.epoch_slots)
+                self.wait_for_shards(barrier, workers)
+                slot_totals = occupancy[:, :n].sum(axis=0)
+                self.merge_occupancy(np.bincount(slot_totals))
+                if self.occupancy_stats is not None:
+                    self.occupancy_stats.add_slots(slot_totals)
+                if writer is not None:
+                    first = epoch * self.epoch_slots
+                    slots = np.arange(first, first + n)
+                    writer.write(
+                        "slot_occupancy",
+                        {
+                            "time": slots * self.CALENDAR_INTERVAL,
+                            "occupancy": slot_totals,
+                        },
+                    )
+                self.wait_for_shards(barrier, workers)
+
+            for _ in range(self.num_shards):
+                try:
+                    _, output_stats, Rc_memory = result_queue.get(timeout=SHARD_TIMEOUT)
+                except queue.Empty:
+                    raise ShardError(
+                        f"Shard results missing after {SHARD_TIMEOUT} s "
+                        f"(exit codes: {[w.exitcode for w in workers]})"
+                    ) from None
+                self.output_stats.update(output_stats)
+                self.Rc_memory.update(Rc_memory)
+            for w in workers:
+                w.join()
+        finally:
+            for w in workers:
+                if w.is_alive():
+                    w.terminate()
+            del occupancy
+            shm.close()
+            shm.unlink()
+        if writer is not None:
+            for table, columns in self.results().items():
+                writer.write(table, columns)
+
+    def wait_for_shards(self, barrier, workers):
+        """
+        Parent side of an epoch barrier. A worker that has exited, a broken barrier
+        (a shard failed) or SHARD_TIMEOUT seconds without all shards arriving abort
+        the barrier, which releases the remaining workers, and raise ShardError.
+        """
+        try:
+            if any(w.exitcode is not None for w in workers):
+                raise threading.BrokenBarrierError
+            barrier.wait(SHARD_TIMEOUT)
+        except threading.BrokenBarrierError:
+            barrier.abort()
+            exited = {
+                i: w.exitcode for i, w in enumerate(workers) if w.exitcode is not None
+            }
+            reason = f"exit codes {exited}" if exited else f"timeout {SHARD_TIMEOUT} s"
+            raise ShardError(f"Shard synchronization failed ({reason})") from None
+
+    def merge_occupancy(self, counts):
+        if len(counts) > len(self.tracked_occupancy):
+            counts[: len(self.tracked_occupancy)] += self.tracked_occupancy
+            self.tracked_occupancy = counts
+        else:
+            self.tracked_occupancy[: len(counts)] += counts
+        self.max_calendar_occupancy = len(self.tracked_occupancy) - 1
+
+    def print_calendar_occupancy_stats(self):
+        return print_occupancy_report(
+            self.results()["occupancy_histogram"],
+            sum(self.output_stats.values()) // MTU_SIZE,
+        )
+
+    def results(self):
+        """Per-flow stats and the merged occupancy histograms as columnar tables."""
+        tables = {
+            "flow_stats": flow_stats_table(self.output_stats, self.Rc_memory),
+            "occupancy_histogram": occupancy_histogram_table(self.tracked_occupancy),
+        }
+        if self.occupancy_stats is not None:
+            tables["occupancy_windows"] = self.occupancy_stats.window_table()
+        return tables
+
+
+if __name__ == "__main__":
+    calendar_interval = CALENDAR_INTERVAL_LIST
+    flow_groups = load_flow_groups(OUTPUT_FLOW_GROUPS_PATH)
+    scheduler = ShardedScheduler(
+        flow_groups,
+        NUM_FLOWS_PER_GROUP,
+        calendar_interval,
+        CALENDAR_WINDOW // calendar_interval,
+        seed=RNG_SEED,
+        warm_start=WARM_START_MODE,
+        occupancy_stats=OccupancyStats(),
+    )
+    if RESULTS_PATH is None:
+        scheduler.run_simulation()
+    else:
+        metadata = run_metadata(
+            "ShardedScheduler", scheduler.seed, num_shards=NUM_SHARDS
+        )
+        with ResultWriter(RESULTS_PATH, metadata) as writer:
+            scheduler.run_simulation(writer)
+    scheduler.print_calendar_occupancy_stats()
+    scheduler.occupancy_stats.print_stats()